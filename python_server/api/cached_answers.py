@@ -0,0 +1,55 @@
+# Semantic answer cache glue for the chat routes (see models/answer_cache.py)
+from typing import Optional, Dict, Any, List
+from config import Config
+from api.components import components
+
+def cache_mode(secure_mode: bool, diversity: Optional[float], extractive: bool = True) -> str:
+    """Answers are only reused for the same pipeline and retrieval settings"""
+    if secure_mode:
+        # A request for a generated answer must not be served a stored extractive one
+        return "secure" if extractive else "secure:generated"
+    return f"standard:{Config.MMR_DIVERSITY if diversity is None else diversity}"
+
+def lookup_answer(question: str, mode: str) -> Optional[Dict[str, Any]]:
+    """Stored response for a near-duplicate question, with an "answer_cache" hit record"""
+    if not Config.ANSWER_CACHE_ENABLED:
+        return None
+
+    question_embedding = components.get("embedding_service").embed_query(question)
+    cached = components.get("answer_cache").lookup(question_embedding, mode)
+    if cached is None:
+        return None
+
+    return {
+        **cached["response"],
+        "answer_cache": {
+            "hit": True,
+            "similarity": cached["similarity"],
+            "cached_question": cached["cached_question"],
+            "corpus_generation": cached["corpus_generation"],
+            "current_generation": components.get("corpus_generation").current()
+        }
+    }
+
+def store_answer(question: str, mode: str, response: Dict[str, Any], documents: List[Dict]):
+    """Cache a grounded answer, keyed to the files of the documents it was generated from"""
+    if not Config.ANSWER_CACHE_ENABLED or response.get("error") or not response.get("citations"):
+        # Errors, refusals and uncited answers are not worth replaying
+        return
+
+    file_ids = [doc.get("metadata", {}).get("file_id") for doc in documents]
+    file_ids = [file_id for file_id in file_ids if file_id]
+    if not file_ids:
+        return  # Nothing to invalidate it by
+
+    stored = {key: value for key, value in response.items() if key != "generation_metrics"}
+    components.get("answer_cache").store(
+        question,
+        components.get("embedding_service").embed_query(question),
+        mode,
+        stored,
+        file_ids,
+        components.get("corpus_generation").current()
+    )
+
+ANSWER_CACHE_MISS = {"hit": False}
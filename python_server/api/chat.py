@@ -1,25 +1,19 @@
-import time
-import json
+from contextlib import closing
 from flask import Blueprint, request, jsonify, Response
-from models.retriever import Retriever
-from models.enhanced_retriever import EnhancedRetriever
-from models.llm_grounding import LLMGrounding
-from models.safe_llm_grounding import SafeLLMGrounding
-from models.embedding_service import EmbeddingService
-from models.vector_store import VectorDB
+from config import Config
+from api.sse import sse_event, run_with_keepalive, SSE_HEADERS, NO_DOCUMENTS_ANSWER
+from api.components import components
+from api.request_params import parse_diversity
+from api.cached_answers import cache_mode, lookup_answer, store_answer, ANSWER_CACHE_MISS
+from api.single_flight import SingleFlight, question_key
+from models.cancellation import CancellationToken
+from models.citation_tracker import CitationTracker
 from utils.sanitizer import sanitize_model_output
 
 chat_bp = Blueprint('chat', __name__)
 
-# Initialize components
-embedding_service = EmbeddingService()
-vector_db = VectorDB()
-
-# Standard and enhanced components
-retriever = Retriever(vector_db, embedding_service)
-llm_grounding = LLMGrounding()
-enhanced_retriever = EnhancedRetriever(vector_db, embedding_service)
-safe_llm = SafeLLMGrounding()
+# Shared by every request this process serves
+chat_flights = SingleFlight()
 
 @chat_bp.route('/api/chat', methods=['POST'])
 def chat():
@@ -33,6 +27,12 @@ def chat():
         question = data['question'].strip()
         secure_mode = data.get('secure_mode', False)
         stream = data.get('stream', False)  # Add stream option for regular chat endpoint
+        try:
+            diversity = parse_diversity(data.get('diversity'))  # MMR weight, None = Config.MMR_DIVERSITY
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        use_cache = data.get('use_cache', True)  # False forces a fresh answer
+        extractive = data.get('extractive', True)  # False always generates the answer with the LLM (secure mode)
         
         if not question:
             return jsonify({"success": False, "error": "Question cannot be empty"}), 400
@@ -41,42 +41,70 @@ def chat():
         if stream:
             return chat_stream()
         
-        if secure_mode:
-            # Use the secure pipeline
-            retrieval_result = enhanced_retriever.retrieve_with_confidence(question)
-            response = safe_llm.generate_safe_response(
-                question,
-                retrieval_result["documents"],
-                retrieval_result["confidence_metrics"]
-            )
-            response.update({
-                "success": True,
-                "question": question,
-                "retrieval_metrics": retrieval_result["confidence_metrics"],
-                "documents_retrieved": len(retrieval_result["documents"]),
-                "should_proceed": retrieval_result["should_proceed"]
-            })
-            return jsonify(response)
-        else:
-            # Use the standard pipeline
-            retrieved_docs = retriever.retrieve(question)
-            if not retrieved_docs:
-                return jsonify({
-                    "success": True,
-                    "answer": "I couldn't find relevant information in the documents to answer your question.",
-                    "citations": [],
-                    "retrieved_documents": []
-                })
-            response = llm_grounding.generate_response(question, retrieved_docs)
-            return jsonify({
-                "success": True,
-                "question": question,
-                **response
-            })
+        mode = cache_mode(secure_mode, diversity, extractive)
+        answer = lambda: _answer(question, secure_mode, diversity, use_cache, extractive, mode)
+        if Config.SINGLE_FLIGHT_ENABLED:
+            # Identical questions asked while this one is answered get the same response
+            return jsonify(chat_flights.do(question_key(question, mode, use_cache), answer))
+        return jsonify(answer())
         
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+def _answer(question: str, secure_mode: bool, diversity, use_cache: bool, extractive: bool, mode: str) -> dict:
+    """Run the selected RAG pipeline for one question and build the JSON response"""
+    # Near-duplicate of an already answered question: skip retrieval and generation
+    cached = lookup_answer(question, mode) if use_cache else None
+    if cached:
+        return {"success": True, "question": question, **cached}
+    
+    if secure_mode:
+        # Use the secure pipeline
+        retriever = components.get("enhanced_retriever")
+        retrieval_result = retriever.retrieve_with_confidence(question)
+        # Confident factoid questions are answered with the best source sentences, skipping the LLM
+        extraction = retriever.extract_answer(question, retrieval_result) if extractive else None
+        response = components.get("safe_llm").generate_safe_response(
+            question,
+            retrieval_result["documents"],
+            retrieval_result["confidence_metrics"],
+            extraction=extraction
+        )
+        store_answer(question, mode, {**response, "retrieval_metrics": retrieval_result["confidence_metrics"]},
+                     retrieval_result["documents"])
+        # Claim check runs in the background; poll GET /api/validation/<validation_id>
+        validation_id = components.get("answer_validator").submit(question, retrieval_result["documents"], response)
+        response.update({
+            "success": True,
+            "question": question,
+            "retrieval_metrics": retrieval_result["confidence_metrics"],
+            "documents_retrieved": len(retrieval_result["documents"]),
+            "should_proceed": retrieval_result["should_proceed"],
+            "cascade": retrieval_result["cascade"],
+            "pipeline": retrieval_result["pipeline"],
+            "answer_cache": ANSWER_CACHE_MISS,
+            "validation_id": validation_id
+        })
+        return response
+    else:
+        # Use the standard pipeline
+        retrieved_docs = components.get("retriever").retrieve(question, diversity=diversity)
+        if not retrieved_docs:
+            return {
+                "success": True,
+                "answer": NO_DOCUMENTS_ANSWER,
+                "citations": [],
+                "retrieved_documents": []
+            }
+        response = components.get("llm_grounding").generate_response(question, retrieved_docs)
+        store_answer(question, mode, response, retrieved_docs)
+        return {
+            "success": True,
+            "question": question,
+            **response,
+            "answer_cache": ANSWER_CACHE_MISS
+        }
+
 @chat_bp.route('/api/chat/stream', methods=['POST'])
 def chat_stream():
     """Chat endpoint with SSE for streaming responses."""
@@ -88,186 +116,190 @@ def chat_stream():
         
         question = data['question'].strip()
         secure_mode = data.get('secure_mode', False)
+        try:
+            diversity = parse_diversity(data.get('diversity'))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        use_cache = data.get('use_cache', True)
+        extractive = data.get('extractive', True)
         
         if not question:
             return jsonify({"success": False, "error": "Question cannot be empty"}), 400
 
-        def generate():
+        mode = cache_mode(secure_mode, diversity, extractive)
+
+        def produce(cancel: CancellationToken):
+            # cancel is set once the client (every client, when coalesced) disconnects;
+            # retrieval, reranking and generation stop at their next checkpoint
             try:
+                cached = lookup_answer(question, mode) if use_cache else None
+                if cached:
+                    # Near-duplicate of an already answered question: replay the stored answer
+                    yield sse_event('answer_chunk', cached.get('answer', ''))
+                    for citation in cached.get('citations', []):
+                        yield sse_event('citation', citation)
+                    yield sse_event('final', {
+                        'success': True,
+                        'question': question,
+                        'citations': cached.get('citations', []),
+                        'retrieved_documents': cached.get('retrieved_documents', []),
+                        'answer_cache': cached['answer_cache']
+                    })
+                    return
+                
                 if secure_mode:
                     # Enhanced retrieval with confidence
-                    retrieval_result = enhanced_retriever.retrieve_with_confidence(question)
+                    retrieval_result = yield from run_with_keepalive(
+                        lambda: components.get("enhanced_retriever").retrieve_with_confidence(question, cancel=cancel), cancel
+                    )
                     
                     # Send retrieval metrics first
-                    yield f"data: {json.dumps({
-                        'type': 'retrieval_metrics',
-                        'data': {
-                            'metrics': retrieval_result['confidence_metrics'],
-                            'documents_retrieved': len(retrieval_result['documents']),
-                            'should_proceed': retrieval_result['should_proceed']
-                        }
-                    })}\n\n"
+                    yield sse_event('retrieval_metrics', {
+                        'metrics': retrieval_result['confidence_metrics'],
+                        'documents_retrieved': len(retrieval_result['documents']),
+                        'should_proceed': retrieval_result['should_proceed'],
+                        'cascade': retrieval_result['cascade'],
+                        'pipeline': retrieval_result['pipeline']
+                    })
                     
                     if not retrieval_result["should_proceed"]:
                         # Send final message if we shouldn't proceed
-                        yield f"data: {json.dumps({
-                            'type': 'final',
-                            'data': {
-                                'success': True,
-                                'question': question,
-                                'answer': retrieval_result.get('proceed_message', 'Unable to provide a confident response.'),
-                                'citations': [],
-                                'retrieved_documents': []
-                            }
-                        })}\n\n"
+                        yield sse_event('final', {
+                            'success': True,
+                            'question': question,
+                            'answer': retrieval_result.get('proceed_message', 'Unable to provide a confident response.'),
+                            'citations': [],
+                            'retrieved_documents': []
+                        })
                         return
                     
-                    # Generate safe response (assuming safe_llm supports streaming)
-                    if hasattr(safe_llm, 'generate_safe_response_stream'):
-                        # If the safe LLM supports streaming
-                        stream_generator = safe_llm.generate_safe_response_stream(
-                            question,
-                            retrieval_result["documents"],
-                            retrieval_result["confidence_metrics"]
-                        )
-                        for chunk in stream_generator:
-                            yield f"data: {json.dumps({
-                                'type': 'answer_chunk',
-                                'data': chunk
-                            })}\n\n"
-                    else:
-                        # Fallback: simulate streaming for safe response
-                        response = safe_llm.generate_safe_response(
-                            question,
-                            retrieval_result["documents"],
-                            retrieval_result["confidence_metrics"]
-                        )
-                        answer = response.get("answer", "")
-                        
-                        # Stream answer word by word
-                        words = answer.split()
-                        for i, word in enumerate(words):
-                            yield f"data: {json.dumps({
-                                'type': 'answer_chunk',
-                                'data': word + (' ' if i < len(words) - 1 else '')
-                            })}\n\n"
-                            time.sleep(0.03)  # Adjust speed as needed
+                    # An extractive answer arrives as a single chunk, without an LLM call
+                    extraction = components.get("enhanced_retriever").extract_answer(
+                        question, retrieval_result, cancel
+                    ) if extractive else None
+                    
+                    # Stream tokens as the LLM generates them; the last item is the full response
+                    response = {}
+                    citations = CitationTracker(retrieval_result["documents"])
+                    with closing(components.get("safe_llm").generate_safe_response_stream(
+                        question,
+                        retrieval_result["documents"],
+                        retrieval_result["confidence_metrics"],
+                        cancel=cancel,
+                        extraction=extraction
+                    )) as stream:
+                        for chunk in stream:
+                            if isinstance(chunk, dict):
+                                response = chunk
+                            else:
+                                yield sse_event('answer_chunk', chunk)
+                                # Source cards can render while the answer is still streaming
+                                for citation in citations.feed(chunk):
+                                    yield sse_event('citation', citation)
+                    
+                    store_answer(question, mode, {**response, 'retrieval_metrics': retrieval_result['confidence_metrics']},
+                                 retrieval_result['documents'])
+                    validator = components.get("answer_validator")
+                    validation_id = validator.submit(question, retrieval_result['documents'], response)
                     
                     # Send final data
-                    yield f"data: {json.dumps({
-                        'type': 'final',
-                        'data': {
-                            'success': True,
-                            'question': question,
-                            'citations': response.get('citations', []),
-                            'retrieved_documents': retrieval_result['documents'],
-                            'retrieval_metrics': retrieval_result['confidence_metrics']
-                        }
-                    })}\n\n"
+                    yield sse_event('final', {
+                        'success': True,
+                        'question': question,
+                        'citations': response.get('citations', []),
+                        'retrieved_documents': retrieval_result['documents'],
+                        'retrieval_metrics': retrieval_result['confidence_metrics'],
+                        'generation_metrics': response.get('generation_metrics', {}),
+                        'answer_mode': response.get('answer_mode', 'generated'),
+                        'extraction': response.get('extraction'),
+                        'answer_cache': ANSWER_CACHE_MISS,
+                        # Claim check runs in the background; poll GET /api/validation/<validation_id>
+                        'validation_id': validation_id
+                    })
 
                 else:
                     # Standard pipeline
-                    retrieved_docs = retriever.retrieve(question)
+                    retrieved_docs = yield from run_with_keepalive(
+                        lambda: components.get("retriever").retrieve(question, diversity=diversity, cancel=cancel), cancel
+                    )
                     
                     # Send retrieval info
-                    yield f"data: {json.dumps({
-                        'type': 'retrieval_info',
-                        'data': {
-                            'documents_retrieved': len(retrieved_docs)
-                        }
-                    })}\n\n"
+                    yield sse_event('retrieval_info', {
+                        'documents_retrieved': len(retrieved_docs)
+                    })
                     
                     if not retrieved_docs:
-                        yield f"data: {json.dumps({
-                            'type': 'final',
-                            'data': {
-                                'success': True,
-                                'answer': "I couldn't find relevant information in the documents to answer your question.",
-                                'citations': [],
-                                'retrieved_documents': []
-                            }
-                        })}\n\n"
+                        yield sse_event('final', {
+                            'success': True,
+                            'answer': NO_DOCUMENTS_ANSWER,
+                            'citations': [],
+                            'retrieved_documents': []
+                        })
                         return
 
-                    # Generate streaming response (assuming llm_grounding supports streaming)
-                    if hasattr(llm_grounding, 'generate_response_stream'):
-                        # If the LLM supports streaming
-                        stream_generator = llm_grounding.generate_response_stream(question, retrieved_docs)
-                        for chunk in stream_generator:
-                            yield f"data: {json.dumps({
-                                'type': 'answer_chunk',
-                                'data': chunk
-                            })}\n\n"
-                    else:
-                        import re
-                        # Fallback: simulate streaming
-                        response = llm_grounding.generate_response(question, retrieved_docs)
-                        answer = response.get("answer", "")
-                        # chunks = re.split(r'(?<=[.!?])\s+', answer)
-
-                        # if len(chunks) == 1:
-                        #     chunks = re.split(r'(?<=\n\n)', answer)
-
-                        # for chunk in chunks:
-                        #     if chunk.strip():
-                        #         yield f"data: {json.dumps({
-                        #             'type': 'answer_chunk',
-                        #             'data': chunk + ' '
-                        #         })}\n\n"
-                        #         time.sleep(0.05)  # Adjust speed as needed
-
-                        # words = answer.split()
-                        answer_with_markers = answer.replace('\n', '___NEWLINE___')
-                        words = answer_with_markers.split()
-                        for i, word in enumerate(words):
-                            chunk = word.replace('___NEWLINE___', '\n')
-                            yield f"data: {json.dumps({
-                                'type': 'answer_chunk',
-                                'data': chunk + (' ' if i < len(words) - 1 else '')
-                            })}\n\n"
-                            time.sleep(0.03)  # Adjust speed as needed
+                    # Stream tokens as the LLM generates them; the last item is the full response
+                    response = {}
+                    citations = CitationTracker(retrieved_docs)
+                    with closing(components.get("llm_grounding").generate_response_stream(question, retrieved_docs, cancel=cancel)) as stream:
+                        for chunk in stream:
+                            if isinstance(chunk, dict):
+                                response = chunk
+                            else:
+                                yield sse_event('answer_chunk', chunk)
+                                # Source cards can render while the answer is still streaming
+                                for citation in citations.feed(chunk):
+                                    yield sse_event('citation', citation)
+                    
+                    store_answer(question, mode, response, retrieved_docs)
                     
                     # Send final data with citations
-                    yield f"data: {json.dumps({
-                        'type': 'final',
-                        'data': {
-                            'success': True,
-                            'question': question,
-                            'citations': response.get('citations', []),
-                            'retrieved_documents': retrieved_docs
-                        }
-                    })}\n\n"
+                    yield sse_event('final', {
+                        'success': True,
+                        'question': question,
+                        'citations': response.get('citations', []),
+                        'retrieved_documents': retrieved_docs,
+                        'generation_metrics': response.get('generation_metrics', {}),
+                        'answer_cache': ANSWER_CACHE_MISS
+                    })
 
+            except GeneratorExit:
+                # The server closes the generator when a write to the client fails
+                cancel.cancel()
+                raise
             except Exception as e:
-                yield f"data: {json.dumps({
-                    'type': 'error',
-                    'data': {
-                        'error': str(e),
-                        'success': False
-                    }
-                })}\n\n"
+                yield sse_event('error', {
+                    'error': str(e),
+                    'success': False
+                })
+
+        if Config.SINGLE_FLIGHT_ENABLED:
+            # Identical questions asked meanwhile get the token stream of this one generation
+            events = chat_flights.stream(question_key(question, mode, use_cache), produce)
+        else:
+            events = produce(CancellationToken())
 
         return Response(
-            generate(),
+            events,
             mimetype='text/event-stream',
-            headers={
-                'Cache-Control': 'no-cache',
-                'Connection': 'keep-alive',
-                'X-Accel-Buffering': 'no'  # Important for nginx
-            }
+            headers=SSE_HEADERS
         )
 
     except Exception as e:
         def error_generate():
-            yield f"data: {json.dumps({
-                'type': 'error',
-                'data': {
-                    'success': False,
-                    'error': str(e)
-                }
-            })}\n\n"
+            yield sse_event('error', {
+                'success': False,
+                'error': str(e)
+            })
         return Response(error_generate(), mimetype='text/event-stream')
 
+@chat_bp.route('/api/validation/<validation_id>', methods=['GET'])
+def validation(validation_id):
+    """Result of the background claim check of a secure-mode answer"""
+    result = components.get("answer_validator").result(validation_id)
+    if result["status"] == "unknown":
+        return jsonify({"success": False, "error": "Unknown validation id", **result}), 404
+    return jsonify({"success": True, **result})
+
 @chat_bp.route('/api/search', methods=['POST'])
 def search():
     """Direct document search with optional query analysis"""
@@ -280,21 +312,27 @@ def search():
         query = data['query'].strip()
         k = data.get('k', 5)
         analyze = data.get('analyze', False)
+        try:
+            diversity = parse_diversity(data.get('diversity'))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
 
         if analyze:
             # Perform query analysis using the enhanced retriever
-            retrieval_result = enhanced_retriever.retrieve_with_confidence(query)
+            retrieval_result = components.get("enhanced_retriever").retrieve_with_confidence(query)
             return jsonify({
                 "success": True,
                 "query": query,
                 "analysis": retrieval_result["confidence_metrics"],
                 "should_proceed": retrieval_result["should_proceed"],
                 "message": retrieval_result["proceed_message"],
-                "documents_retrieved": len(retrieval_result["documents"])
+                "documents_retrieved": len(retrieval_result["documents"]),
+                "cascade": retrieval_result["cascade"],
+                "pipeline": retrieval_result["pipeline"]
             })
         else:
             # Perform a standard search
-            retrieved_docs = retriever.retrieve(query)
+            retrieved_docs = components.get("retriever").retrieve(query, diversity=diversity)
             return jsonify({
                 "success": True,
                 "query": query,
@@ -0,0 +1,350 @@
+import asyncio
+from contextlib import aclosing
+from quart import Blueprint, request, jsonify, make_response
+from config import Config
+from api.sse import sse_event, SSE_HEADERS, NO_DOCUMENTS_ANSWER
+# Same component instances (and response format) as the WSGI blueprint
+from api.components import components
+from api.request_params import parse_diversity
+from api.cached_answers import cache_mode, lookup_answer, store_answer, ANSWER_CACHE_MISS
+from api.single_flight import AsyncSingleFlight, question_key
+from models.cancellation import CancellationToken
+from models.citation_tracker import CitationTracker
+
+chat_async_bp = Blueprint('chat_async', __name__)
+
+# Shared by every request on this event loop
+chat_flights = AsyncSingleFlight()
+
+async def component(name: str):
+    """components.get without blocking the event loop: the first lookup builds the model or client"""
+    if components.is_built(name):
+        return components.get(name)
+    return await asyncio.to_thread(components.get, name)
+
+@chat_async_bp.route('/api/chat', methods=['POST'])
+async def chat():
+    """Main chat endpoint with selectable RAG pipeline (async)"""
+    try:
+        data = await request.get_json()
+
+        if not data or 'question' not in data:
+            return jsonify({"success": False, "error": "Question is required"}), 400
+
+        question = data['question'].strip()
+        secure_mode = data.get('secure_mode', False)
+        stream = data.get('stream', False)
+        try:
+            diversity = parse_diversity(data.get('diversity'))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        use_cache = data.get('use_cache', True)
+        extractive = data.get('extractive', True)
+
+        if not question:
+            return jsonify({"success": False, "error": "Question cannot be empty"}), 400
+
+        if stream:
+            return await chat_stream()
+
+        mode = cache_mode(secure_mode, diversity, extractive)
+        answer = lambda: _answer(question, secure_mode, diversity, use_cache, extractive, mode)
+        if Config.SINGLE_FLIGHT_ENABLED:
+            return jsonify(await chat_flights.do(question_key(question, mode, use_cache), answer))
+        return jsonify(await answer())
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+async def _answer(question: str, secure_mode: bool, diversity, use_cache: bool, extractive: bool, mode: str) -> dict:
+    """Run the selected RAG pipeline for one question and build the JSON response"""
+    cached = await asyncio.to_thread(lookup_answer, question, mode) if use_cache else None
+    if cached:
+        return {"success": True, "question": question, **cached}
+
+    if secure_mode:
+        # Retrieval is CPU/HTTP work in sync clients: run it off the event loop
+        retriever = await component("enhanced_retriever")
+        retrieval_result = await asyncio.to_thread(retriever.retrieve_with_confidence, question)
+        # Confident factoid questions are answered with the best source sentences, skipping the LLM
+        extraction = await asyncio.to_thread(retriever.extract_answer, question, retrieval_result) if extractive else None
+        safe_llm = await component("safe_llm")
+        response = await safe_llm.agenerate_safe_response(
+            question,
+            retrieval_result["documents"],
+            retrieval_result["confidence_metrics"],
+            extraction=extraction
+        )
+        await asyncio.to_thread(
+            store_answer, question, mode,
+            {**response, "retrieval_metrics": retrieval_result["confidence_metrics"]}, retrieval_result["documents"]
+        )
+        validator = await component("answer_validator")
+        validation_id = await asyncio.to_thread(validator.submit, question, retrieval_result["documents"], response)
+        response.update({
+            "success": True,
+            "question": question,
+            "retrieval_metrics": retrieval_result["confidence_metrics"],
+            "documents_retrieved": len(retrieval_result["documents"]),
+            "should_proceed": retrieval_result["should_proceed"],
+            "cascade": retrieval_result["cascade"],
+            "pipeline": retrieval_result["pipeline"],
+            "answer_cache": ANSWER_CACHE_MISS,
+            "validation_id": validation_id
+        })
+        return response
+    else:
+        retriever = await component("retriever")
+        retrieved_docs = await asyncio.to_thread(retriever.retrieve, question, diversity)
+        if not retrieved_docs:
+            return {
+                "success": True,
+                "answer": NO_DOCUMENTS_ANSWER,
+                "citations": [],
+                "retrieved_documents": []
+            }
+        llm_grounding = await component("llm_grounding")
+        response = await llm_grounding.agenerate_response(question, retrieved_docs)
+        await asyncio.to_thread(store_answer, question, mode, response, retrieved_docs)
+        return {
+            "success": True,
+            "question": question,
+            **response,
+            "answer_cache": ANSWER_CACHE_MISS
+        }
+
+@chat_async_bp.route('/api/chat/stream', methods=['POST'])
+async def chat_stream():
+    """Chat endpoint with SSE for streaming responses (async)"""
+    try:
+        data = await request.get_json()
+
+        if not data or 'question' not in data:
+            return jsonify({"success": False, "error": "Question is required"}), 400
+
+        question = data['question'].strip()
+        secure_mode = data.get('secure_mode', False)
+        try:
+            diversity = parse_diversity(data.get('diversity'))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        use_cache = data.get('use_cache', True)
+        extractive = data.get('extractive', True)
+
+        if not question:
+            return jsonify({"success": False, "error": "Question cannot be empty"}), 400
+
+        mode = cache_mode(secure_mode, diversity, extractive)
+
+        async def produce(cancel: CancellationToken):
+            # Set once every client has disconnected; the retrieval thread stops at its next checkpoint
+            try:
+                cached = await asyncio.to_thread(lookup_answer, question, mode) if use_cache else None
+                if cached:
+                    yield sse_event('answer_chunk', cached.get('answer', ''))
+                    for citation in cached.get('citations', []):
+                        yield sse_event('citation', citation)
+                    yield sse_event('final', {
+                        'success': True,
+                        'question': question,
+                        'citations': cached.get('citations', []),
+                        'retrieved_documents': cached.get('retrieved_documents', []),
+                        'answer_cache': cached['answer_cache']
+                    })
+                    return
+
+                if secure_mode:
+                    retriever = await component("enhanced_retriever")
+                    retrieval_result = await asyncio.to_thread(retriever.retrieve_with_confidence, question, cancel)
+
+                    yield sse_event('retrieval_metrics', {
+                        'metrics': retrieval_result['confidence_metrics'],
+                        'documents_retrieved': len(retrieval_result['documents']),
+                        'should_proceed': retrieval_result['should_proceed'],
+                        'cascade': retrieval_result['cascade'],
+                        'pipeline': retrieval_result['pipeline']
+                    })
+
+                    if not retrieval_result["should_proceed"]:
+                        yield sse_event('final', {
+                            'success': True,
+                            'question': question,
+                            'answer': retrieval_result.get('proceed_message', 'Unable to provide a confident response.'),
+                            'citations': [],
+                            'retrieved_documents': []
+                        })
+                        return
+
+                    # An extractive answer arrives as a single chunk, without an LLM call
+                    extraction = await asyncio.to_thread(
+                        retriever.extract_answer, question, retrieval_result, cancel
+                    ) if extractive else None
+
+                    response = {}
+                    citations = CitationTracker(retrieval_result["documents"])
+                    safe_llm = await component("safe_llm")
+                    async with aclosing(safe_llm.agenerate_safe_response_stream(
+                        question,
+                        retrieval_result["documents"],
+                        retrieval_result["confidence_metrics"],
+                        cancel=cancel,
+                        extraction=extraction
+                    )) as stream:
+                        async for chunk in stream:
+                            if isinstance(chunk, dict):
+                                response = chunk
+                            else:
+                                yield sse_event('answer_chunk', chunk)
+                                # Source cards can render while the answer is still streaming
+                                for citation in citations.feed(chunk):
+                                    yield sse_event('citation', citation)
+
+                    await asyncio.to_thread(
+                        store_answer, question, mode,
+                        {**response, 'retrieval_metrics': retrieval_result['confidence_metrics']}, retrieval_result['documents']
+                    )
+                    validator = await component("answer_validator")
+                    validation_id = await asyncio.to_thread(validator.submit, question, retrieval_result['documents'], response)
+
+                    yield sse_event('final', {
+                        'success': True,
+                        'question': question,
+                        'citations': response.get('citations', []),
+                        'retrieved_documents': retrieval_result['documents'],
+                        'retrieval_metrics': retrieval_result['confidence_metrics'],
+                        'generation_metrics': response.get('generation_metrics', {}),
+                        'answer_mode': response.get('answer_mode', 'generated'),
+                        'extraction': response.get('extraction'),
+                        'answer_cache': ANSWER_CACHE_MISS,
+                        # Claim check runs in the background; poll GET /api/validation/<validation_id>
+                        'validation_id': validation_id
+                    })
+
+                else:
+                    retriever = await component("retriever")
+                    retrieved_docs = await asyncio.to_thread(retriever.retrieve, question, diversity, cancel)
+
+                    yield sse_event('retrieval_info', {
+                        'documents_retrieved': len(retrieved_docs)
+                    })
+
+                    if not retrieved_docs:
+                        yield sse_event('final', {
+                            'success': True,
+                            'answer': NO_DOCUMENTS_ANSWER,
+                            'citations': [],
+                            'retrieved_documents': []
+                        })
+                        return
+
+                    response = {}
+                    citations = CitationTracker(retrieved_docs)
+                    llm_grounding = await component("llm_grounding")
+                    async with aclosing(llm_grounding.agenerate_response_stream(
+                        question, retrieved_docs, cancel=cancel
+                    )) as stream:
+                        async for chunk in stream:
+                            if isinstance(chunk, dict):
+                                response = chunk
+                            else:
+                                yield sse_event('answer_chunk', chunk)
+                                # Source cards can render while the answer is still streaming
+                                for citation in citations.feed(chunk):
+                                    yield sse_event('citation', citation)
+
+                    await asyncio.to_thread(store_answer, question, mode, response, retrieved_docs)
+
+                    yield sse_event('final', {
+                        'success': True,
+                        'question': question,
+                        'citations': response.get('citations', []),
+                        'retrieved_documents': retrieved_docs,
+                        'generation_metrics': response.get('generation_metrics', {}),
+                        'answer_cache': ANSWER_CACHE_MISS
+                    })
+
+            except (asyncio.CancelledError, GeneratorExit):
+                # The server cancels the response task when the client disconnects
+                cancel.cancel()
+                raise
+            except Exception as e:
+                yield sse_event('error', {
+                    'error': str(e),
+                    'success': False
+                })
+
+        if Config.SINGLE_FLIGHT_ENABLED:
+            events = chat_flights.stream(question_key(question, mode, use_cache), produce)
+        else:
+            events = produce(CancellationToken())
+
+        response = await make_response(events, 200, {**SSE_HEADERS, 'Content-Type': 'text/event-stream'})
+        response.timeout = None  # Streams last as long as generation does
+        return response
+
+    except Exception as e:
+        async def error_generate():
+            yield sse_event('error', {
+                'success': False,
+                'error': str(e)
+            })
+        return await make_response(error_generate(), 200, {'Content-Type': 'text/event-stream'})
+
+@chat_async_bp.route('/api/validation/<validation_id>', methods=['GET'])
+async def validation(validation_id):
+    """Result of the background claim check of a secure-mode answer (async)"""
+    validator = await component("answer_validator")
+    result = await asyncio.to_thread(validator.result, validation_id)
+    if result["status"] == "unknown":
+        return jsonify({"success": False, "error": "Unknown validation id", **result}), 404
+    return jsonify({"success": True, **result})
+
+@chat_async_bp.route('/api/search', methods=['POST'])
+async def search():
+    """Direct document search with optional query analysis (async)"""
+    try:
+        data = await request.get_json()
+
+        if not data or 'query' not in data:
+            return jsonify({"success": False, "error": "Query is required"}), 400
+
+        query = data['query'].strip()
+        k = data.get('k', 5)
+        analyze = data.get('analyze', False)
+        try:
+            diversity = parse_diversity(data.get('diversity'))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        if analyze:
+            retriever = await component("enhanced_retriever")
+            retrieval_result = await asyncio.to_thread(retriever.retrieve_with_confidence, query)
+            return jsonify({
+                "success": True,
+                "query": query,
+                "analysis": retrieval_result["confidence_metrics"],
+                "should_proceed": retrieval_result["should_proceed"],
+                "message": retrieval_result["proceed_message"],
+                "documents_retrieved": len(retrieval_result["documents"]),
+                "cascade": retrieval_result["cascade"],
+                "pipeline": retrieval_result["pipeline"]
+            })
+        else:
+            retriever = await component("retriever")
+            retrieved_docs = await asyncio.to_thread(retriever.retrieve, query, diversity)
+            return jsonify({
+                "success": True,
+                "query": query,
+                "results": [
+                    {
+                        "content": doc["content"],
+                        "metadata": doc["metadata"],
+                        "similarity_score": doc.get("similarity_score", 0),
+                        "relevance_score": doc.get("relevance_score", 0)
+                    }
+                    for doc in retrieved_docs[:k]
+                ]
+            })
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
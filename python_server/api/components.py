@@ -0,0 +1,84 @@
+# Heavy components shared by all blueprints, built on first use or by warm_up().
+# Model modules are imported inside the factories so importing this module (and
+# booting a worker) stays cheap.
+from utils.component_registry import ComponentRegistry
+
+components = ComponentRegistry()
+
+def _embedding_service(registry):
+    from models.embedding_service import EmbeddingService
+    return EmbeddingService()
+
+def _vector_db(registry):
+    from models.vector_store import VectorDB
+    return VectorDB()
+
+def _reranker(registry):
+    from models.cross_encoder_reranker import CrossEncoderReranker
+    return CrossEncoderReranker()
+
+def _retrieval_cache(registry):
+    from config import Config
+    from models.retrieval_cache import RetrievalCache
+    return RetrievalCache(registry.get("corpus_generation"), max_entries=Config.RETRIEVAL_CACHE_SIZE)
+
+def _retriever(registry):
+    from models.retriever import Retriever
+    return Retriever(
+        registry.get("vector_db"), registry.get("embedding_service"), reranker=registry.get("reranker"),
+        retrieval_cache=registry.get("retrieval_cache")
+    )
+
+def _enhanced_retriever(registry):
+    from models.enhanced_retriever import EnhancedRetriever
+    return EnhancedRetriever(
+        registry.get("vector_db"), registry.get("embedding_service"), reranker=registry.get("reranker"),
+        retrieval_cache=registry.get("retrieval_cache")
+    )
+
+def _model_router(registry):
+    from config import Config
+    from models.model_router import ModelRouter
+    return ModelRouter() if Config.ROUTER_ENABLED else None
+
+def _llm_grounding(registry):
+    from models.llm_grounding import LLMGrounding
+    return LLMGrounding(router=registry.get("model_router"))
+
+def _safe_llm(registry):
+    from models.safe_llm_grounding import SafeLLMGrounding
+    return SafeLLMGrounding(router=registry.get("model_router"))
+
+def _answer_validator(registry):
+    from models.answer_validator import AnswerValidator
+    return AnswerValidator()
+
+def _answer_cache(registry):
+    from models.answer_cache import AnswerCache
+    return AnswerCache()
+
+def _corpus_generation(registry):
+    from models.corpus_generation import CorpusGeneration
+    return CorpusGeneration()
+
+def _chat_memory(registry):
+    from models.chat_memory import ChatMemory
+    return ChatMemory()
+
+components.register("embedding_service", _embedding_service)
+components.register("vector_db", _vector_db)
+components.register("reranker", _reranker)
+components.register("retrieval_cache", _retrieval_cache)
+components.register("retriever", _retriever)
+components.register("enhanced_retriever", _enhanced_retriever)
+components.register("model_router", _model_router)
+components.register("llm_grounding", _llm_grounding)
+components.register("safe_llm", _safe_llm)
+components.register("answer_validator", _answer_validator)
+components.register("answer_cache", _answer_cache)
+components.register("corpus_generation", _corpus_generation)
+components.register("chat_memory", _chat_memory)
+
+# What the main chat API needs; chat_memory only serves the conversation-memory blueprint
+CHAT_COMPONENTS = ["retriever", "enhanced_retriever", "llm_grounding", "safe_llm", "answer_validator",
+                   "answer_cache", "corpus_generation"]
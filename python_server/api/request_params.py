@@ -0,0 +1,20 @@
+import math
+from typing import Any, Optional
+
+def parse_diversity(value: Any) -> Optional[float]:
+    """MMR weight from a request body: None keeps Config.MMR_DIVERSITY, numbers are clamped to [0, 1]
+
+    Raises ValueError for anything that is not a number, so routes can answer 400.
+    """
+    if value is None:
+        return None
+    # bool is an int subclass; true/false is a client mistake, not a weight
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError("diversity must be a number between 0 and 1")
+    try:
+        diversity = float(value)
+    except ValueError:
+        raise ValueError("diversity must be a number between 0 and 1")
+    if math.isnan(diversity):
+        raise ValueError("diversity must be a number between 0 and 1")
+    return min(max(diversity, 0.0), 1.0)
@@ -0,0 +1,191 @@
+# Single-flight coalescing for the chat routes: identical questions that arrive while
+# one is being answered attach to that computation instead of starting their own
+import asyncio
+import threading
+from contextlib import aclosing, closing
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+from models.cancellation import CancellationToken
+from models.query_analysis import normalize_query
+
+def question_key(question: str, *scope: Hashable) -> Tuple:
+    """Questions coalesce when they normalize to the same text within the same scope (pipeline, settings)"""
+    return (normalize_query(question), *scope)
+
+class _Flight:
+    """One in-flight computation and everything its subscribers need to follow it"""
+
+    def __init__(self, condition):
+        self.cancel = CancellationToken()
+        self.condition = condition
+        self.events: List[str] = []
+        self.done = False
+        self.subscribers = 0
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None
+
+class _Flights:
+    """Bookkeeping shared by SingleFlight and AsyncSingleFlight
+
+    new_condition builds the condition each flight's subscribers wait on: a
+    threading.Condition for threads, an asyncio.Condition for one event loop.
+    """
+
+    def __init__(self, new_condition: Callable[[], Any]):
+        self._new_condition = new_condition
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self.started = 0
+        self.coalesced = 0
+
+    def _join(self, key: Hashable) -> Tuple[_Flight, bool]:
+        """The flight for key and whether the caller leads it (i.e. must start the work)"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight(self._new_condition())
+                self.started += 1
+            else:
+                self.coalesced += 1
+            flight.subscribers += 1
+            return flight, leader
+
+    def _leave(self, key: Hashable, flight: _Flight):
+        """A subscriber went away; the work is cancelled once nobody is left to receive it"""
+        with self._lock:
+            flight.subscribers -= 1
+            if flight.subscribers > 0 or flight.done:
+                return
+            if self._flights.get(key) is flight:
+                del self._flights[key]  # Later arrivals start afresh rather than join a cancelled flight
+        flight.cancel.cancel()
+        if flight.task is not None:
+            flight.task.cancel()
+
+    def _finish(self, key: Hashable, flight: _Flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"started": self.started, "coalesced": self.coalesced, "in_flight": len(self._flights)}
+
+class SingleFlight(_Flights):
+    """Coalesces identical requests served from threads (WSGI)"""
+
+    def __init__(self):
+        super().__init__(threading.Condition)
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """func()'s result, computed once for every caller that arrives while it runs
+
+        The result is shared between callers, so it must be treated as read-only.
+        """
+        flight, leader = self._join(key)
+        if leader:
+            try:
+                flight.result = func()
+            except Exception as e:
+                flight.error = e
+            finally:
+                self._finish(key, flight)
+                with flight.condition:
+                    flight.done = True
+                    flight.condition.notify_all()
+        else:
+            with flight.condition:
+                flight.condition.wait_for(lambda: flight.done)
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def stream(self, key: Hashable, producer: Callable[[CancellationToken], Iterator[str]]) -> Iterator[str]:
+        """Fan the events of one producer(cancel) run out to every subscriber of key
+
+        The producer runs in its own thread. Subscribers that join late first replay the
+        events published so far. The token passed to the producer is cancelled once every
+        subscriber has disconnected.
+        """
+        flight, leader = self._join(key)
+        if leader:
+            threading.Thread(target=self._produce, args=(key, flight, producer), daemon=True).start()
+
+        index = 0
+        try:
+            while True:
+                with flight.condition:
+                    flight.condition.wait_for(lambda: index < len(flight.events) or flight.done)
+                    events, done = flight.events[index:], flight.done
+                index += len(events)
+                yield from events
+                if done:
+                    return
+        finally:
+            self._leave(key, flight)
+
+    def _produce(self, key: Hashable, flight: _Flight, producer: Callable[[CancellationToken], Iterator[str]]):
+        try:
+            with closing(producer(flight.cancel)) as events:
+                for event in events:
+                    if flight.cancel.cancelled:
+                        break
+                    with flight.condition:
+                        flight.events.append(event)
+                        flight.condition.notify_all()
+        finally:
+            self._finish(key, flight)
+            with flight.condition:
+                flight.done = True
+                flight.condition.notify_all()
+
+class AsyncSingleFlight(_Flights):
+    """Coalesces identical requests served from one event loop (ASGI)"""
+
+    def __init__(self):
+        super().__init__(asyncio.Condition)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Await func() once for every caller that arrives while it runs (result is shared, read-only)"""
+        flight, leader = self._join(key)
+        if leader:
+            flight.task = asyncio.ensure_future(func())
+            flight.task.add_done_callback(lambda _: self._finish(key, flight))
+        # A caller that disconnects must not cancel the work the others are waiting for
+        return await asyncio.shield(flight.task)
+
+    async def stream(self, key: Hashable,
+                     producer: Callable[[CancellationToken], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Fan the events of one producer(cancel) run out to every subscriber of key (see SingleFlight.stream)"""
+        flight, leader = self._join(key)
+        if leader:
+            flight.task = asyncio.ensure_future(self._produce(key, flight, producer))
+
+        index = 0
+        try:
+            while True:
+                async with flight.condition:
+                    await flight.condition.wait_for(lambda: index < len(flight.events) or flight.done)
+                    events, done = flight.events[index:], flight.done
+                index += len(events)
+                for event in events:
+                    yield event
+                if done:
+                    return
+        finally:
+            self._leave(key, flight)
+
+    async def _produce(self, key: Hashable, flight: _Flight,
+                       producer: Callable[[CancellationToken], AsyncIterator[str]]):
+        try:
+            async with aclosing(producer(flight.cancel)) as events:
+                async for event in events:
+                    async with flight.condition:
+                        flight.events.append(event)
+                        flight.condition.notify_all()
+        finally:
+            self._finish(key, flight)
+            async with flight.condition:
+                flight.done = True
+                flight.condition.notify_all()
@@ -0,0 +1,55 @@
+import json
+import threading
+from typing import Callable, Iterator, TypeVar
+from config import Config
+from models.cancellation import CancellationToken
+
+T = TypeVar("T")
+
+# Headers for every Server-Sent Events response
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'Connection': 'keep-alive',
+    'X-Accel-Buffering': 'no'  # Important for nginx
+}
+
+NO_DOCUMENTS_ANSWER = "I couldn't find relevant information in the documents to answer your question."
+
+def sse_event(event_type: str, data) -> str:
+    """Format one SSE message in the {"type", "data"} shape the client expects"""
+    return f"data: {json.dumps({'type': event_type, 'data': data})}\n\n"
+
+# SSE comment line: ignored by clients, but writing it tells us whether the client is still there
+KEEPALIVE = ": keepalive\n\n"
+
+def run_with_keepalive(func: Callable[[], T], cancel: CancellationToken,
+                       interval: float = Config.SSE_KEEPALIVE_INTERVAL) -> Iterator[str]:
+    """Run func in a helper thread, yielding keep-alives until it finishes
+
+    Use as `result = yield from run_with_keepalive(...)` inside an SSE generator. A WSGI
+    server only notices a closed connection when it writes, so the keep-alives are what
+    surface a disconnect (as GeneratorExit) while retrieval is still running; the token
+    is then cancelled and func stops at its next checkpoint.
+    """
+    outcome = {}
+    done = threading.Event()
+
+    def target():
+        try:
+            outcome["result"] = func()
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            done.set()
+
+    threading.Thread(target=target, daemon=True).start()
+    try:
+        while not done.wait(interval):
+            yield KEEPALIVE
+    except GeneratorExit:
+        cancel.cancel()
+        raise
+
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
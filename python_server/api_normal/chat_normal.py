@@ -1,21 +1,10 @@
 import time
 import json
 from flask import Blueprint, request, jsonify, Response
-from models.retriever import Retriever
-from models.llm_grounding import LLMGrounding
-from models.embedding_service import EmbeddingService
-from models.vector_store import VectorDB
+from api.components import components
 
 chat_bp = Blueprint('chat', __name__)
 
-# Initialize components
-embedding_service = EmbeddingService()
-vector_db = VectorDB()
-
-# Standard and enhanced components
-retriever = Retriever(vector_db, embedding_service)
-llm_grounding = LLMGrounding()
-
 @chat_bp.route('/api/chat', methods=['POST'])
 def chat():
     """Main chat endpoint with selectable RAG pipeline"""
@@ -31,7 +20,7 @@ def chat():
             return jsonify({"success": False, "error": "Question cannot be empty"}), 400
         
         # Use the standard pipeline
-        retrieved_docs = retriever.retrieve(question)
+        retrieved_docs = components.get("retriever").retrieve(question)
         if not retrieved_docs:
             return jsonify({
                 "success": True,
@@ -39,7 +28,7 @@ def chat():
                 "citations": [],
                 "retrieved_documents": []
             })
-        response = llm_grounding.generate_response(question, retrieved_docs)
+        response = components.get("llm_grounding").generate_response(question, retrieved_docs)
         return jsonify({
             "success": True,
             "question": question,
@@ -66,7 +55,7 @@ def chat_stream():
         def generate():
             try:
                 # Standard pipeline
-                retrieved_docs = retriever.retrieve(question)
+                retrieved_docs = components.get("retriever").retrieve(question)
                 
                 # Send retrieval info
                 yield f"data: {json.dumps({
@@ -89,17 +78,20 @@ def chat_stream():
                     return
 
                 # Generate streaming response (assuming llm_grounding supports streaming)
-                if hasattr(llm_grounding, 'generate_response_stream'):
-                    # If the LLM supports streaming
-                    stream_generator = llm_grounding.generate_response_stream(question, retrieved_docs)
+                if hasattr(components.get("llm_grounding"), 'generate_response_stream'):
+                    # If the LLM supports streaming; the last item is the full response
+                    stream_generator = components.get("llm_grounding").generate_response_stream(question, retrieved_docs)
                     for chunk in stream_generator:
+                        if isinstance(chunk, dict):
+                            response = chunk
+                            continue
                         yield f"data: {json.dumps({
                             'type': 'answer_chunk',
                             'data': chunk
                         })}\n\n"
                 else:
                     # Fallback: simulate streaming
-                    response = llm_grounding.generate_response(question, retrieved_docs)
+                    response = components.get("llm_grounding").generate_response(question, retrieved_docs)
                     answer = response.get("answer", "")
                     
                     # Stream answer word by word
@@ -5,9 +5,11 @@ from flask_limiter.util import get_remote_address
 from config import Config
 
 # Import blueprints
-from api.chat import chat_bp
+from api.chat import chat_bp, chat_flights
+from api.components import components, CHAT_COMPONENTS
+from utils.process_memory import process_memory
 
-def create_app():
+def create_app(warm_up: bool = Config.WARM_UP_ON_START):
     app = Flask(__name__)
     app.config.from_object(Config)
 
@@ -22,10 +24,23 @@ def create_app():
     # Register blueprints
     app.register_blueprint(chat_bp)
     
+    # Models and clients are otherwise built lazily by the first request that needs them
+    if warm_up:
+        components.warm_up(CHAT_COMPONENTS)
+    
     # Health check endpoint
     @app.route('/api/health')
     def health_check():
-        return {"status": "healthy", "message": "RAG Pipeline Server is running"}
+        # Only report the router once a request has built it; health checks stay cheap
+        router = components.get("model_router") if components.is_built("model_router") else None
+        return {
+            "status": "healthy",
+            "message": "RAG Pipeline Server is running",
+            "components": components.stats(),
+            "single_flight": chat_flights.stats(),
+            "model_routing": router.stats() if router else None,
+            "memory": process_memory()
+        }
     
     return app
 
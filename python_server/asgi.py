@@ -0,0 +1,60 @@
+# asgi.py - async serving mode (e.g. `hypercorn asgi:asgi_app`)
+import asyncio
+from datetime import timedelta
+from quart import Quart
+from quart_cors import cors
+from quart_rate_limiter import RateLimiter, RateLimit
+from config import Config
+
+# Import blueprints
+from api.chat_async import chat_async_bp, chat_flights
+from api.components import components, CHAT_COMPONENTS
+from utils.process_memory import process_memory
+
+RATE_LIMIT_PERIODS = {
+    "second": timedelta(seconds=1),
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+def parse_rate_limit(limit: str) -> RateLimit:
+    """Turn a flask-limiter style string ("100/hour") into a quart-rate-limiter RateLimit"""
+    count, period = limit.split("/")
+    return RateLimit(int(count), RATE_LIMIT_PERIODS[period.strip().lower()])
+
+def create_asgi_app(warm_up: bool = Config.WARM_UP_ON_START):
+    app = Quart(__name__)
+    app.config.from_object(Config)
+
+    # Initialize extensions
+    app = cors(app)
+    RateLimiter(app, default_limits=[parse_rate_limit(Config.RATE_LIMIT)])
+
+    # Register blueprints
+    app.register_blueprint(chat_async_bp)
+
+    # Models and clients are otherwise built lazily by the first request that needs them
+    # (off the event loop, but that request waits while they load)
+    if warm_up:
+        @app.before_serving
+        async def warm_up_components():
+            await asyncio.to_thread(components.warm_up, CHAT_COMPONENTS)
+
+    # Health check endpoint
+    @app.route('/api/health')
+    async def health_check():
+        # Only report the router once a request has built it; health checks stay cheap
+        router = components.get("model_router") if components.is_built("model_router") else None
+        return {
+            "status": "healthy",
+            "message": "RAG Pipeline Server is running",
+            "components": components.stats(),
+            "single_flight": chat_flights.stats(),
+            "model_routing": router.stats() if router else None,
+            "memory": process_memory()
+        }
+
+    return app
+
+asgi_app = create_asgi_app()
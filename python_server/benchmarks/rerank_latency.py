@@ -0,0 +1,79 @@
+# benchmarks/rerank_latency.py
+"""
+p50/p99 latency of the term-overlap heuristic vs the int8 ONNX cross-encoder.
+
+Usage:
+    python benchmarks/rerank_latency.py [--runs 200] [--candidates 10] [--max-tokens 256]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import Config
+from models.retriever import Retriever
+from models.cross_encoder_reranker import CrossEncoderReranker
+
+QUERIES = [
+    "What is the refund policy for enterprise customers?",
+    "How do I reset my password?",
+    "Which regions does the service level agreement cover?",
+    "When was version 2.3 released?",
+]
+
+WORDS = (
+    "policy customer refund password reset account region service level agreement "
+    "uptime release version support contract billing invoice security access data "
+    "storage backup recovery incident response team document page section"
+).split()
+
+def make_candidates(count: int, chunk_chars: int = Config.CHUNK_SIZE):
+    """Synthetic chunks of roughly CHUNK_SIZE characters"""
+    candidates = []
+    for i in range(count):
+        words = []
+        while sum(len(word) + 1 for word in words) < chunk_chars:
+            words.append(random.choice(WORDS))
+        candidates.append({
+            "content": " ".join(words),
+            "metadata": {"chunk_id": str(i)},
+            "similarity_score": random.uniform(0.7, 0.95)
+        })
+    return candidates
+
+def measure(rerank_fn, runs: int, candidates: int):
+    """Latencies in milliseconds of rerank_fn over fresh candidate lists"""
+    latencies = []
+    for i in range(runs):
+        query = QUERIES[i % len(QUERIES)]
+        results = make_candidates(candidates)
+        start = time.perf_counter()
+        rerank_fn(query, results)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+def report(name: str, latencies):
+    print(f"{name:<20} p50={np.percentile(latencies, 50):8.2f} ms  "
+          f"p99={np.percentile(latencies, 99):8.2f} ms  runs={len(latencies)}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--candidates", type=int, default=Config.TOP_K * 2)
+    parser.add_argument("--max-tokens", type=int, default=Config.RERANKER_MAX_TOKENS)
+    args = parser.parse_args()
+
+    heuristic = Retriever(vector_db=None, embedding_service=None)
+    reranker = CrossEncoderReranker(max_length=args.max_tokens)
+    cross_encoder = Retriever(vector_db=None, embedding_service=None, reranker=reranker)
+
+    # Warm-up so model loading and first-call allocation are not measured
+    measure(cross_encoder._rerank_results, 5, args.candidates)
+
+    report("heuristic", measure(heuristic._rerank_results, args.runs, args.candidates))
+    report(f"cross-encoder ({reranker.backend})", measure(cross_encoder._rerank_results, args.runs, args.candidates))
@@ -0,0 +1,87 @@
+# benchmarks/time_to_first_token.py
+"""
+p50/p99 time to first token of the safety prompt with the context in the middle of
+the instructions (previous layout) vs a fixed instruction prefix (current layout).
+
+Needs a running Ollama with Config.LLM_MODEL pulled. Each run uses a different
+question and context, as real traffic does; only the instruction prefix repeats.
+
+Usage:
+    python benchmarks/time_to_first_token.py [--runs 20] [--docs 3] [--keep-alive 30m]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain.prompts import PromptTemplate
+from langchain_ollama import OllamaLLM
+from config import Config
+from models.context_packer import ContextPacker
+from models.hallucination_detector import HallucinationDetector
+from rerank_latency import QUERIES, make_candidates
+
+# The safety prompt before it was reordered: per-request text sat between instructions
+LEGACY_SAFETY_TEMPLATE = """You are a careful AI assistant that strictly bases answers on the provided context. 
+        Follow these rules:
+        1. ONLY use information from the provided context
+        2. If the context doesn't contain the answer, say "I cannot answer based on the provided documents"
+        3. Never make up information, names, dates, or facts
+        4. If you're uncertain, express the uncertainty
+        5. Always cite your sources using [source_number] format
+
+        Context Information:
+        {context}
+
+        User Question: {question}
+
+        Important: If the context is insufficient or irrelevant to the question, 
+        respond with: "I cannot provide a reliable answer based on the available documents."
+
+        Otherwise, provide a helpful answer with citations:"""
+
+def time_to_first_token(llm: OllamaLLM, prompt: str) -> float:
+    """Milliseconds until the first streamed chunk; generation is stopped right after"""
+    start = time.perf_counter()
+    stream = llm.stream(prompt)
+    try:
+        next(stream)
+        return (time.perf_counter() - start) * 1000
+    finally:
+        stream.close()
+
+def measure(llm: OllamaLLM, template: PromptTemplate, runs: int, docs: int):
+    packer = ContextPacker()
+    latencies = []
+    for i in range(runs):
+        context = packer.format(make_candidates(docs))
+        prompt = template.format(context=context, question=QUERIES[i % len(QUERIES)])
+        latencies.append(time_to_first_token(llm, prompt))
+    return latencies
+
+def report(name: str, latencies):
+    print(f"{name:<10} TTFT p50={np.percentile(latencies, 50):8.1f} ms  "
+          f"p99={np.percentile(latencies, 99):8.1f} ms  runs={len(latencies)}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--docs", type=int, default=Config.RERANK_TOP_K)
+    parser.add_argument("--keep-alive", default=Config.LLM_KEEP_ALIVE)
+    args = parser.parse_args()
+
+    random.seed(0)
+    llm = OllamaLLM(model=Config.LLM_MODEL, keep_alive=args.keep_alive, num_ctx=Config.LLM_NUM_CTX)
+    legacy = PromptTemplate(template=LEGACY_SAFETY_TEMPLATE, input_variables=["context", "question"])
+    prefix = HallucinationDetector().create_safety_prompt()
+
+    # Warm-up so model loading is not measured
+    measure(llm, prefix, 2, args.docs)
+
+    report("legacy", measure(llm, legacy, args.runs, args.docs))
+    report("prefix", measure(llm, prefix, args.runs, args.docs))
@@ -18,6 +18,17 @@ class Config:
     # Models
     EMBEDDING_MODEL = "nomic-embed-text:v1.5"
     LLM_MODEL = "gemma3:4b"
+    LLM_KEEP_ALIVE = "30m"            # How long Ollama keeps the model (and its KV cache) loaded; -1 = forever
+    LLM_NUM_CTX = 4096                # Same for every client: a different value makes Ollama reload the model
+    
+    # Model routing (LLMGrounding / SafeLLMGrounding): easy requests go to the small tier,
+    # which falls back to the default tier when its model fails (e.g. it was never pulled).
+    # Tune the thresholds against the per-tier stats under "model_routing" in /api/health.
+    ROUTER_ENABLED = True
+    LLM_TIERS = {"small": "gemma3:1b", "large": LLM_MODEL}
+    LLM_DEFAULT_TIER = "large"
+    ROUTER_SMALL_MIN_CONFIDENCE = 0.75        # overall_confidence (secure) or top similarity (standard)
+    ROUTER_SMALL_MAX_CONTEXT_TOKENS = 800     # Packed context size the small model is trusted with
     
     
     # Vector DB
@@ -28,9 +39,83 @@ class Config:
     TOP_K = 5
     RERANK_TOP_K = 3
     SIMILARITY_THRESHOLD = 0.7
-    
+    MMR_DIVERSITY = 0.3               # 0 = relevance only; per-request "diversity" overrides
+    QUERY_EMBEDDING_CACHE_SIZE = 1024 # Recent query embeddings kept per process
+    RETRIEVAL_CACHE_SIZE = 2000       # First-stage results per process, keyed by corpus generation
+
+    # Retrieval planning (hybrid search)
+    PLANNER_MAX_EXACT_TOKENS = 4      # Longer queries are never treated as pure lookups
+    PLANNER_MAX_POSTINGS_RATIO = 0.2  # Skip dense search only if BM25 narrows to <=20% of chunks
+    PLANNER_MIN_SEMANTIC_TOKENS = 8   # Skip BM25 for natural-language questions this long
+    NGRAM_SIZE = 3                    # Character n-grams for code/version lookups
+    NGRAM_FUSION_WEIGHT = 0.3         # Share of n-gram hits in weighted fusion
+    PHRASE_FUSION_WEIGHT = 0.4        # Share of quoted-phrase hits in weighted fusion
+
+    # Cross-encoder reranking
+    RERANKER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANKER_MAX_TOKENS = 256         # Token budget per (query, chunk) pair
+    RERANKER_BATCH_SIZE = 16          # Covers TOP_K * 2 candidates in one batch
+    RERANKER_NUM_THREADS = 4
+    RERANKER_ONNX_DIR = "./onnx_models"
+    SCORE_CACHE_SIZE = 10000          # In-memory cross-encoder scores (LRU)
+    SCORE_CACHE_PATH = "./cache/score_cache.db"  # None to keep the cache in memory only
+    SCORE_CACHE_DISK_SIZE = 200000    # Persisted scores kept (most recently written)
+
+    # Cascade reranking (EnhancedRetriever): stop once the top-k margin clears the
+    # stage threshold. Calibrate against the "cascade" margins logged per request.
+    CASCADE_DENSE_MARGIN = 0.08
+    CASCADE_LEXICAL_MARGIN = 0.05
+
+    # Per-request pipeline (EnhancedRetriever): independent stages run concurrently
+    PIPELINE_WORKERS = 8              # Shared pool for the stages of all requests
+    # Score every candidate with the cross-encoder alongside the lexical features instead
+    # of only when the cascade reaches that stage: lower latency, more CPU per request
+    PIPELINE_SPECULATIVE_CROSS_ENCODER = True
+
+    # Semantic answer cache (/api/chat): near-duplicate questions reuse a stored answer
+    ANSWER_CACHE_ENABLED = True
+    ANSWER_CACHE_THRESHOLD = 0.95     # Min cosine similarity between question embeddings
+    ANSWER_CACHE_SIZE = 5000
+    ANSWER_CACHE_PATH = "./cache/answer_cache.db"
+    CORPUS_GENERATION_PATH = "./cache/corpus_generation.db"  # Bumped by the ingestion worker
+
+    # Extractive fast path (secure mode): confident factoid questions are answered with the
+    # best cross-encoder-scored sentences of the top chunks, without calling the LLM
+    EXTRACTIVE_ENABLED = True
+    EXTRACTIVE_MIN_CONFIDENCE = 0.85  # overall_confidence ("high" in CONFIDENCE_THRESHOLDS)
+    EXTRACTIVE_MIN_SPAN_SCORE = 0.8   # Cross-encoder probability the best sentence must reach
+    EXTRACTIVE_MAX_SPANS = 2          # Sentences returned at most
+    EXTRACTIVE_TOP_DOCS = 2           # Top documents whose sentences are scored
+
+    # Context packing (LLMGrounding / SafeLLMGrounding prompts)
+    CONTEXT_TOKEN_BUDGET = 2000       # Max (estimated) tokens of retrieved context per prompt
+    CONTEXT_CHARS_PER_TOKEN = 4       # Token estimate used at ingest time (metadata["token_count"])
+    CONTEXT_MIN_OVERLAP = 20          # Shortest shared text treated as splitter overlap (chars)
+
+    # Conversation memory (/api/conversation): recent turns verbatim, older ones in a rolling summary
+    MEMORY_MAX_TURNS = 6              # Turns kept verbatim at most
+    MEMORY_TOKEN_BUDGET = 1000        # Max (estimated) tokens of verbatim turns per prompt
+    MEMORY_SUMMARY_WORKERS = 1        # Concurrent background summary updates per process
+    CONVERSATION_CACHE_SIZE = 1000    # Materialized conversation chains kept in memory per process (LRU)
+    CONVERSATION_STORE_PATH = "./cache/conversations.db"  # Shared by all workers, so any of them can continue a conversation
+
+    # Post-hoc answer validation (secure mode): claim check after the answer has streamed
+    VALIDATION_ENABLED = True
+    VALIDATION_WORKERS = 1            # Concurrent validation LLM calls per process
+    VALIDATION_MAX_PENDING = 32       # Queued beyond this, new validations are skipped
+    VALIDATION_RESULTS_SIZE = 1000    # Finished results kept for GET /api/validation/<id>
+    VALIDATION_RESULTS_PATH = "./cache/validations.db"  # Shared by all workers, so any of them can answer a poll
+
     # API
     RATE_LIMIT = "100/hour"
+    SSE_KEEPALIVE_INTERVAL = 0.5      # Seconds between keep-alives while retrieval runs
+    WARM_UP_ON_START = False          # Build models at boot instead of on the first request
+    SINGLE_FLIGHT_ENABLED = True      # Identical questions in flight share one retrieval and generation
+
+    # Gunicorn (gunicorn.conf.py)
+    GUNICORN_WORKERS = 4
+    PRELOAD_MODELS = True             # Load model weights in the master, share them copy-on-write
+    PRELOAD_COMPONENTS = ["reranker"] # Read-only models only: HTTP clients are built per worker
     
     # File storage
     UPLOAD_FOLDER = "./uploads"
@@ -0,0 +1,28 @@
+# gunicorn.conf.py - `gunicorn -c gunicorn.conf.py app:app`
+import gc
+from config import Config
+
+bind = "0.0.0.0:5000"
+workers = Config.GUNICORN_WORKERS
+
+# Import the app in the master so read-only model weights are loaded once and
+# shared copy-on-write by every worker instead of once per worker
+preload_app = Config.PRELOAD_MODELS
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from api.components import components
+
+    build_ms = components.warm_up(Config.PRELOAD_COMPONENTS)
+    server.log.info(f"Preloaded {', '.join(build_ms)} in the master")
+
+    # Move everything allocated so far to the permanent generation: the collector
+    # never touches these objects again, so their pages stay shared after fork
+    gc.collect()
+    gc.freeze()
+
+def post_fork(server, worker):
+    if preload_app:
+        from api.components import components
+        components.after_fork()
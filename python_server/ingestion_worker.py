@@ -3,7 +3,7 @@ import os
 import sys
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Dict
+from typing import List, Dict, Callable, Optional
 from dotenv import load_dotenv
 from config import Config
 
@@ -17,13 +17,18 @@ from api_client.api_client import get_files_from_api, update_status_via_api
 # from models.document_ingestor import DocumentIngestor
 from models.document_ingestor_timestamp import DocumentIngestor
 from models.vector_store import VectorDB
+from models.score_cache import ScoreCache
+from models.answer_cache import AnswerCache
+from models.corpus_generation import CorpusGeneration
 
 class IngestionProcessor:
     """Processes a single document for ingestion."""
 
-    def __init__(self, ingestor: DocumentIngestor, vector_db: VectorDB):
+    def __init__(self, ingestor: DocumentIngestor, vector_db: VectorDB,
+                 on_upsert: Optional[Callable[[str], None]] = None):
         self.ingestor = ingestor
         self.vector_db = vector_db
+        self.on_upsert = on_upsert  # Called with the file_id once its chunks are in the vector DB
 
     def process(self, file_path: str) -> bool:
         """Process a single file and add it to the vector DB."""
@@ -49,6 +54,8 @@ class IngestionProcessor:
                 return False
 
             self.vector_db.add_documents(embedded_chunks)
+            if self.on_upsert:
+                self.on_upsert(file_metadata["file_id"])
 
             # Remove file from server after ingestion
             try:
@@ -80,10 +87,11 @@ def process_batch_parallel(
         file_paths: List[str],
         ingestor: DocumentIngestor,
         vector_db: VectorDB,
-        max_workers: int = 4
+        max_workers: int = 4,
+        on_upsert: Optional[Callable[[str], None]] = None
         )->tuple[list[str], Dict[str,str]]:
     """Process a batch of files in parallel."""
-    processor = IngestionProcessor(ingestor, vector_db)
+    processor = IngestionProcessor(ingestor, vector_db, on_upsert)
     successful_files = []
     failed_files = {}
 
@@ -116,6 +124,15 @@ def start_worker_service(batch_size: int = Config.BATCH_SIZE, poll_interval: int
 
     ingestor = DocumentIngestor(upload_folder=Config.UPLOAD_FOLDER) # taking files from 'uploads' folder
     vector_db = VectorDB()
+    score_cache = ScoreCache(db_path=Config.SCORE_CACHE_PATH)
+    answer_cache = AnswerCache()
+    corpus_generation = CorpusGeneration()
+
+    def on_upsert(file_id: str):
+        # Right after the upsert, so the API never serves results computed from the old chunks
+        corpus_generation.bump()
+        score_cache.invalidate_file(file_id)
+        answer_cache.invalidate_file(file_id)
 
     while True:
         try:
@@ -128,7 +145,9 @@ def start_worker_service(batch_size: int = Config.BATCH_SIZE, poll_interval: int
 
             logging.info(f"Fetched {len(files_to_process)} files for processing.")
 
-            successful_files, failed_files = process_batch_parallel(files_to_process, ingestor, vector_db, max_workers)
+            successful_files, failed_files = process_batch_parallel(
+                files_to_process, ingestor, vector_db, max_workers, on_upsert
+            )
 
             # Report status back to the API
             for file_path in successful_files:
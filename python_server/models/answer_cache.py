@@ -0,0 +1,198 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from typing import List, Dict, Any, Optional
+from config import Config
+
+class AnswerCache:
+    """Semantic cache of generated answers keyed by question embedding
+
+    A lookup is a similarity search over the embeddings of past questions; only a
+    match at or above the (strict) threshold is served. Entries remember the files
+    they cite and the corpus generation they were computed against, and
+    invalidate_file() drops every answer citing a re-ingested file. Entries are
+    persisted in SQLite so the ingestion worker can invalidate them from its own
+    process; the embedding matrix searched per request is kept in memory.
+
+    The in-memory index and the SQLite connection have separate locks, so a store's
+    disk writes never hold up the similarity search of concurrent lookups.
+    """
+
+    def __init__(self,
+                 threshold: float = Config.ANSWER_CACHE_THRESHOLD,
+                 max_entries: int = Config.ANSWER_CACHE_SIZE,
+                 db_path: str = Config.ANSWER_CACHE_PATH):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self._lock = threading.Lock()      # In-memory index: _ids, _modes, _matrix, _size
+        self._db_lock = threading.Lock()   # SQLite connection
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._connect()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                question TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                response TEXT NOT NULL,
+                corpus_generation INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            )""")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS answer_files (
+                answer_id INTEGER NOT NULL,
+                file_id TEXT NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answer_files_file_id ON answer_files (file_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answer_files_answer_id ON answer_files (answer_id)")
+        self._conn.commit()
+        self._load()
+
+    def _connect(self):
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+
+    def after_fork(self):
+        """SQLite connections must not cross fork(): give the worker its own"""
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._connect()
+
+    def _load(self):
+        """Build the in-memory search matrix from the persisted entries"""
+        rows = self._conn.execute("SELECT id, mode, embedding FROM answers ORDER BY id").fetchall()
+        self._ids = [row[0] for row in rows]
+        self._modes = [row[1] for row in rows]
+        # Rows past _size are spare capacity, so an insert rarely reallocates
+        self._matrix = (
+            np.vstack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+            if rows else None
+        )
+        self._size = len(rows)
+
+    def lookup(self, question_embedding: List[float], mode: str) -> Optional[Dict[str, Any]]:
+        """Best stored answer for a near-duplicate question asked in the same mode, or None"""
+        query = np.asarray(question_embedding, dtype=np.float32)
+
+        with self._lock:
+            if self._size == 0:
+                self.misses += 1
+                return None
+
+            similarities = self._matrix[:self._size] @ query
+            candidates = []
+            for index in np.argsort(-similarities):
+                if similarities[index] < self.threshold:
+                    break
+                if self._modes[index] == mode:
+                    candidates.append((self._ids[index], float(similarities[index])))
+
+        for answer_id, similarity in candidates:
+            # The ingestion worker may have invalidated it since it was loaded
+            with self._db_lock:
+                row = self._conn.execute(
+                    "SELECT question, response, corpus_generation FROM answers WHERE id = ?", (answer_id,)
+                ).fetchone()
+            if row is None:
+                with self._lock:
+                    self._forget([answer_id])
+                continue
+
+            self.hits += 1
+            return {
+                "response": json.loads(row[1]),
+                "cached_question": row[0],
+                "similarity": similarity,
+                "corpus_generation": row[2]
+            }
+
+        self.misses += 1
+        return None
+
+    def store(self, question: str, question_embedding: List[float], mode: str,
+              response: Dict[str, Any], file_ids: List[str], corpus_generation: int):
+        """Remember an answer together with the files it cites"""
+        embedding = np.asarray(question_embedding, dtype=np.float32)
+
+        with self._db_lock:
+            cursor = self._conn.execute(
+                "INSERT INTO answers (question, mode, embedding, response, corpus_generation, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (question, mode, embedding.tobytes(), json.dumps(response), corpus_generation, time.time())
+            )
+            answer_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT INTO answer_files (answer_id, file_id) VALUES (?, ?)",
+                [(answer_id, file_id) for file_id in set(file_ids)]
+            )
+            self._conn.commit()
+
+        with self._lock:
+            self._append(answer_id, mode, embedding)
+            # Oldest entries go first once the cache is full
+            evicted = self._ids[:max(len(self._ids) - self.max_entries, 0)]
+            if evicted:
+                self._forget(evicted)
+
+        if evicted:
+            with self._db_lock:
+                self._delete(evicted)
+                self._conn.commit()
+
+    def invalidate_file(self, file_id: str):
+        """Drop every answer that cites a re-ingested file"""
+        with self._db_lock:
+            answer_ids = [row[0] for row in self._conn.execute(
+                "SELECT DISTINCT answer_id FROM answer_files WHERE file_id = ?", (file_id,)
+            )]
+            if not answer_ids:
+                return
+            self._delete(answer_ids)
+            self._conn.commit()
+        with self._lock:
+            self._forget(answer_ids)
+
+    def _append(self, answer_id: int, mode: str, embedding: np.ndarray):
+        """Add an entry to the in-memory search matrix; caller holds _lock
+
+        Capacity doubles when full, up to max_entries + 1 rows (one insert beyond the
+        limit, before eviction).
+        """
+        if self._matrix is None:
+            self._matrix = np.empty((min(16, self.max_entries + 1), embedding.shape[0]), dtype=np.float32)
+        elif self._size == len(self._matrix):
+            capacity = min(2 * len(self._matrix), self.max_entries + 1)
+            grown = np.empty((capacity, self._matrix.shape[1]), dtype=np.float32)
+            grown[:self._size] = self._matrix[:self._size]
+            self._matrix = grown
+        self._matrix[self._size] = embedding
+        self._size += 1
+        self._ids.append(answer_id)
+        self._modes.append(mode)
+
+    def _delete(self, answer_ids: List[int]):
+        """Delete entries from SQLite; caller holds _db_lock and commits"""
+        placeholders = ",".join("?" * len(answer_ids))
+        self._conn.execute(f"DELETE FROM answers WHERE id IN ({placeholders})", answer_ids)
+        self._conn.execute(f"DELETE FROM answer_files WHERE answer_id IN ({placeholders})", answer_ids)
+
+    def _forget(self, answer_ids: List[int]):
+        """Remove entries from the in-memory search matrix, compacting it in place; caller holds _lock"""
+        drop = set(answer_ids)
+        keep = [i for i, answer_id in enumerate(self._ids) if answer_id not in drop]
+        if len(keep) == self._size:
+            return
+        self._ids = [self._ids[i] for i in keep]
+        self._modes = [self._modes[i] for i in keep]
+        self._matrix[:len(keep)] = self._matrix[keep]
+        self._size = len(keep)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._ids)}
@@ -0,0 +1,128 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+from config import Config
+from .context_packer import ContextPacker
+from .hallucination_detector import HallucinationDetector
+from .ollama_llm import create_llm
+
+class AnswerValidator:
+    """Post-hoc claim verification of generated answers, off the request path
+
+    submit() queues the validation prompt of HallucinationDetector on a small pool of
+    its own, so the answer streams at normal speed and validation never delays the
+    first token. Results are persisted in SQLite (the most recent max_results), so
+    any worker process can answer a poll by id; when more than max_pending
+    validations are queued, new ones are skipped rather than building an
+    ever-growing backlog.
+    """
+
+    def __init__(self,
+                 max_workers: int = Config.VALIDATION_WORKERS,
+                 max_pending: int = Config.VALIDATION_MAX_PENDING,
+                 max_results: int = Config.VALIDATION_RESULTS_SIZE,
+                 db_path: str = Config.VALIDATION_RESULTS_PATH):
+        self.llm = create_llm()
+        self.detector = HallucinationDetector()
+        self.context_packer = ContextPacker()
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_results = max_results
+        self.db_path = db_path
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="validation")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.skipped = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._connect()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS validations (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT NOT NULL UNIQUE,
+                status TEXT NOT NULL,
+                result TEXT,
+                created_at REAL NOT NULL
+            )""")
+        self._conn.commit()
+
+    def _connect(self):
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+
+    def submit(self, question: str, retrieved_docs: List[Dict], response: Dict[str, Any]) -> Optional[str]:
+        """Queue validation of a generated answer; returns the id to poll, or None if not queued"""
+        # Refusals, errors, low-confidence and extractive (verbatim) responses carry no hallucination assessment
+        if not Config.VALIDATION_ENABLED or "hallucination_risk" not in response:
+            return None
+
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.skipped += 1
+                return None
+            self.pending += 1
+
+        validation_id = str(uuid.uuid4())
+        self._save(validation_id, "pending")
+        self._executor.submit(self._run, validation_id, question, retrieved_docs, response["answer"])
+        return validation_id
+
+    def _run(self, validation_id: str, question: str, retrieved_docs: List[Dict], answer: str):
+        try:
+            self._save(validation_id, "done", self._validate(question, retrieved_docs, answer))
+        except Exception as e:
+            self._save(validation_id, "failed", {"error": str(e)})
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def _save(self, validation_id: str, status: str, result: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO validations (id, status, result, created_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET status = excluded.status, result = excluded.result",
+                (validation_id, status, json.dumps(result) if result is not None else None, time.time())
+            )
+            # Keep only the most recent max_results
+            self._conn.execute(
+                "DELETE FROM validations WHERE seq <= (SELECT MAX(seq) FROM validations) - ?",
+                (self.max_results,)
+            )
+            self._conn.commit()
+
+    def _validate(self, question: str, retrieved_docs: List[Dict], answer: str) -> Dict[str, Any]:
+        start_time = time.perf_counter()
+        prompt = self.detector.validation_prompt.format(
+            context=self.context_packer.format(retrieved_docs),
+            question=question,
+            answer=answer
+        )
+        validation = self.detector.parse_validation(self.llm.invoke(prompt))
+        validation["validation_ms"] = round((time.perf_counter() - start_time) * 1000, 2)
+        return validation
+
+    def result(self, validation_id: str) -> Dict[str, Any]:
+        """{"status": "pending" | "done" | "failed" | "unknown", ...} for a submitted validation"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, result FROM validations WHERE id = ?", (validation_id,)
+            ).fetchone()
+
+        if row is None:
+            return {"validation_id": validation_id, "status": "unknown"}
+        return {"validation_id": validation_id, "status": row[0], **(json.loads(row[1]) if row[1] else {})}
+
+    def after_fork(self):
+        """Executor threads and SQLite connections do not survive fork(): give the worker its own"""
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="validation")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self._connect()
+
+    def stats(self) -> Dict[str, int]:
+        return {"pending": self.pending, "skipped": self.skipped}
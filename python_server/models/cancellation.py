@@ -0,0 +1,35 @@
+import threading
+from typing import Optional
+
+class GenerationCancelled(Exception):
+    """Raised at a checkpoint once the client that asked for the work has gone away"""
+
+class CancellationToken:
+    """Thread-safe flag set when a streaming client disconnects
+
+    Retrieval, reranking and generation check it between units of work, so an
+    abandoned request stops at the next checkpoint instead of running to completion.
+    """
+
+    def __init__(self, parent: Optional["CancellationToken"] = None):
+        self._event = threading.Event()
+        self.parent = parent  # Cancelling the parent cancels this token too
+        self.cancelled_at: Optional[str] = None  # Stage that observed the cancellation
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    def raise_if_cancelled(self, stage: str):
+        if self.cancelled:
+            if self.cancelled_at is None:
+                self.cancelled_at = stage
+            raise GenerationCancelled(stage)
+
+def check_cancelled(cancel: Optional[CancellationToken], stage: str):
+    """Checkpoint helper for code paths where the token is optional"""
+    if cancel is not None:
+        cancel.raise_if_cancelled(stage)
@@ -0,0 +1,104 @@
+import numpy as np
+from typing import List, Dict, Optional
+from .cross_encoder_reranker import CrossEncoderReranker
+from .cancellation import CancellationToken
+
+class CandidateFeatures:
+    """Per-request feature matrix over retrieval candidates, computed once and shared by
+    reranking, confidence metrics and the proceed decision"""
+
+    COLUMNS = ("similarity", "overlap", "position", "length", "cross_encoder")
+
+    def __init__(self, query: str, docs: List[Dict], matrix: np.ndarray,
+                 query_terms: List[str], term_hits: np.ndarray):
+        self.query = query
+        self.docs = docs
+        self.matrix = matrix          # shape (len(docs), len(COLUMNS))
+        self.query_terms = query_terms
+        self.term_hits = term_hits    # shape (len(docs), len(unique terms)), bool
+
+    @classmethod
+    def compute(cls, query: str, docs: List[Dict],
+                reranker: Optional[CrossEncoderReranker] = None) -> "CandidateFeatures":
+        """Single lexical pass plus at most one batched cross-encoder call"""
+        query_terms = query.lower().split()
+        unique_terms = list(dict.fromkeys(query_terms))
+        matrix = np.zeros((len(docs), len(cls.COLUMNS)))
+        term_hits = np.zeros((len(docs), len(unique_terms)), dtype=bool)
+
+        # Terms of 2 chars or less never count as overlap or coverage
+        term_weights = np.array(
+            [query_terms.count(term) if len(term) > 2 else 0 for term in unique_terms], dtype=float
+        )
+
+        for i, doc in enumerate(docs):
+            content = doc.get("content", "").lower()
+            metadata = doc.get("metadata", {})
+            term_hits[i] = [term in content for term in unique_terms]
+
+            # Position bonus (prefer earlier chunks in documents)
+            position_bonus = 1.0
+            if 'chunk_index' in metadata:
+                total_chunks = metadata.get('total_chunks', 1)
+                if total_chunks > 1:
+                    position_bonus = 1.0 - (metadata['chunk_index'] / total_chunks) * 0.3
+
+            matrix[i, 0] = doc.get("similarity_score", 0)
+            matrix[i, 1] = (term_hits[i] @ term_weights) / len(query_terms) if query_terms else 0.0
+            matrix[i, 2] = position_bonus
+            matrix[i, 3] = min(len(content) / 500, 1.0)  # Normalize to 1.0 for 500+ chars
+
+        # Cross-encoder probabilities; NaN marks "not computed"
+        matrix[:, 4] = np.nan
+        features = cls(query, docs, matrix, query_terms, term_hits)
+        if reranker is not None:
+            features.add_cross_encoder(reranker)
+
+        return features
+
+    def add_cross_encoder(self, reranker: CrossEncoderReranker,
+                          cancel: Optional[CancellationToken] = None) -> bool:
+        """Fill the cross-encoder column with one batched call; False if unavailable"""
+        if self.has_cross_encoder:
+            return True
+        if not self.docs or not reranker.available:
+            return False
+
+        return self.set_cross_encoder_logits(reranker.score(
+            self.query,
+            [doc.get("content", "") for doc in self.docs],
+            [doc.get("metadata", {}).get("file_id") for doc in self.docs],
+            cancel
+        ))
+
+    def set_cross_encoder_logits(self, logits: List[float]) -> bool:
+        """Fill the cross-encoder column from logits scored elsewhere (aligned with docs)"""
+        logits = np.array(logits)
+        if not self.docs or len(logits) != len(self.docs):
+            return False
+
+        self.matrix[:, 4] = 1 / (1 + np.exp(-logits))
+        return True
+
+    def copy(self) -> "CandidateFeatures":
+        """Independent matrix over the same candidates, for a stage that fills in columns"""
+        return CandidateFeatures(self.query, self.docs, self.matrix.copy(), self.query_terms, self.term_hits)
+
+    def column(self, name: str) -> np.ndarray:
+        return self.matrix[:, self.COLUMNS.index(name)]
+
+    @property
+    def has_cross_encoder(self) -> bool:
+        return len(self.docs) > 0 and not np.isnan(self.column("cross_encoder")).any()
+
+    def coverage(self) -> float:
+        """Share of distinct query terms (longer than 2 chars) found in any candidate"""
+        if not self.query_terms or not self.docs:
+            return 0.0
+        unique_terms = list(dict.fromkeys(self.query_terms))
+        long_terms = np.array([len(term) > 2 for term in unique_terms])
+        covered = self.term_hits.any(axis=0) & long_terms
+        return float(covered.sum() / len(unique_terms))
+
+    def total_content_length(self) -> int:
+        return sum(len(doc.get("content", "")) for doc in self.docs)
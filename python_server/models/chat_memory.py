@@ -1,43 +1,100 @@
 from langchain.chains import ConversationChain
-from langchain.memory import ConversationBufferMemory
-from langchain_ollama import OllamaLLM
-from langchain.schema import BaseMemory
 import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Optional, Dict, Any
+import numpy as np
 from config import Config
+from .conversation_memory import ConversationSummarizer, RollingSummaryMemory
+from .conversation_store import ConversationStore
+from .ollama_llm import create_llm
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global store for conversation chains
-conversation_chains = {}
-
 class ChatMemory:
-    def __init__(self, model_name: str = Config.LLM_MODEL):
-        try:
-            self.llm = OllamaLLM(model=model_name)
-            # Test the model connection
-            test_response = self.llm.invoke("Say 'OK'")
-            logger.info(f"Model {model_name} initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize OllamaLLM: {e}")
-            raise
+    """Conversations persisted in a ConversationStore, with an LRU of live chains
+
+    Any worker can continue any conversation: a chain is materialized from the store
+    on first use, kept among the max_chains most recently used, and reloaded when
+    another worker has written to its conversation since (the stored etag moved).
+    """
 
-    def get_conversation_chain(self, conv_id: str) -> ConversationChain:
-        """Get or create a conversation chain for the given conversation ID."""
+    def __init__(self, model_name: str = Config.LLM_MODEL,
+                 max_chains: int = Config.CONVERSATION_CACHE_SIZE,
+                 window: int = 1000):
+        # No test call here: constructing the client is offline, and /api/health
+        # already checks that the model responds
+        self.llm = create_llm(model_name)
+        self.summarizer = ConversationSummarizer(self.llm)
+        self.store = ConversationStore()
+        self.max_chains = max_chains
+        self.chains: "OrderedDict[str, ConversationChain]" = OrderedDict()
+        self._lock = threading.Lock()  # Guards chains, _load_ms and the counters
+        self._load_ms = deque(maxlen=window)
+        self.hits = 0
+        self.loads = 0
+        self.reloads = 0
+        self.evictions = 0
+
+    def get_conversation_chain(self, conv_id: str, create: bool = True) -> Optional[ConversationChain]:
+        """Get or create a conversation chain for the given conversation ID.
+
+        With create=False, returns None for a conversation that was never stored.
+        """
         if not conv_id:
             raise ValueError("conv_id cannot be empty")
-            
-        if conv_id not in conversation_chains:
-            conversation_chains[conv_id] = self._create_new_chain()
+
+        with self._lock:
+            chain = self.chains.get(conv_id)
+            if chain is not None:
+                self.chains.move_to_end(conv_id)
+        etag = self.store.etag(conv_id)
+        if chain is not None and not chain.memory.stale and chain.memory.etag == etag:
+            with self._lock:
+                self.hits += 1
+            return chain
+
+        start_time = time.perf_counter()
+        state = self.store.load(conv_id)
+        if state is None and not create:
+            return None
+        chain = self._create_new_chain(conv_id, state)
+        with self._lock:
+            if state is not None:
+                self._load_ms.append((time.perf_counter() - start_time) * 1000)
+                if conv_id in self.chains:
+                    self.reloads += 1
+                else:
+                    self.loads += 1
+            self._remember(conv_id, chain)
+        if state is None:
             logger.info(f"Created new conversation chain for ID: {conv_id}")
-        return conversation_chains[conv_id]
+        # Catch up on folds another worker left pending
+        chain.memory.fold_overflow()
+        return chain
+
+    def _remember(self, conv_id: str, chain: ConversationChain):
+        """Insert as most recently used, evicting beyond max_chains; caller holds the lock"""
+        self.chains[conv_id] = chain
+        self.chains.move_to_end(conv_id)
+        while len(self.chains) > self.max_chains:
+            self.chains.popitem(last=False)
+            self.evictions += 1
 
-    def _create_new_chain(self) -> ConversationChain:
-        """Create a new conversation chain with memory."""
+    def _create_new_chain(self, conv_id: str, state: Optional[Dict[str, Any]] = None) -> ConversationChain:
+        """Create a conversation chain with bounded memory (see RollingSummaryMemory), from stored state if any."""
+        memory = RollingSummaryMemory(summarizer=self.summarizer, store=self.store, conv_id=conv_id)
+        if state is not None:
+            memory.summary = state["summary"]
+            memory.turns = state["turns"]
+            memory.turn_count = state["turn_count"]
+            memory.etag = state["etag"]
         return ConversationChain(
             llm=self.llm,
-            memory=ConversationBufferMemory(),
+            memory=memory,
             verbose=True  # Set to True for debugging
         )
 
@@ -67,29 +124,25 @@ class ChatMemory:
             return f"Error: {str(e)}"
 
     def get_conversation_history(self, conv_id: str) -> str:
-        """Get the full conversation history for a given ID."""
-        if conv_id in conversation_chains:
-            chain = conversation_chains[conv_id]
+        """Get the conversation history the model sees: running summary plus recent turns."""
+        chain = self.get_conversation_chain(conv_id, create=False)
+        if chain is not None:
             return chain.memory.buffer
         return "No conversation history found."
 
     def summarize_conversation(self, conv_id: str) -> str:
-        """Summarize the conversation history."""
+        """Summarize the conversation history.
+
+        Returns the running summary kept by the memory; only turns not folded into it
+        yet are summarized here, never the full history.
+        """
         try:
-            if conv_id in conversation_chains:
-                chain = conversation_chains[conv_id]
-                history = chain.memory.buffer
-                if not history:
+            chain = self.get_conversation_chain(conv_id, create=False)
+            if chain is not None:
+                memory = chain.memory
+                if not memory.summary and not memory.turns:
                     return "No conversation to summarize."
-                
-                summary_prompt = f"""Please provide a concise summary of the following conversation:
-                
-                {history}
-                
-                Summary:"""
-                
-                summary = self.llm.invoke(summary_prompt)
-                return summary
+                return memory.current_summary()
             return "Conversation not found."
         except Exception as e:
             logger.error(f"Error summarizing conversation: {e}")
@@ -98,11 +151,12 @@ class ChatMemory:
     def load_summary(self, conv_id: str, summary: str):
         """Load a summary into a new conversation chain."""
         try:
-            chain = self._create_new_chain()
-            # Initialize with the summary as context
-            chain.memory.save_context({"input": "Previous conversation summary:"}, 
-                                    {"output": summary})
-            conversation_chains[conv_id] = chain
+            chain = self._create_new_chain(conv_id)
+            # Initialize with the summary as context; new turns are folded onto it
+            chain.memory.summary = summary
+            chain.memory.etag = self.store.replace(conv_id, summary)
+            with self._lock:
+                self._remember(conv_id, chain)
             logger.info(f"Loaded summary for conversation ID: {conv_id}")
         except Exception as e:
             logger.error(f"Error loading summary: {e}")
@@ -110,12 +164,37 @@ class ChatMemory:
 
     def clear_memory(self, conv_id: str):
         """Clear conversation memory for the given ID."""
-        if conv_id in conversation_chains:
-            del conversation_chains[conv_id]
+        with self._lock:
+            self.chains.pop(conv_id, None)
+        if self.store.delete(conv_id):
             logger.info(f"Cleared memory for conversation ID: {conv_id}")
         else:
             logger.warning(f"No conversation found for ID: {conv_id}")
 
+    def after_fork(self):
+        """Chains materialized before fork() would go stale unnoticed: start each worker empty"""
+        self.summarizer.after_fork()
+        self.store.after_fork()
+        self._lock = threading.Lock()
+        self.chains = OrderedDict()
+
     def list_active_conversations(self) -> list:
-        """List all active conversation IDs."""
-        return list(conversation_chains.keys())
\ No newline at end of file
+        """List all stored conversation IDs, most recently active first."""
+        return self.store.list_ids()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            load_ms = list(self._load_ms)
+            cached_chains, hits, loads, reloads, evictions = (
+                len(self.chains), self.hits, self.loads, self.reloads, self.evictions
+            )
+        return {
+            "cached_chains": cached_chains,
+            "max_chains": self.max_chains,
+            "hits": hits,
+            "loads": loads,
+            "reloads": reloads,
+            "evictions": evictions,
+            "load_ms_p50": round(float(np.percentile(load_ms, 50)), 2) if load_ms else None,
+            "load_ms_p99": round(float(np.percentile(load_ms, 99)), 2) if load_ms else None
+        }
\ No newline at end of file
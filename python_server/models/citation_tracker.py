@@ -0,0 +1,47 @@
+import re
+from typing import List, Dict, Any
+
+def build_citation(citation_id: int, doc: Dict) -> Dict[str, Any]:
+    """Source metadata for a [citation_id] marker pointing at doc"""
+    doc_metadata = doc["metadata"]
+    return {
+        "citation_id": citation_id,
+        "source_filename": doc_metadata.get("original_filename", "Unknown"),
+        "page_number": doc_metadata.get("page_number"),
+        "source_url": doc_metadata.get("source_url", "#"),
+        "similarity_score": doc.get("similarity_score", 0)
+    }
+
+class CitationTracker:
+    """Finds [n] citation markers in an answer while it streams
+
+    feed() takes chunks as the LLM produces them and returns the citations first
+    referenced in that chunk. A marker split across chunks ("... [" + "2] ...") is
+    held back until it is complete. Markers outside 1..len(retrieved_docs) are ignored,
+    as in the grounding classes' _extract_citations.
+    """
+
+    MARKER = re.compile(r"\[(\d+)\]")
+    # An unfinished marker at the end of the text seen so far
+    PARTIAL_MARKER = re.compile(r"\[\d*$")
+
+    def __init__(self, retrieved_docs: List[Dict]):
+        self.retrieved_docs = retrieved_docs
+        self.seen = set()
+        self._pending = ""
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        text = self._pending + chunk
+        partial = self.PARTIAL_MARKER.search(text)
+        self._pending = text[partial.start():] if partial else ""
+        return self._new_citations(text[:partial.start()] if partial else text)
+
+    def _new_citations(self, text: str) -> List[Dict[str, Any]]:
+        citations = []
+        for match in self.MARKER.finditer(text):
+            citation_id = int(match.group(1))
+            if citation_id in self.seen or not 1 <= citation_id <= len(self.retrieved_docs):
+                continue
+            self.seen.add(citation_id)
+            citations.append(build_citation(citation_id, self.retrieved_docs[citation_id - 1]))
+        return citations
@@ -1,25 +1,29 @@
 import numpy as np
-from typing import List, Dict, Any, Tuple
-from sentence_transformers import CrossEncoder
+from typing import List, Dict, Any, Tuple, Optional
+from .cross_encoder_reranker import CrossEncoderReranker
+from .candidate_features import CandidateFeatures
 import re
 
 class ConfidenceScorer:
-    def __init__(self):
-        # Initialize cross-encoder for relevance scoring
-        self.cross_encoder = None
+    def __init__(self, reranker: Optional[CrossEncoderReranker] = None):
+        # Cross-encoder for relevance scoring, shared with the retriever when provided
+        self.reranker = reranker
         self._initialize_models()
     
     def _initialize_models(self):
         """Initialize models for confidence scoring"""
-        try:
-            # Use a lightweight cross-encoder for relevance scoring
-            self.cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
-        except:
+        if self.reranker is None:
+            self.reranker = CrossEncoderReranker()
+        if not self.reranker.available:
             print("Warning: Cross-encoder not available, using fallback scoring")
-            self.cross_encoder = None
     
-    def calculate_retrieval_confidence(self, query: str, retrieved_docs: List[Dict]) -> Dict[str, float]:
-        """Calculate multiple confidence metrics for retrieval"""
+    def calculate_retrieval_confidence(self, query: str, retrieved_docs: List[Dict],
+                                       features: Optional[CandidateFeatures] = None) -> Dict[str, float]:
+        """Calculate multiple confidence metrics for retrieval
+        
+        Pass the request's CandidateFeatures to reuse its lexical and cross-encoder
+        scores; otherwise they are computed here.
+        """
         if not retrieved_docs:
             return {
                 "overall_confidence": 0.0,
@@ -30,66 +34,52 @@ class ConfidenceScorer:
                 "sufficient_content": False
             }
         
-        similarity_scores = [doc.get('similarity_score', 0) for doc in retrieved_docs]
-        max_similarity = max(similarity_scores) if similarity_scores else 0.0
-        mean_similarity = np.mean(similarity_scores) if similarity_scores else 0.0
+        if features is None:
+            features = CandidateFeatures.compute(query, retrieved_docs, self.reranker)
+        
+        similarity_scores = features.column("similarity")
+        max_similarity = similarity_scores.max()
+        mean_similarity = similarity_scores.mean()
         
         # Calculate coverage score (how well the query terms are covered)
-        coverage_score = self._calculate_coverage_score(query, retrieved_docs)
+        coverage_score = features.coverage()
         
-        # Calculate cross-encoder relevance score if available
-        relevance_score = self._calculate_relevance_score(query, retrieved_docs)
+        # Calculate cross-encoder relevance score if available (None when it was not computed)
+        relevance_score = self._calculate_relevance_score(features)
         
         # Check if we have sufficient content
-        total_content_length = sum(len(doc.get('content', '')) for doc in retrieved_docs)
-        sufficient_content = total_content_length > 500  # At least 500 characters
+        sufficient_content = features.total_content_length() > 500  # At least 500 characters
         
-        # Overall confidence (weighted combination)
+        # Overall confidence (weighted combination). Without cross-encoder scores (the
+        # cascade stopped at the dense or lexical stage, or no model is loaded) the other
+        # signals are reweighted rather than pulled toward a neutral guess, so a clear-cut
+        # ranking is not scored below an ambiguous one that reached the cross-encoder
         overall_confidence = (
             0.4 * max_similarity +
             0.3 * mean_similarity +
-            0.2 * coverage_score +
-            0.1 * relevance_score
+            0.2 * coverage_score
         )
+        if relevance_score is None:
+            overall_confidence /= 0.9
+        else:
+            overall_confidence += 0.1 * relevance_score
         
         return {
             "overall_confidence": float(overall_confidence),
             "max_similarity": float(max_similarity),
             "mean_similarity": float(mean_similarity),
             "coverage_score": float(coverage_score),
-            "relevance_score": float(relevance_score),
+            "relevance_score": None if relevance_score is None else float(relevance_score),
             "sufficient_content": sufficient_content
         }
     
-    def _calculate_coverage_score(self, query: str, retrieved_docs: List[Dict]) -> float:
-        """Calculate how well query terms are covered in retrieved documents"""
-        query_terms = set(query.lower().split())
-        if not query_terms:
-            return 0.0
-        
-        total_content = " ".join([doc.get('content', '').lower() for doc in retrieved_docs])
-        
-        covered_terms = 0
-        for term in query_terms:
-            if len(term) > 2 and term in total_content:  # Only consider terms longer than 2 chars
-                covered_terms += 1
-        
-        return covered_terms / len(query_terms)
-    
-    def _calculate_relevance_score(self, query: str, retrieved_docs: List[Dict]) -> float:
-        """Calculate relevance score using cross-encoder"""
-        if not self.cross_encoder or not retrieved_docs:
-            return 0.5  # Neutral fallback
+    def _calculate_relevance_score(self, features: CandidateFeatures) -> Optional[float]:
+        """Mean cross-encoder probability of the top 3 candidates by vector similarity, or None if not scored"""
+        if not features.has_cross_encoder:
+            return None
         
-        try:
-            # Sample the most relevant documents for cross-encoding
-            sample_docs = retrieved_docs[:3]  # Use top 3 for efficiency
-            pairs = [(query, doc.get('content', '')[:500]) for doc in sample_docs]
-            
-            scores = self.cross_encoder.predict(pairs)
-            return float(np.mean(scores))
-        except:
-            return 0.5
+        # Candidates arrive in similarity order; scores are already computed for all of them
+        return float(np.mean(features.column("cross_encoder")[:3]))
     
     def should_proceed_with_llm(self, confidence_metrics: Dict) -> Tuple[bool, str]:
         """Determine if we should proceed with LLM generation"""
@@ -0,0 +1,133 @@
+from typing import List, Dict, Any, Optional, Tuple
+from config import Config
+
+def count_tokens(text: str) -> int:
+    """Cheap token estimate (Config.CONTEXT_CHARS_PER_TOKEN characters per token)
+
+    Computed once per chunk at ingest time and stored as metadata["token_count"];
+    the packer only falls back to it for chunks ingested before that.
+    """
+    return max(1, round(len(text) / Config.CONTEXT_CHARS_PER_TOKEN)) if text else 0
+
+class ContextPacker:
+    """Packs retrieved chunks into the LLM context under a token budget
+
+    Chunks from the same file and page that are adjacent in the source (consecutive
+    chunk_index, or sharing the splitter overlap) are merged into one passage with the
+    overlap removed. Passages are then added in relevance order while they fit the
+    budget. A merged passage is labelled with the citation number of its most relevant
+    chunk, so citation numbers still map onto the retrieved_docs list.
+    """
+
+    def __init__(self,
+                 token_budget: int = Config.CONTEXT_TOKEN_BUDGET,
+                 max_overlap: int = Config.CHUNK_OVERLAP,
+                 min_overlap: int = Config.CONTEXT_MIN_OVERLAP):
+        self.token_budget = token_budget
+        self.max_overlap = max_overlap
+        self.min_overlap = min_overlap
+
+    def format(self, retrieved_docs: List[Dict]) -> str:
+        """Format packed passages with citation markers"""
+        context_parts = []
+
+        for passage in self.pack(retrieved_docs):
+            context_parts.append(f"{passage['source_info']}\n{passage['content']}\n")
+
+        return "\n".join(context_parts)
+
+    def pack(self, retrieved_docs: List[Dict]) -> List[Dict[str, Any]]:
+        """Merged passages that fit the budget, most relevant first
+
+        retrieved_docs must already be sorted by relevance (as the retrievers return them).
+        Each passage has "content", "source_info", "citation_ids" and "tokens".
+        """
+        passages = []
+        budget = self.token_budget
+
+        for passage in self._merge(retrieved_docs):
+            passage["tokens"] += count_tokens(passage["source_info"])
+            if passage["tokens"] <= budget:
+                passages.append(passage)
+                budget -= passage["tokens"]
+            elif not passages:
+                # Never send an empty context: cut the most relevant passage down to size
+                passages.append(self._truncate(passage, budget))
+                budget = 0
+
+        return passages
+
+    def _merge(self, retrieved_docs: List[Dict]) -> List[Dict[str, Any]]:
+        """Join adjacent chunks of the same file and page; passages keep the rank of their best chunk"""
+        passages: List[Dict[str, Any]] = []
+        by_source: Dict[Tuple, List[Dict[str, Any]]] = {}
+
+        for citation_id, doc in enumerate(retrieved_docs, 1):
+            metadata = doc["metadata"]
+            chunk = {
+                "content": doc["content"],
+                "citation_ids": [citation_id],
+                "tokens": metadata.get("token_count") or count_tokens(doc["content"]),
+                "first_index": metadata.get("chunk_index"),
+                "last_index": metadata.get("chunk_index"),
+            }
+
+            source = (metadata.get("file_id"), metadata.get("page_number"))
+            for passage in by_source.get(source, []) if source[0] is not None else []:
+                if self._join(passage, chunk):
+                    break
+            else:
+                chunk["source_info"] = self._source_info(citation_id, metadata)
+                passages.append(chunk)
+                by_source.setdefault(source, []).append(chunk)
+
+        return passages
+
+    def _join(self, passage: Dict[str, Any], chunk: Dict[str, Any]) -> bool:
+        """Append or prepend chunk to passage if they are neighbours in the source"""
+        if passage["last_index"] is not None and chunk["first_index"] is not None:
+            if chunk["first_index"] == passage["last_index"] + 1:
+                order = (passage, chunk)
+            elif chunk["last_index"] == passage["first_index"] - 1:
+                order = (chunk, passage)
+            else:
+                return False
+            overlap = self._overlap(order[0]["content"], order[1]["content"])
+        else:
+            # No chunk positions (older ingests): adjacency shows as the shared overlap
+            overlap = self._overlap(passage["content"], chunk["content"])
+            order = (passage, chunk)
+            if overlap < self.min_overlap:
+                overlap = self._overlap(chunk["content"], passage["content"])
+                order = (chunk, passage)
+            if overlap < self.min_overlap:
+                return False
+
+        head, tail = order
+        separator = "" if overlap else "\n"
+        passage["content"] = head["content"] + separator + tail["content"][overlap:]
+        passage["tokens"] += chunk["tokens"] - count_tokens(tail["content"][:overlap])
+        passage["citation_ids"] += chunk["citation_ids"]
+        passage["first_index"], passage["last_index"] = head["first_index"], tail["last_index"]
+        return True
+
+    def _overlap(self, head: str, tail: str) -> int:
+        """Length of the longest suffix of head that starts tail (the splitter overlap)"""
+        for length in range(min(len(head), len(tail), self.max_overlap), self.min_overlap - 1, -1):
+            if head.endswith(tail[:length]):
+                return length
+        return 0
+
+    def _truncate(self, passage: Dict[str, Any], budget: int) -> Dict[str, Any]:
+        header_tokens = count_tokens(passage["source_info"])
+        max_chars = max(0, budget - header_tokens) * Config.CONTEXT_CHARS_PER_TOKEN
+        passage["content"] = passage["content"][:max_chars]
+        passage["tokens"] = header_tokens + count_tokens(passage["content"])
+        return passage
+
+    @staticmethod
+    def _source_info(citation_id: int, metadata: Dict[str, Any]) -> str:
+        source_info = f"Source [{citation_id}]: {metadata.get('original_filename', 'Document')}"
+        if 'page_number' in metadata:
+            source_info += f" (Page {metadata['page_number']})"
+        return source_info
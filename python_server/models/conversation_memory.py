@@ -0,0 +1,195 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+from langchain.schema import BaseMemory
+from pydantic import Field
+from config import Config
+from .context_packer import count_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """Progressively summarize the lines of conversation provided, adding onto the previous summary and returning a new summary. Keep names, numbers and decisions.
+
+Current summary:
+{summary}
+
+New lines of conversation:
+{new_lines}
+
+New summary:"""
+
+def format_turns(turns: List[Dict[str, str]]) -> str:
+    """Turns in the Human:/AI: layout of ConversationBufferMemory"""
+    return "\n".join(f"Human: {turn['input']}\nAI: {turn['output']}" for turn in turns)
+
+class ConversationSummarizer:
+    """Runs incremental summary updates for every conversation on a small pool of its own
+
+    Each update sends only the previous summary and the turns being folded in, so its
+    cost does not grow with the length of the conversation.
+    """
+
+    def __init__(self, llm, max_workers: int = Config.MEMORY_SUMMARY_WORKERS):
+        self.llm = llm
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="memory-summary")
+        # Guards the state of every RollingSummaryMemory using this summarizer
+        self.lock = threading.Lock()
+
+    def update(self, summary: str, turns: List[Dict[str, str]]) -> str:
+        prompt = SUMMARY_PROMPT.format(summary=summary or "(none)", new_lines=format_turns(turns))
+        return self.llm.invoke(prompt).strip()
+
+    def submit(self, fn, *args):
+        self._executor.submit(fn, *args)
+
+    def after_fork(self):
+        """Executor threads do not survive fork(): give the worker its own"""
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="memory-summary")
+        self.lock = threading.Lock()
+
+class RollingSummaryMemory(BaseMemory):
+    """Conversation memory with a bounded prompt footprint
+
+    The most recent turns are kept verbatim: at most max_turns, and no more than
+    token_budget (estimated) tokens, though the latest turn is always kept. Turns
+    that fall out of that window are folded into a running summary by the
+    summarizer in the background, so no request waits on a summary call; until a
+    fold completes the prompt carries the previous summary and the window only.
+
+    With a store, every turn and summary update is persisted under conv_id, and
+    etag tracks the stored version this copy reflects. stale is set once another
+    worker wrote to the same conversation, so the copy is reloaded before reuse.
+    """
+
+    summarizer: Any
+    max_turns: int = Config.MEMORY_MAX_TURNS
+    token_budget: int = Config.MEMORY_TOKEN_BUDGET
+    memory_key: str = "history"
+    input_key: str = "input"
+    output_key: str = "response"
+    summary: str = ""
+    turns: List[Dict[str, Any]] = Field(default_factory=list)  # Not yet folded into the summary, oldest first
+    turn_count: int = 0
+    folding: bool = False
+    store: Any = None                  # ConversationStore
+    conv_id: str = ""
+    etag: Optional[str] = None
+    stale: bool = False
+    # Bumped by clear(), so a fold started before it is discarded
+    epoch: int = 0
+    # (turn_count, summary) of the last current_summary() that covered the verbatim turns too
+    summary_cache: Optional[Tuple[int, str]] = None
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    @property
+    def buffer(self) -> str:
+        """What the prompt sees: the running summary, then the verbatim turns"""
+        with self.summarizer.lock:
+            summary, window = self.summary, self._window()
+        parts = [f"Summary of the earlier conversation: {summary}"] if summary else []
+        if window:
+            parts.append(format_turns(window))
+        return "\n".join(parts)
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, str]:
+        return {self.memory_key: self.buffer}
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        turn = {"input": inputs[self.input_key], "output": outputs[self.output_key]}
+        if self.store is not None:
+            turn["seq"], previous, etag = self.store.append_turn(self.conv_id, turn)
+        with self.summarizer.lock:
+            turn.setdefault("seq", self.turn_count + 1)
+            self.turns.append(turn)
+            self.turn_count += 1
+            if self.store is not None:
+                self._track(previous, etag)
+        self.fold_overflow()
+
+    def clear(self) -> None:
+        with self.summarizer.lock:
+            self.summary = ""
+            self.turns = []
+            self.turn_count = 0
+            self.summary_cache = None
+            self.epoch += 1
+        if self.store is not None:
+            etag = self.store.replace(self.conv_id)
+            with self.summarizer.lock:
+                self.etag = etag
+
+    def current_summary(self) -> str:
+        """The running summary brought up to date with the verbatim turns
+
+        Only the turns not folded yet (bounded by the window) are sent to the LLM, and
+        the result is reused until the next turn.
+        """
+        with self.summarizer.lock:
+            summary, turns, turn_count = self.summary, list(self.turns), self.turn_count
+            if not turns:
+                return summary
+            if self.summary_cache is not None and self.summary_cache[0] == turn_count:
+                return self.summary_cache[1]
+
+        updated = self.summarizer.update(summary, turns)
+        with self.summarizer.lock:
+            self.summary_cache = (turn_count, updated)
+        return updated
+
+    def _track(self, previous: Optional[str], etag: str):
+        """Follow our own write; caller holds the lock"""
+        if previous != self.etag:
+            # Another worker wrote in between: this copy misses its change
+            self.stale = True
+        self.etag = etag
+
+    def _window(self) -> List[Dict[str, str]]:
+        """Most recent turns within max_turns and token_budget; caller holds the lock"""
+        window, tokens = [], 0
+        for turn in reversed(self.turns[-self.max_turns:]):
+            tokens += count_tokens(turn["input"]) + count_tokens(turn["output"])
+            if window and tokens > self.token_budget:
+                break
+            window.append(turn)
+        return window[::-1]
+
+    def fold_overflow(self):
+        """Queue the turns that left the window for folding into the summary"""
+        with self.summarizer.lock:
+            if self.folding:
+                return
+            overflow = self.turns[:len(self.turns) - len(self._window())]
+            if not overflow:
+                return
+            self.folding = True
+            summary, epoch = self.summary, self.epoch
+        self.summarizer.submit(self._fold, summary, overflow, epoch)
+
+    def _fold(self, summary: str, overflow: List[Dict[str, str]], epoch: int):
+        try:
+            new_summary = self.summarizer.update(summary, overflow)
+        except Exception as e:
+            # The turns stay queued; the next turn retries
+            logger.error(f"Error updating conversation summary: {e}")
+            new_summary = None
+
+        with self.summarizer.lock:
+            self.folding = False
+            if new_summary is None or epoch != self.epoch:
+                return
+            self.summary = new_summary
+            del self.turns[:len(overflow)]
+        if self.store is not None:
+            written = self.store.save_summary(self.conv_id, new_summary, overflow[-1]["seq"])
+            with self.summarizer.lock:
+                if written is None:
+                    self.stale = True
+                else:
+                    self._track(*written)
+        # Turns that left the window while this update ran
+        self.fold_overflow()
@@ -0,0 +1,166 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Tuple
+from config import Config
+
+class ConversationStore:
+    """Conversation turns and running summaries, persisted in SQLite
+
+    Every turn is kept; "folded" is the seq of the last turn already folded into the
+    summary, so a conversation is materialized from its summary and the turns after
+    it. The database is shared by all gunicorn workers and survives restarts.
+
+    Each write replaces the conversation's etag and returns (previous etag, new etag):
+    a worker whose copy carried the previous etag is still current, any other copy is
+    stale and must be reloaded before its next turn.
+    """
+
+    def __init__(self, db_path: str = Config.CONVERSATION_STORE_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._connect()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS conversations (
+                conv_id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL DEFAULT '',
+                folded INTEGER NOT NULL DEFAULT 0,
+                turn_count INTEGER NOT NULL DEFAULT 0,
+                etag TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS turns (
+                conv_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                input TEXT NOT NULL,
+                output TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (conv_id, seq)
+            )""")
+        self._conn.commit()
+
+    def _connect(self):
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+
+    def after_fork(self):
+        """SQLite connections must not cross fork(): give the worker its own"""
+        self._lock = threading.Lock()
+        self._connect()
+
+    def etag(self, conv_id: str) -> Optional[str]:
+        """Current etag of a conversation, or None if it is not stored"""
+        with self._lock:
+            row = self._conn.execute("SELECT etag FROM conversations WHERE conv_id = ?", (conv_id,)).fetchone()
+        return row[0] if row else None
+
+    def load(self, conv_id: str) -> Optional[Dict[str, Any]]:
+        """{"summary", "turns" (not folded yet), "turn_count", "etag"}, or None if not stored"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, folded, turn_count, etag FROM conversations WHERE conv_id = ?", (conv_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            turns = self._conn.execute(
+                "SELECT seq, input, output FROM turns WHERE conv_id = ? AND seq > ? ORDER BY seq",
+                (conv_id, row[1])
+            ).fetchall()
+        return {
+            "summary": row[0],
+            "turns": [{"seq": seq, "input": input, "output": output} for seq, input, output in turns],
+            "turn_count": row[2],
+            "etag": row[3]
+        }
+
+    def append_turn(self, conv_id: str, turn: Dict[str, str]) -> Tuple[int, Optional[str], str]:
+        """Store the next turn; returns (its seq, previous etag, new etag)"""
+        now = time.time()
+        with self._lock, self._write():
+            previous = self._etag_for_update(conv_id, now)
+            seq = self._conn.execute(
+                "SELECT turn_count + 1 FROM conversations WHERE conv_id = ?", (conv_id,)
+            ).fetchone()[0]
+            self._conn.execute(
+                "INSERT INTO turns (conv_id, seq, input, output, created_at) VALUES (?, ?, ?, ?, ?)",
+                (conv_id, seq, turn["input"], turn["output"], now)
+            )
+            etag = self._update(conv_id, now, "turn_count = ?", (seq,))
+        return seq, previous, etag
+
+    def save_summary(self, conv_id: str, summary: str, folded: int) -> Optional[Tuple[Optional[str], str]]:
+        """Store the running summary covering turns up to seq folded; returns (previous etag, new etag)
+
+        A summary covering no more turns than the stored one (another worker folded
+        as far meanwhile) is not written, and None is returned.
+        """
+        now = time.time()
+        with self._lock, self._write():
+            previous = self._etag_for_update(conv_id, now)
+            stored = self._conn.execute("SELECT folded FROM conversations WHERE conv_id = ?", (conv_id,)).fetchone()[0]
+            if folded <= stored:
+                return None
+            etag = self._update(conv_id, now, "summary = ?, folded = ?", (summary, folded))
+        return previous, etag
+
+    def replace(self, conv_id: str, summary: str = "") -> str:
+        """Start the conversation over, optionally from a summary; returns the new etag"""
+        now = time.time()
+        with self._lock, self._write():
+            self._etag_for_update(conv_id, now)
+            self._conn.execute("DELETE FROM turns WHERE conv_id = ?", (conv_id,))
+            # Folded stays at the last seq so new turns never reuse an old seq
+            return self._update(conv_id, now, "summary = ?, folded = turn_count", (summary,))
+
+    def delete(self, conv_id: str) -> bool:
+        with self._lock, self._write():
+            self._conn.execute("DELETE FROM turns WHERE conv_id = ?", (conv_id,))
+            deleted = self._conn.execute("DELETE FROM conversations WHERE conv_id = ?", (conv_id,)).rowcount
+        return deleted > 0
+
+    def list_ids(self) -> List[str]:
+        """Stored conversations, most recently updated first"""
+        with self._lock:
+            rows = self._conn.execute("SELECT conv_id FROM conversations ORDER BY updated_at DESC").fetchall()
+        return [row[0] for row in rows]
+
+    @contextmanager
+    def _write(self):
+        """Commit the write's transaction, or roll it back if any statement fails; caller holds the lock
+
+        A transaction left open by a failed statement would make every later BEGIN
+        IMMEDIATE on this connection fail.
+        """
+        try:
+            yield
+        except BaseException:
+            self._conn.rollback()
+            raise
+        self._conn.commit()
+
+    def _etag_for_update(self, conv_id: str, now: float) -> Optional[str]:
+        """Create the conversation row if needed and lock the database for this write; caller holds the lock"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        row = self._conn.execute("SELECT etag FROM conversations WHERE conv_id = ?", (conv_id,)).fetchone()
+        if row is None:
+            self._conn.execute(
+                "INSERT INTO conversations (conv_id, etag, updated_at) VALUES (?, ?, ?)",
+                (conv_id, uuid.uuid4().hex, now)
+            )
+            return None
+        return row[0]
+
+    def _update(self, conv_id: str, now: float, assignments: str, params: tuple) -> str:
+        """Apply a write and replace the etag; caller holds the lock and _write() commits"""
+        etag = uuid.uuid4().hex
+        self._conn.execute(
+            f"UPDATE conversations SET {assignments}, etag = ?, updated_at = ? WHERE conv_id = ?",
+            (*params, etag, now, conv_id)
+        )
+        return etag
@@ -0,0 +1,43 @@
+import os
+import sqlite3
+import threading
+from config import Config
+
+class CorpusGeneration:
+    """Monotonically increasing version of the vector DB contents
+
+    The ingestion worker bumps it after every upsert; API workers read it to tell
+    which corpus a cached result was computed against. It lives in SQLite so all
+    processes on the host see the same number.
+    """
+
+    def __init__(self, db_path: str = Config.CORPUS_GENERATION_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._connect()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS generation (id INTEGER PRIMARY KEY CHECK (id = 0), value INTEGER NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO generation (id, value) VALUES (0, 0)")
+        self._conn.commit()
+
+    def _connect(self):
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+
+    def after_fork(self):
+        """SQLite connections must not cross fork(): give the worker its own"""
+        self._lock = threading.Lock()
+        self._connect()
+
+    def current(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT value FROM generation WHERE id = 0").fetchone()[0]
+
+    def bump(self) -> int:
+        """Advance the generation after a write to the vector DB; returns the new value"""
+        with self._lock:
+            # The UPDATE takes the write lock, so concurrent bumps from other processes serialize
+            self._conn.execute("UPDATE generation SET value = value + 1 WHERE id = 0")
+            value = self._conn.execute("SELECT value FROM generation WHERE id = 0").fetchone()[0]
+            self._conn.commit()
+            return value
@@ -0,0 +1,191 @@
+import os
+import numpy as np
+from typing import List, Dict, Optional
+from .score_cache import ScoreCache
+from .cancellation import CancellationToken, check_cancelled
+from config import Config
+
+class CrossEncoderReranker:
+    """Batched cross-encoder scoring on CPU through an int8-quantized ONNX export"""
+
+    def __init__(self,
+                 model_name: str = Config.RERANKER_MODEL,
+                 max_length: int = Config.RERANKER_MAX_TOKENS,
+                 batch_size: int = Config.RERANKER_BATCH_SIZE,
+                 onnx_dir: str = Config.RERANKER_ONNX_DIR,
+                 num_threads: int = Config.RERANKER_NUM_THREADS,
+                 cache: Optional[ScoreCache] = None):
+        self.model_name = model_name
+        self.max_length = max_length  # Token budget per (query, passage) pair
+        self.batch_size = batch_size
+        self.onnx_dir = onnx_dir
+        self.num_threads = num_threads
+        self.tokenizer = None
+        self.quantized_path = None
+        self.session = None
+        self.cross_encoder = None
+        self.backend = None
+        self.cache = cache if cache is not None else ScoreCache(
+            max_entries=Config.SCORE_CACHE_SIZE, db_path=Config.SCORE_CACHE_PATH,
+            max_disk_entries=Config.SCORE_CACHE_DISK_SIZE
+        )
+        self._initialize_model()
+
+    @property
+    def available(self) -> bool:
+        return self.backend is not None
+
+    @property
+    def model_id(self) -> str:
+        # The token budget changes the scores, so it is part of the model identity
+        return f"{self.model_name}:{self.backend}:{self.max_length}"
+
+    def _initialize_model(self):
+        """Load the int8 ONNX model, falling back to the PyTorch cross-encoder"""
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            self.quantized_path = self._ensure_quantized_export()
+            self._open_session()
+            self.backend = "onnx-int8"
+            return
+        except Exception as e:
+            print(f"Warning: ONNX reranker not available ({e}), falling back to PyTorch cross-encoder")
+
+        try:
+            from sentence_transformers import CrossEncoder
+            self.cross_encoder = CrossEncoder(self.model_name, max_length=self.max_length)
+            self.backend = "torch"
+        except Exception:
+            print("Warning: Cross-encoder not available, reranking will use the heuristic")
+            self.backend = None
+
+    def _open_session(self):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.num_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            self.quantized_path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def after_fork(self):
+        """Re-create per-process state in a worker forked from a preloading master
+
+        PyTorch weights and the tokenizer stay shared copy-on-write. onnxruntime
+        sessions are not fork-safe (their thread pools do not survive fork), so each
+        worker opens its own session on the already exported int8 model.
+        """
+        self.cache.after_fork()
+        if self.backend == "onnx-int8":
+            self._open_session()
+        elif self.backend == "torch":
+            import torch
+            torch.set_num_threads(self.num_threads)
+
+    def _ensure_quantized_export(self) -> str:
+        """Export the model to ONNX and quantize it to int8 once; reuse the file afterwards"""
+        model_dir = os.path.join(self.onnx_dir, self.model_name.replace("/", "__"))
+        fp32_path = os.path.join(model_dir, "model.onnx")
+        int8_path = os.path.join(model_dir, "model.int8.onnx")
+
+        if os.path.exists(int8_path):
+            return int8_path
+
+        import torch
+        from transformers import AutoModelForSequenceClassification
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        os.makedirs(model_dir, exist_ok=True)
+        model = AutoModelForSequenceClassification.from_pretrained(self.model_name).eval()
+        sample = self.tokenizer(["query"], ["passage"], return_tensors="pt")
+        input_names = list(sample.keys())
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["logits"] = {0: "batch"}
+
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(sample[name] for name in input_names),
+                fp32_path,
+                input_names=input_names,
+                output_names=["logits"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14
+            )
+
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        os.remove(fp32_path)
+        return int8_path
+
+    def score(self, query: str, contents: List[str], file_ids: Optional[List[str]] = None,
+              cancel: Optional[CancellationToken] = None) -> List[float]:
+        """Raw cross-encoder logits for each (query, content) pair, in input order
+
+        Cached scores are reused; only the missing pairs go through the model, in one batch.
+        file_ids (aligned with contents) let the cache drop scores of re-ingested files.
+        """
+        if not contents or not self.available:
+            return []
+
+        keys = self.cache.make_keys(query, contents, self.model_id)
+        cached = self.cache.get_many(keys)
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+
+        fresh = self._predict(query, [contents[i] for i in missing], cancel) if missing else []
+        self.cache.put_many(
+            (keys[i], score, file_ids[i] if file_ids else None) for i, score in zip(missing, fresh)
+        )
+
+        scores = {keys[i]: score for i, score in zip(missing, fresh)}
+        return [cached[key] if key in cached else scores[key] for key in keys]
+
+    def _predict(self, query: str, contents: List[str],
+                 cancel: Optional[CancellationToken] = None) -> List[float]:
+        """Run the model over (query, content) pairs in batches"""
+        check_cancelled(cancel, "cross_encoder")
+        if self.backend == "torch":
+            pairs = [(query, content) for content in contents]
+            return [float(score) for score in self.cross_encoder.predict(pairs, batch_size=self.batch_size)]
+
+        scores = []
+        for i in range(0, len(contents), self.batch_size):
+            check_cancelled(cancel, "cross_encoder")
+            batch = contents[i:i + self.batch_size]
+            # longest_first trims the passage before the query, and still fits a
+            # query longer than max_length instead of raising
+            encoded = self.tokenizer(
+                [query] * len(batch),
+                batch,
+                padding=True,
+                truncation="longest_first",
+                max_length=self.max_length,
+                return_tensors="np"
+            )
+            feeds = {name: array.astype(np.int64) for name, array in encoded.items() if name in self.input_names}
+            logits = self.session.run(None, feeds)[0]
+            scores.extend(float(score) for score in logits.reshape(len(batch), -1)[:, 0])
+
+        return scores
+
+    def rerank(self, query: str, results: List[Dict], top_k: Optional[int] = None,
+               cancel: Optional[CancellationToken] = None) -> List[Dict]:
+        """Score all candidates in one pass and sort them by cross-encoder relevance"""
+        scores = self.score(
+            query,
+            [result["content"] for result in results],
+            [result.get("metadata", {}).get("file_id") for result in results],
+            cancel
+        )
+
+        for result, score in zip(results, scores):
+            result["rerank_score"] = score
+            # Sigmoid keeps relevance_score on the same 0-1 scale as the heuristic
+            result["relevance_score"] = float(1 / (1 + np.exp(-score)))
+
+        reranked = sorted(results, key=lambda x: x["relevance_score"], reverse=True)
+        return reranked[:top_k] if top_k else reranked
@@ -27,6 +27,7 @@ from langchain_ollama import OllamaEmbeddings
 from .hybrid_embedding_service import HybridEmbeddingService
 
 from config import Config
+from .context_packer import count_tokens
 
 API_BASE_URL = os.environ.get("API_URL")
 
@@ -107,22 +108,25 @@ class DocumentIngestor:
             scored_chunks.sort(key=lambda x: x[1], reverse=True)
             return [(chunk, score, {"method": "dense_only"}) for chunk, score in scored_chunks[:top_k]]
         
-        # Analyze query for optimal search parameters
+        # Analyze query for optimal search parameters; the retrieval planner reuses the analysis
+        query_analysis = self.embedding_service.analyze_query_type(query)
         if fusion_method == "auto":
-            query_analysis = self.embedding_service.analyze_query_type(query)
             fusion_method = query_analysis["fusion_method"]
             alpha = query_analysis["alpha"]
             query_type = query_analysis["query_type"]
         else:
             query_type = "manual"
         
-        # Perform hybrid search
+        # Perform hybrid search (the planner may skip the dense or sparse side)
+        search_stats = {}
         search_results = self.embedding_service.hybrid_search(
             query=query,
             chunks=chunks,
             top_k=top_k,
             fusion_method=fusion_method,
-            alpha=alpha
+            alpha=alpha,
+            stats=search_stats,
+            query_analysis=query_analysis
         )
         
         # Add search metadata
@@ -133,6 +137,8 @@ class DocumentIngestor:
                 "fusion_method": fusion_method,
                 "alpha": alpha,
                 "query_type": query_type,
+                "plan": search_stats.get("plan"),
+                "plan_elapsed_ms": search_stats.get("elapsed_ms"),
                 "chunk_type": chunk.get("type", "unknown"),
                 "has_timestamps": "start_time" in chunk.get("metadata", {})
             }
@@ -483,6 +489,10 @@ class DocumentIngestor:
                 "chunk_type": "text",
                 "chunk_id": str(uuid.uuid4()),
                 "upload_timestamp": file_metadata["upload_timestamp"],
+                # Position and size let the context packer merge neighbours and fill its budget
+                "chunk_index": i,
+                "total_chunks": len(split_docs),
+                "token_count": count_tokens(chunk_text),
                 **additional_metadata
             }
 
@@ -504,6 +514,7 @@ class DocumentIngestor:
                 "file_id": file_metadata["file_id"],
                 "upload_timestamp": file_metadata["upload_timestamp"],
                 "source_url": f"{API_BASE_URL}/api/file/v1/files/{file_metadata['file_id']}",
+                "token_count": count_tokens(content),
                 **additional_metadata
             }
         }
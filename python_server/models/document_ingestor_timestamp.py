@@ -26,6 +26,7 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_ollama import OllamaEmbeddings
 
 from config import Config
+from .context_packer import count_tokens
 
 API_BASE_URL = os.environ.get("API_URL")
 
@@ -379,6 +380,10 @@ class DocumentIngestor:
                 "chunk_type": "text",
                 "chunk_id": str(uuid.uuid4()),
                 "upload_timestamp": file_metadata["upload_timestamp"],
+                # Position and size let the context packer merge neighbours and fill its budget
+                "chunk_index": i,
+                "total_chunks": len(split_docs),
+                "token_count": count_tokens(chunk_text),
                 **additional_metadata
             }
 
@@ -400,6 +405,7 @@ class DocumentIngestor:
                 "file_id": file_metadata["file_id"],
                 "upload_timestamp": file_metadata["upload_timestamp"],
                 "source_url": f"{API_BASE_URL}/api/file/v1/files/{file_metadata['file_id']}",
+                "token_count": count_tokens(content),
                 **additional_metadata
             }
         }
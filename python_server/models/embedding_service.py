@@ -1,13 +1,34 @@
 import numpy as np
+import threading
+from collections import OrderedDict
 from langchain_ollama import OllamaEmbeddings
 from typing import List, Dict, Any
 import asyncio
+from config import Config
 
 class EmbeddingService:
     def __init__(self, model_name: str = "nomic-embed-text:v1.5", batch_size: int = 32):
         self.embedding_model = OllamaEmbeddings(model=model_name)
         self.batch_size = batch_size
         self.embedding_dim = 768  # Default for nomic-embed-text
+        self._query_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+    
+    def embed_query(self, query: str) -> List[float]:
+        """Normalized query embedding, memoized so the answer cache and the retrievers
+        embed the same question only once"""
+        with self._query_cache_lock:
+            if query in self._query_cache:
+                self._query_cache.move_to_end(query)
+                return self._query_cache[query]
+        
+        embedding = self.normalize_embeddings([self.embedding_model.embed_query(query)])[0]
+        
+        with self._query_cache_lock:
+            self._query_cache[query] = embedding
+            while len(self._query_cache) > Config.QUERY_EMBEDDING_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+        return embedding
     
     def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings in batches to avoid memory issues"""
@@ -1,81 +1,291 @@
-from typing import List, Dict, Any, Optional
+import re
+import time
+from concurrent.futures import Future
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple
 from .embedding_service import EmbeddingService
 from .confidence_scorer import ConfidenceScorer
+from .candidate_features import CandidateFeatures
+from .cross_encoder_reranker import CrossEncoderReranker
+from .cancellation import CancellationToken
+from .pipeline_dag import PipelineDAG, shared_pool
+from .retrieval_cache import RetrievalCache
+from .query_analysis import is_factoid_question
+from config import Config
 
 class EnhancedRetriever:
+    # Relevance weights over CandidateFeatures.COLUMNS
+    RERANK_WEIGHTS = np.array([0.6, 0.2, 0.1, 0.1, 0.0])
+    RERANK_WEIGHTS_CROSS_ENCODER = np.array([0.3, 0.1, 0.05, 0.05, 0.5])
+    # Sentence boundaries for extractive answers
+    SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+    
     def __init__(self, vector_db, embedding_service: EmbeddingService, 
-                 top_k: int = 5, rerank_top_k: int = 3):
+                 top_k: int = 5, rerank_top_k: int = 3,
+                 reranker: Optional[CrossEncoderReranker] = None,
+                 dense_margin: float = Config.CASCADE_DENSE_MARGIN,
+                 lexical_margin: float = Config.CASCADE_LEXICAL_MARGIN,
+                 speculative_cross_encoder: bool = Config.PIPELINE_SPECULATIVE_CROSS_ENCODER,
+                 retrieval_cache: Optional[RetrievalCache] = None):
         self.vector_db = vector_db
         self.embedding_service = embedding_service
-        self.confidence_scorer = ConfidenceScorer()
+        self.confidence_scorer = ConfidenceScorer(reranker)
+        self.reranker = self.confidence_scorer.reranker
         self.top_k = top_k
         self.rerank_top_k = rerank_top_k
+        # Early-exit thresholds on the gap between the last kept and first dropped candidate
+        self.dense_margin = dense_margin
+        self.lexical_margin = lexical_margin
+        self.speculative_cross_encoder = speculative_cross_encoder
+        self.retrieval_cache = retrieval_cache
     
-    def retrieve_with_confidence(self, query: str) -> Dict[str, Any]:
-        """Retrieve documents with confidence scoring"""
-        # Generate query embedding
-        query_embedding = self.embedding_service.embedding_model.embed_query(query)
-        normalized_query_embedding = self.embedding_service.normalize_embeddings([query_embedding])[0]
-        
-        # First-stage retrieval
-        initial_results = self.vector_db.similarity_search(
-            normalized_query_embedding, 
-            k=self.top_k * 2
-        )
+    def retrieve_with_confidence(self, query: str,
+                                 cancel: Optional[CancellationToken] = None) -> Dict[str, Any]:
+        """Retrieve documents with confidence scoring
         
-        # Calculate confidence metrics
-        confidence_metrics = self.confidence_scorer.calculate_retrieval_confidence(
-            query, initial_results
-        )
+        The stages run as a PipelineDAG. With speculative cross-encoder scoring, the
+        scores are computed alongside the lexical feature pass; the cascade only waits
+        for them if it reaches the cross-encoder stage. Otherwise scores that already
+        finished still feed confidence, and scoring still in progress is cancelled.
+        Confidence is scored on the features the cascade settled on. Per-stage timings
+        are returned under "pipeline".
+        cancel aborts between stages (GenerationCancelled) once the client has gone away.
+        """
+        speculative = self.speculative_cross_encoder and self.reranker.available
+        dag = PipelineDAG(cancel=cancel)
+        
+        k = self.top_k * 2
+        cached = self.retrieval_cache.get(query, k) if self.retrieval_cache else None
+        if cached is not None:
+            # Same query against the same corpus generation: skip embedding and kNN search
+            dag.add("vector_search", lambda: cached)
+        else:
+            # Generate query embedding, then first-stage retrieval
+            generation = self.retrieval_cache.generation.current() if self.retrieval_cache else None
+            dag.add("embedding", lambda: self.embedding_service.embed_query(query))
+            dag.add("vector_search", lambda embedding: self._search_and_cache(query, embedding, k, generation),
+                    deps=["embedding"])
         
-        # Apply re-ranking if we have results
-        if initial_results:
-            reranked_results = self._rerank_results(query, initial_results)
-            final_results = reranked_results[:self.rerank_top_k]
+        # One lexical pass shared by confidence scoring and re-ranking
+        dag.add("lexical_features", lambda results: CandidateFeatures.compute(query, results),
+                deps=["vector_search"])
+        if speculative:
+            # Cross-encoder scores for every candidate, started alongside the lexical pass.
+            # The stage only submits the work, so no other stage waits on it
+            speculation = CancellationToken(parent=cancel)
+            dag.add("cross_encoder", lambda results: shared_pool().submit(
+                self.reranker.score,
+                query,
+                [result["content"] for result in results],
+                [result.get("metadata", {}).get("file_id") for result in results],
+                speculation
+            ), deps=["vector_search"])
+            dag.add("rerank", lambda results, features, speculative_logits: self._rank(
+                query, results, features, cancel, speculative_logits, speculation
+            ), deps=["vector_search", "lexical_features", "cross_encoder"])
         else:
-            final_results = []
+            # The cross-encoder column is only filled if the cascade reaches that stage
+            dag.add("rerank", lambda results, features: self._rank(query, results, features, cancel),
+                    deps=["vector_search", "lexical_features"])
+        
+        # The cascade's own features: with the cross-encoder column when it got that far,
+        # or when the speculative scores were ready by the time it decided
+        dag.add("confidence", lambda results, ranked: self.confidence_scorer.calculate_retrieval_confidence(
+            query, results, ranked[2]
+        ), deps=["vector_search", "rerank"])
+        
+        stages = dag.run()
+        final_results, cascade, _ = stages["rerank"]
+        confidence_metrics = stages["confidence"]
         
         # Determine if we should proceed
         should_proceed, message = self.confidence_scorer.should_proceed_with_llm(
             confidence_metrics
         )
+        # SafeLLMGrounding reads the decision from the metrics it is handed
+        confidence_metrics["should_proceed"] = should_proceed
+        confidence_metrics["proceed_message"] = message
         
         return {
             "documents": final_results,
             "confidence_metrics": confidence_metrics,
             "should_proceed": should_proceed,
             "proceed_message": message,
-            "query_embedding": normalized_query_embedding  # For debugging
+            "cascade": cascade,
+            "pipeline": dag.report(),
+            "retrieval_cache_hit": cached is not None,
+            "query_embedding": stages.get("embedding")  # For debugging
+        }
+    
+    def extract_answer(self, query: str, retrieval_result: Dict[str, Any],
+                       cancel: Optional[CancellationToken] = None) -> Optional[Dict[str, Any]]:
+        """Best-scoring source sentences that answer a confident factoid question, or None
+        
+        Only runs when the cross-encoder is loaded, retrieval confidence reaches
+        EXTRACTIVE_MIN_CONFIDENCE and the question asks for a single fact. The
+        sentences of the top EXTRACTIVE_TOP_DOCS documents are scored against the
+        question; those reaching EXTRACTIVE_MIN_SPAN_SCORE are returned as
+        {"spans": [{"text", "citation_id", "score"}], "extraction_ms"}, with
+        citation_id indexing retrieval_result["documents"] from 1.
+        """
+        documents = retrieval_result["documents"]
+        confidence = retrieval_result["confidence_metrics"].get("overall_confidence", 0.0)
+        if (not Config.EXTRACTIVE_ENABLED or not documents or not self.reranker.available
+                or not retrieval_result["should_proceed"]
+                or confidence < Config.EXTRACTIVE_MIN_CONFIDENCE
+                or not is_factoid_question(query)):
+            return None
+        
+        start_time = time.perf_counter()
+        candidates = [
+            (citation_id, sentence)
+            for citation_id, doc in enumerate(documents[:Config.EXTRACTIVE_TOP_DOCS], 1)
+            for sentence in self._sentences(doc["content"])
+        ]
+        if not candidates:
+            return None
+        logits = self.reranker.score(
+            query,
+            [sentence for _, sentence in candidates],
+            [documents[citation_id - 1].get("metadata", {}).get("file_id") for citation_id, _ in candidates],
+            cancel
+        )
+        probabilities = 1 / (1 + np.exp(-np.asarray(logits, dtype=float)))
+        
+        spans = []
+        for index in np.argsort(-probabilities)[:Config.EXTRACTIVE_MAX_SPANS]:
+            if probabilities[index] < Config.EXTRACTIVE_MIN_SPAN_SCORE:
+                break
+            citation_id, sentence = candidates[index]
+            spans.append({"text": sentence, "citation_id": citation_id, "score": float(probabilities[index])})
+        if not spans:
+            return None
+        return {
+            "spans": spans,
+            "extraction_ms": round((time.perf_counter() - start_time) * 1000, 2)
+        }
+    
+    def _sentences(self, text: str, min_chars: int = 20, max_chars: int = 400) -> List[str]:
+        """Sentences of a chunk short enough to be an answer and long enough to carry one"""
+        sentences = (sentence.strip() for sentence in self.SENTENCE_SPLIT.split(text))
+        return [sentence for sentence in sentences if min_chars <= len(sentence) <= max_chars]
+    
+    def _search_and_cache(self, query: str, embedding: List[float], k: int,
+                          generation: Optional[int]) -> List[Dict]:
+        results = self.vector_db.similarity_search(embedding, k=k)
+        if self.retrieval_cache is not None:
+            self.retrieval_cache.put(query, k, False, results, generation)
+        return results
+    
+    def _rank(self, query: str, results: List[Dict], features: CandidateFeatures,
+              cancel: Optional[CancellationToken] = None,
+              speculative_logits: Optional[Future] = None,
+              speculation: Optional[CancellationToken] = None
+              ) -> Tuple[List[Dict], Dict[str, Any], CandidateFeatures]:
+        """Apply cascade re-ranking if we have results; also returns the features it used
+        
+        The cascade fills columns in on a copy, never on features another stage reads.
+        """
+        features = features.copy()
+        if not results:
+            self._settle_speculation(features, speculative_logits, speculation)
+            return [], {"decided_by": None, "margins": {}, "stage_ms": {}}, features
+        reranked_results, cascade = self._cascade_rerank(
+            query, results, features, cancel, speculative_logits, speculation
+        )
+        return reranked_results[:self.rerank_top_k], cascade, features
+    
+    def _settle_speculation(self, features: CandidateFeatures, speculative_logits: Optional[Future],
+                            speculation: Optional[CancellationToken]):
+        """Once the cascade decided without the cross-encoder: keep speculative scores that
+        already finished (confidence still uses them), cancel scoring still in progress"""
+        if speculative_logits is None:
+            return
+        if speculative_logits.done() and not speculative_logits.cancelled() and speculative_logits.exception() is None:
+            features.set_cross_encoder_logits(speculative_logits.result())
+            return
+        speculative_logits.cancel()
+        speculation.cancel()
+    
+    def _add_cross_encoder(self, features: CandidateFeatures, speculative_logits: Optional[Future],
+                           cancel: Optional[CancellationToken]) -> bool:
+        """Fill the cross-encoder column, from the speculative scores once they are underway"""
+        if speculative_logits is not None and not speculative_logits.cancel():
+            # Already running (or done): waiting is cheaper than scoring again
+            return features.set_cross_encoder_logits(speculative_logits.result())
+        # Not speculating, or the speculative call is still queued behind other work:
+        # score here rather than wait on the pool this stage itself occupies
+        return features.add_cross_encoder(self.reranker, cancel)
+    
+    def _score_margin(self, scores: np.ndarray) -> float:
+        """Gap between the last candidate kept and the first one dropped"""
+        if len(scores) <= self.rerank_top_k:
+            return float("inf")  # Nothing is dropped, so no stage can change the final set
+        ordered = np.sort(scores)[::-1]
+        return float(ordered[self.rerank_top_k - 1] - ordered[self.rerank_top_k])
+    
+    def _cascade_rerank(self, query: str, results: List[Dict], features: CandidateFeatures,
+                        cancel: Optional[CancellationToken] = None,
+                        speculative_logits: Optional[Future] = None,
+                        speculation: Optional[CancellationToken] = None) -> Tuple[List[Dict], Dict[str, Any]]:
+        """
+        Dense score -> lexical features -> cross-encoder, stopping at the first stage
+        whose top-k margin clears its threshold
+        
+        Returns:
+            (sorted results, cascade info with the deciding stage, margins and timings)
+        """
+        margins, stage_ms = {}, {}
+        
+        start_time = time.perf_counter()
+        dense_scores = features.column("similarity")
+        margins["dense"] = self._score_margin(dense_scores)
+        stage_ms["dense"] = (time.perf_counter() - start_time) * 1000
+        if margins["dense"] >= self.dense_margin:
+            self._settle_speculation(features, speculative_logits, speculation)
+            return self._apply_scores(results, dense_scores), self._cascade_info("dense", margins, stage_ms)
+        
+        start_time = time.perf_counter()
+        lexical_scores = features.matrix[:, :4] @ self.RERANK_WEIGHTS[:4]
+        margins["lexical"] = self._score_margin(lexical_scores)
+        stage_ms["lexical"] = (time.perf_counter() - start_time) * 1000
+        if margins["lexical"] >= self.lexical_margin:
+            self._settle_speculation(features, speculative_logits, speculation)
+            return self._apply_scores(results, lexical_scores), self._cascade_info("lexical", margins, stage_ms)
+        
+        start_time = time.perf_counter()
+        if not self._add_cross_encoder(features, speculative_logits, cancel):
+            # No cross-encoder available: the lexical ranking is the final word
+            return self._apply_scores(results, lexical_scores), self._cascade_info("lexical", margins, stage_ms)
+        reranked = self._rerank_results(query, results, features)
+        margins["cross_encoder"] = self._score_margin(features.matrix @ self.RERANK_WEIGHTS_CROSS_ENCODER)
+        stage_ms["cross_encoder"] = (time.perf_counter() - start_time) * 1000
+        return reranked, self._cascade_info("cross_encoder", margins, stage_ms)
+    
+    def _apply_scores(self, results: List[Dict], scores: np.ndarray) -> List[Dict]:
+        for result, relevance_score in zip(results, scores):
+            result["relevance_score"] = float(relevance_score)
+        return sorted(results, key=lambda x: x["relevance_score"], reverse=True)
+    
+    def _cascade_info(self, decided_by: str, margins: Dict[str, float],
+                      stage_ms: Dict[str, float]) -> Dict[str, Any]:
+        # inf margins (too few candidates) are not JSON serializable
+        return {
+            "decided_by": decided_by,
+            "margins": {stage: (None if np.isinf(margin) else margin) for stage, margin in margins.items()},
+            "stage_ms": stage_ms
         }
     
-    def _rerank_results(self, query: str, results: List[Dict]) -> List[Dict]:
-        """Enhanced re-ranking with multiple factors"""
-        for result in results:
-            content = result["content"].lower()
-            query_terms = query.lower().split()
-            
-            # Term overlap score
-            overlap_score = sum(1 for term in query_terms if len(term) > 2 and term in content) 
-            overlap_score = overlap_score / len(query_terms) if query_terms else 0
-            
-            # Position bonus (prefer earlier chunks in documents)
-            position_bonus = 1.0
-            if 'chunk_index' in result.get('metadata', {}):
-                chunk_idx = result['metadata']['chunk_index']
-                total_chunks = result['metadata'].get('total_chunks', 1)
-                if total_chunks > 1:
-                    position_bonus = 1.0 - (chunk_idx / total_chunks) * 0.3  # First chunks get bonus
-            
-            # Content quality score (longer, more substantive content)
-            content_length = len(content)
-            quality_score = min(content_length / 500, 1.0)  # Normalize to 1.0 for 500+ chars
-            
-            # Combined relevance score
-            result["relevance_score"] = (
-                0.6 * result.get("similarity_score", 0) +
-                0.2 * overlap_score +
-                0.1 * position_bonus +
-                0.1 * quality_score
-            )
-        
-        return sorted(results, key=lambda x: x["relevance_score"], reverse=True)
\ No newline at end of file
+    def _rerank_results(self, query: str, results: List[Dict],
+                        features: Optional[CandidateFeatures] = None) -> List[Dict]:
+        """Enhanced re-ranking with multiple factors (similarity, overlap, position,
+        length and, when available, cross-encoder relevance)"""
+        if features is None:
+            features = CandidateFeatures.compute(query, results, self.reranker)
+        
+        if features.has_cross_encoder:
+            relevance_scores = features.matrix @ self.RERANK_WEIGHTS_CROSS_ENCODER
+        else:
+            relevance_scores = features.matrix[:, :4] @ self.RERANK_WEIGHTS[:4]
+        
+        return self._apply_scores(results, relevance_scores)
\ No newline at end of file
@@ -1,3 +1,4 @@
+import re
 from langchain.prompts import PromptTemplate
 from typing import Dict, Any, List
 
@@ -6,16 +7,10 @@ class HallucinationDetector:
         self.validation_prompt = self._create_validation_prompt()
     
     def _create_validation_prompt(self) -> PromptTemplate:
-        """Create prompt for fact validation against context"""
+        """Create prompt for fact validation against context (instructions first: a stable prefix)"""
         template = """Analyze the following answer and determine if it is fully supported by the provided context. 
         Check for any information that might be made up or not directly supported by the context.
 
-        Context:
-        {context}
-
-        Question: {question}
-        Proposed Answer: {answer}
-
         Instructions:
         1. Identify each factual claim in the answer
         2. Check if each claim is directly supported by the context
@@ -26,15 +21,42 @@ class HallucinationDetector:
         - Supported Claims: [list of supported claims]
         - Unsupported Claims: [list of unsupported claims or "None"]
         - Confidence Score: [percentage]
-        - Validation Result: [PASS/CAUTION/FAIL]"""
+        - Validation Result: [PASS/CAUTION/FAIL]
+
+        Context:
+        {context}
+
+        Question: {question}
+        Proposed Answer: {answer}"""
 
         return PromptTemplate(
             template=template,
             input_variables=["context", "question", "answer"]
         )
     
+    def parse_validation(self, text: str) -> Dict[str, Any]:
+        """Read the fields of the validation prompt's response format (None when missing)"""
+        fields = {}
+        for name in ("Supported Claims", "Unsupported Claims", "Confidence Score", "Validation Result"):
+            match = re.search(rf"{name}\s*:\s*(.+?)(?=\n\s*-?\s*\**[A-Z][a-z]+ [A-Z][a-z]+\s*:|\Z)", text, re.S)
+            fields[name] = match.group(1).strip().strip("*").strip() if match else None
+        
+        score = re.search(r"\d+(?:\.\d+)?", fields["Confidence Score"] or "")
+        result = re.search(r"PASS|CAUTION|FAIL", (fields["Validation Result"] or "").upper())
+        unsupported = fields["Unsupported Claims"]
+        return {
+            "result": result.group(0) if result else None,
+            "confidence_score": min(float(score.group(0)), 100.0) if score else None,
+            "supported_claims": fields["Supported Claims"],
+            "unsupported_claims": None if unsupported is None or unsupported.strip('[]" ').lower() == "none" else unsupported
+        }
+    
     def create_safety_prompt(self) -> PromptTemplate:
-        """Create main prompt with anti-hallucination instructions"""
+        """Create main prompt with anti-hallucination instructions
+
+        Instructions come first and never vary, then the context, then the question,
+        so consecutive requests share a cacheable prompt prefix.
+        """
         template = """You are a careful AI assistant that strictly bases answers on the provided context. 
         Follow these rules:
         1. ONLY use information from the provided context
@@ -43,15 +65,16 @@ class HallucinationDetector:
         4. If you're uncertain, express the uncertainty
         5. Always cite your sources using [source_number] format
 
+        Important: If the context is insufficient or irrelevant to the question, 
+        respond with: "I cannot provide a reliable answer based on the available documents."
+        Otherwise, provide a helpful answer with citations.
+
         Context Information:
         {context}
 
         User Question: {question}
 
-        Important: If the context is insufficient or irrelevant to the question, 
-        respond with: "I cannot provide a reliable answer based on the available documents."
-
-        Otherwise, provide a helpful answer with citations:"""
+        Answer:"""
 
         return PromptTemplate(
             template=template,
@@ -1,15 +1,26 @@
 import numpy as np
 from langchain_ollama import OllamaEmbeddings
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
+from collections import deque
 import asyncio
+import logging
+import time
 from rank_bm25 import BM25Okapi
-import re
+from .retrieval_planner import RetrievalPlanner
+from .query_analysis import analyze_query_type, tokenize_text
+from .ngram_index import NgramIndex
+from .positional_index import PositionalIndex
+from config import Config
+
+logger = logging.getLogger(__name__)
 
 class HybridEmbeddingService:
     def __init__(self, model_name: str = "nomic-embed-text:v1.5", batch_size: int = 32):
         self.embedding_model = OllamaEmbeddings(model=model_name)
         self.batch_size = batch_size
         self.embedding_dim = 768  # Default for nomic-embed-text
+        self.planner = RetrievalPlanner()
+        self.plan_log = deque(maxlen=1000)  # Recent (plan, elapsed_ms) records
     
     def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings in batches to avoid memory issues"""
@@ -35,17 +46,69 @@ class HybridEmbeddingService:
     
     def tokenize_text(self, text: str) -> List[str]:
         """Tokenize text for BM25 (simple whitespace + lowercase)"""
-        return re.findall(r'\b\w+\b', text.lower())
+        return tokenize_text(text)
     
     def build_bm25_index(self, chunks: List[Dict]) -> BM25Okapi:
         """Build BM25 index from chunk contents"""
         tokenized_corpus = [self.tokenize_text(chunk["content"]) for chunk in chunks]
         return BM25Okapi(tokenized_corpus)
     
-    def reciprocal_rank_fusion(self, dense_scores: List[float], sparse_scores: List[float], k: int = 60) -> List[float]:
+    def _index_chunks(self, chunks: List[Dict]):
+        """Build the BM25 index and the postings statistics used for planning"""
+        self.bm25_index = self.build_bm25_index(chunks)
+        self.bm25_chunks = chunks
+        
+        # Term positions for phrase/proximity queries; also the postings sizes for planning
+        self.positional_index = PositionalIndex(self.tokenize_text).build(chunks)
+        
+        # Trigram index for codes/versions that the word tokenizer splits apart
+        self.ngram_index = NgramIndex(n=Config.NGRAM_SIZE).build(chunks)
+    
+    def _ensure_index(self, chunks: List[Dict]):
+        """(Re)build the indexes if they were built for a different chunk list"""
+        if (not hasattr(self, 'bm25_index') or self.bm25_chunks is not chunks
+                or self.bm25_index.corpus_size != len(chunks)):
+            self._index_chunks(chunks)
+    
+    def estimate_postings_sizes(self, tokens: List[str]) -> Dict[str, int]:
+        """Number of indexed chunks containing each token (0 if no index yet)"""
+        if not hasattr(self, 'positional_index'):
+            return {token: 0 for token in tokens}
+        return {token: self.positional_index.document_frequency(token) for token in tokens}
+    
+    def plan_retrieval(self, query: str, chunks: List[Dict],
+                       query_analysis: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Decide which retrievers to run for the query without running any of them"""
+        self._ensure_index(chunks)
+        
+        query_analysis = query_analysis or self.analyze_query_type(query)
+        tokens = self.tokenize_text(query)
+        
+        # A query that is nothing but quoted phrases is answered by postings intersection,
+        # which is cheap enough to plan with
+        phrases = self.positional_index.parse_phrases(query)
+        unquoted_tokens = self.tokenize_text(PositionalIndex.PHRASE_PATTERN.sub(' ', query))
+        phrase_postings = None
+        if phrases and not unquoted_tokens:
+            phrase_postings = min(len(self.positional_index.match_phrase(phrase_tokens, slop))
+                                  for phrase_tokens, slop in phrases)
+        
+        return self.planner.plan(
+            query_analysis,
+            tokens,
+            self.estimate_postings_sizes(tokens),
+            corpus_size=len(self.bm25_chunks),
+            phrase_postings=phrase_postings
+        )
+    
+    def reciprocal_rank_fusion(self, dense_scores: List[float], sparse_scores: List[float], k: int = 60,
+                               extra_scores: Optional[List[List[float]]] = None) -> List[float]:
         """
         Reciprocal Rank Fusion (RRF) for combining dense and sparse retrieval scores
         RRF(d) = Σ 1/(k + rank_i(d))
+        
+        extra_scores are candidate lists (n-gram or phrase hits) where only
+        chunks with a positive score take part in the fusion.
         """
         # Get ranks for each method
         dense_ranks = self._get_ranks(dense_scores)
@@ -57,8 +120,20 @@ class HybridEmbeddingService:
             rrf_score = (1 / (k + dense_ranks[i])) + (1 / (k + sparse_ranks[i]))
             rrf_scores.append(rrf_score)
         
+        for scores in extra_scores or []:
+            for i, term in enumerate(self._rrf_terms(scores, k, hits_only=True)):
+                rrf_scores[i] += term
+        
         return rrf_scores
     
+    def _rrf_terms(self, scores: List[float], k: int = 60, hits_only: bool = False) -> List[float]:
+        """Per-chunk 1/(k + rank) contribution of a single score list"""
+        ranks = self._get_ranks(scores)
+        return [
+            0.0 if hits_only and scores[i] <= 0 else 1 / (k + ranks[i])
+            for i in range(len(scores))
+        ]
+    
     def _get_ranks(self, scores: List[float]) -> List[int]:
         """Convert scores to ranks (higher score = better rank)"""
         sorted_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
@@ -67,10 +142,14 @@ class HybridEmbeddingService:
             ranks[idx] = rank
         return ranks
     
-    def weighted_combination(self, dense_scores: List[float], sparse_scores: List[float], alpha: float = 0.4) -> List[float]:
+    def weighted_combination(self, dense_scores: List[float], sparse_scores: List[float], alpha: float = 0.4,
+                             extra_scores: Optional[List[Tuple[List[float], float]]] = None) -> List[float]:
         """
         Weighted combination of normalized dense and sparse scores
         score = α * norm_sparse + (1-α) * norm_dense
+        
+        extra_scores are (scores in 0-1, β) pairs for high-precision lists
+        (n-gram, phrase); each one with hits blends in as (1-β) * score + β * extra.
         """
         # Normalize scores to 0-1 range
         norm_dense = self._min_max_normalize(dense_scores)
@@ -82,6 +161,13 @@ class HybridEmbeddingService:
             combined = alpha * sparse + (1 - alpha) * dense
             combined_scores.append(combined)
         
+        for scores, weight in extra_scores or []:
+            if any(score > 0 for score in scores):
+                combined_scores = [
+                    (1 - weight) * combined + weight * extra
+                    for combined, extra in zip(combined_scores, scores)
+                ]
+        
         return combined_scores
     
     def _min_max_normalize(self, scores: List[float]) -> List[float]:
@@ -102,7 +188,10 @@ class HybridEmbeddingService:
                      chunks: List[Dict], 
                      top_k: int = 10,
                      fusion_method: str = "rrf",
-                     alpha: float = 0.4) -> List[Tuple[Dict, float]]:
+                     alpha: float = 0.4,
+                     plan: str = "auto",
+                     stats: Optional[Dict[str, Any]] = None,
+                     query_analysis: Optional[Dict[str, Any]] = None) -> List[Tuple[Dict, float]]:
         """
         Perform hybrid search using both dense and sparse retrieval
         
@@ -112,6 +201,10 @@ class HybridEmbeddingService:
             top_k: Number of results to return
             fusion_method: "rrf" or "weighted"
             alpha: Weight for sparse scores in weighted combination (0-1)
+            plan: "auto" to let the planner skip a retriever, or one of
+                "hybrid", "sparse_only", "dense_only" to force it
+            stats: Optional dict filled with the plan that ran and its timing
+            query_analysis: analyze_query_type output, if the caller already has it
         
         Returns:
             List of (chunk, score) tuples sorted by relevance
@@ -119,19 +212,67 @@ class HybridEmbeddingService:
         if not chunks:
             return []
         
-        # Dense retrieval (vector search)
-        dense_scores = self._dense_retrieval(query, chunks)
+        if fusion_method not in ("rrf", "weighted"):
+            raise ValueError(f"Unknown fusion method: {fusion_method}")
         
-        # Sparse retrieval (BM25)
-        sparse_scores = self._sparse_retrieval(query, chunks)
+        start_time = time.perf_counter()
+        if plan == "auto":
+            plan_info = self.plan_retrieval(query, chunks, query_analysis)
+        elif plan in RetrievalPlanner.PLANS:
+            plan_info = {"plan": plan, "reason": "forced by caller"}
+        else:
+            raise ValueError(f"Unknown retrieval plan: {plan}")
+        plan = plan_info["plan"]
         
-        # Fusion
-        if fusion_method == "rrf":
-            combined_scores = self.reciprocal_rank_fusion(dense_scores, sparse_scores)
-        elif fusion_method == "weighted":
-            combined_scores = self.weighted_combination(dense_scores, sparse_scores, alpha)
+        # Identifier and phrase lookups are cheap index probes, so they join every plan
+        ngram_scores = self._ngram_retrieval(query, chunks)
+        phrase_scores = self._phrase_retrieval(query, chunks)
+        precision_lists = [
+            (scores, weight) for scores, weight in (
+                (ngram_scores, Config.NGRAM_FUSION_WEIGHT),
+                (phrase_scores, Config.PHRASE_FUSION_WEIGHT)
+            )
+            if any(score > 0 for score in scores)
+        ]
+        
+        if plan in ("sparse_only", "dense_only"):
+            if plan == "sparse_only":
+                # Pure exact-match lookup: no embedding call, no dense scoring
+                combined_scores = self._sparse_retrieval(query, chunks)
+            else:
+                combined_scores = self._dense_retrieval(query, chunks)
+            
+            if precision_lists:
+                combined_scores = self._rrf_terms(combined_scores)
+                for scores, _ in precision_lists:
+                    combined_scores = [
+                        combined + extra for combined, extra in
+                        zip(combined_scores, self._rrf_terms(scores, hits_only=True))
+                    ]
         else:
-            raise ValueError(f"Unknown fusion method: {fusion_method}")
+            # Dense retrieval (vector search)
+            dense_scores = self._dense_retrieval(query, chunks)
+            
+            # Sparse retrieval (BM25)
+            sparse_scores = self._sparse_retrieval(query, chunks)
+            
+            # Fusion
+            if fusion_method == "rrf":
+                combined_scores = self.reciprocal_rank_fusion(
+                    dense_scores, sparse_scores,
+                    extra_scores=[scores for scores, _ in precision_lists]
+                )
+            else:
+                combined_scores = self.weighted_combination(dense_scores, sparse_scores, alpha, precision_lists)
+        
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        self.plan_log.append((plan, elapsed_ms))
+        logger.debug("Retrieval plan %s (%s) took %.1f ms", plan, plan_info.get("reason"), elapsed_ms)
+        if stats is not None:
+            stats.update(plan_info)
+            stats["ngram_hits"] = sum(1 for score in ngram_scores if score > 0)
+            stats["phrase_hits"] = sum(1 for score in phrase_scores if score > 0)
+            stats["elapsed_ms"] = elapsed_ms
         
         # Combine chunks with scores and sort
         scored_chunks = list(zip(chunks, combined_scores))
@@ -160,9 +301,7 @@ class HybridEmbeddingService:
     def _sparse_retrieval(self, query: str, chunks: List[Dict]) -> List[float]:
         """Perform sparse retrieval using BM25"""
         # Build BM25 index if not already built
-        if not hasattr(self, 'bm25_index') or not hasattr(self, 'bm25_chunks'):
-            self.bm25_index = self.build_bm25_index(chunks)
-            self.bm25_chunks = chunks
+        self._ensure_index(chunks)
         
         # Get BM25 scores
         tokenized_query = self.tokenize_text(query)
@@ -170,6 +309,18 @@ class HybridEmbeddingService:
         
         return bm25_scores.tolist()
     
+    def _ngram_retrieval(self, query: str, chunks: List[Dict]) -> List[float]:
+        """Score chunks by substring/fuzzy matches of identifiers in the query"""
+        self._ensure_index(chunks)
+        
+        return self.ngram_index.score_query(query)
+    
+    def _phrase_retrieval(self, query: str, chunks: List[Dict]) -> List[float]:
+        """Score chunks by the quoted phrases they contain, via positional postings"""
+        self._ensure_index(chunks)
+        
+        return self.positional_index.score_query(query)
+    
     def process_chunks(self, chunks: List[Dict]) -> List[Dict]:
         """Process chunks and generate embeddings + BM25 index"""
         texts = [chunk["content"] for chunk in chunks]
@@ -184,48 +335,13 @@ class HybridEmbeddingService:
             chunk["metadata"]["embedding_dim"] = len(normalized_embeddings[i])
         
         # Build BM25 index for future sparse retrieval
-        self.bm25_index = self.build_bm25_index(chunks)
-        self.bm25_chunks = chunks
+        self._index_chunks(chunks)
         
         return chunks
 
     def analyze_query_type(self, query: str) -> Dict[str, Any]:
         """
         Analyze query to determine optimal hybrid search parameters
-        Returns suggested fusion method and weights
+        Returns suggested fusion method and weights (see query_analysis.analyze_query_type)
         """
-        tokens = self.tokenize_text(query)
-        
-        # Check for exact match patterns
-        has_codes = any(re.search(r'[A-Z]{2,}-\d+|[A-Z]{3,}', token) for token in tokens)
-        has_versions = any(re.search(r'\d+\.\d+\.\d+|\bv\d+', token) for token in tokens)
-        has_acronyms = any(len(token) <= 4 and token.isupper() for token in tokens)
-        has_numbers = any(token.isdigit() for token in tokens)
-        
-        exact_match_indicators = has_codes or has_versions or has_acronyms or has_numbers
-        
-        # Semantic query indicators
-        is_semantic = len(tokens) > 3 and not exact_match_indicators
-        has_question_words = any(word in query.lower() for word in ['how', 'what', 'why', 'when', 'where'])
-        
-        if exact_match_indicators:
-            # Prefer BM25 for exact matches
-            return {
-                "fusion_method": "weighted",
-                "alpha": 0.6,  # Higher weight for sparse
-                "query_type": "exact_match"
-            }
-        elif is_semantic or has_question_words:
-            # Prefer dense for semantic queries
-            return {
-                "fusion_method": "weighted", 
-                "alpha": 0.3,  # Higher weight for dense
-                "query_type": "semantic"
-            }
-        else:
-            # Balanced approach
-            return {
-                "fusion_method": "rrf",
-                "alpha": 0.4,
-                "query_type": "balanced"
-            }
\ No newline at end of file
+        return analyze_query_type(query)
\ No newline at end of file
@@ -1,14 +1,25 @@
-from langchain_ollama import OllamaLLM
+import time
 from langchain.prompts import PromptTemplate
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, AsyncIterator, Union, Optional
+from .cancellation import CancellationToken, GenerationCancelled, check_cancelled
+from .context_packer import ContextPacker
+from .citation_tracker import build_citation
+from .model_router import ModelRouter, attach_routing, select_llm
+from .ollama_llm import create_llm
 
 class LLMGrounding:
-    def __init__(self, model_name: str = "gemma3:4b"):
-        self.llm = OllamaLLM(model=model_name)
+    def __init__(self, model_name: str = "gemma3:4b", router: Optional[ModelRouter] = None):
+        self.llm = create_llm(model_name)
+        self.router = router  # Picks a model tier per request when set
         self.prompt_template = self._create_grounding_prompt()
+        self.context_packer = ContextPacker()
     
     def _create_grounding_prompt(self) -> PromptTemplate:
-        """SSE-safe prompt that outputs proper Markdown for Streamdown."""
+        """SSE-safe prompt that outputs proper Markdown for Streamdown.
+
+        Everything before {context} is constant, so Ollama can reuse its cached
+        state for that prefix; keep request-specific text after it.
+        """
         template = """You are a helpful, professional AI. Use ONLY the provided Context. 
     Create a short title derived from the question — do NOT output the literal word "Title".
 
@@ -28,18 +39,12 @@ class LLMGrounding:
         
 
     def format_context_with_citations(self, retrieved_docs: List[Dict]) -> str:
-        """Format retrieved documents with citation markers"""
-        context_parts = []
-        
-        for i, doc in enumerate(retrieved_docs, 1):
-            metadata = doc["metadata"]
-            source_info = f"Source [{i}]: {metadata.get('original_filename', 'Document')}"
-            if 'page_number' in metadata:
-                source_info += f" (Page {metadata['page_number']})"
-            
-            context_parts.append(f"{source_info}\n{doc['content']}\n")
-        
-        return "\n".join(context_parts)
+        """Format retrieved documents with citation markers
+
+        Adjacent chunks are merged without their shared overlap and the context is
+        capped at Config.CONTEXT_TOKEN_BUDGET (see ContextPacker).
+        """
+        return self.context_packer.format(retrieved_docs)
     
     def generate_response(self, question: str, retrieved_docs: List[Dict]) -> Dict[str, Any]:
         """Generate response with citations"""
@@ -50,33 +55,127 @@ class LLMGrounding:
             question=question
         )
         
+        llm, routing = select_llm(self.router, self.llm, question, retrieved_docs)
         try:
-            response = self.llm.invoke(prompt)
+            timer = GenerationTimer()
+            response = llm.invoke(prompt)
             # response = response.replace('\n', '\n\n')
-            # Extract citations from response
             print(response)
-            citations = self._extract_citations(response, retrieved_docs)
-            
-            return {
-                "answer": response,
-                "citations": citations,
-                "retrieved_documents": [
-                    {
-                        "content": doc["content"][:200] + "..." if len(doc["content"]) > 200 else doc["content"],
-                        "metadata": doc["metadata"],
-                        "similarity_score": doc.get("similarity_score", 0),
-                        "relevance_score": doc.get("relevance_score", 0),
-                        "citation_id": i + 1
-                    }
-                    for i, doc in enumerate(retrieved_docs)
-                ]
-            }
+            return attach_routing(self.router, self._build_response(response, retrieved_docs), routing, timer.metrics(0))
         except Exception as e:
-            return {
-                "answer": f"Error generating response: {str(e)}",
-                "citations": [],
-                "retrieved_documents": []
-            }
+            return self._error_response(e)
+    
+    async def agenerate_response(self, question: str, retrieved_docs: List[Dict]) -> Dict[str, Any]:
+        """Async variant of generate_response; the LLM call is awaited, not blocking a thread"""
+        formatted_context = self.format_context_with_citations(retrieved_docs)
+        
+        prompt = self.prompt_template.format(
+            context=formatted_context,
+            question=question
+        )
+        
+        llm, routing = select_llm(self.router, self.llm, question, retrieved_docs)
+        try:
+            timer = GenerationTimer()
+            response = await llm.ainvoke(prompt)
+            return attach_routing(self.router, self._build_response(response, retrieved_docs), routing, timer.metrics(0))
+        except Exception as e:
+            return self._error_response(e)
+    
+    def generate_response_stream(self, question: str, retrieved_docs: List[Dict],
+                                 cancel: Optional[CancellationToken] = None) -> Iterator[Union[str, Dict[str, Any]]]:
+        """Stream the answer as the LLM generates it
+
+        Yields text chunks as they arrive, then one final dict: the same response as
+        generate_response plus "generation_metrics" (time to first token, total time).
+        Stops without a final dict once cancel is set.
+        """
+        formatted_context = self.format_context_with_citations(retrieved_docs)
+        
+        prompt = self.prompt_template.format(
+            context=formatted_context,
+            question=question
+        )
+        
+        llm, routing = select_llm(self.router, self.llm, question, retrieved_docs)
+        timer = GenerationTimer()
+        chunks = []
+        stream = llm.stream(prompt)
+        try:
+            for chunk in stream:
+                check_cancelled(cancel, "generation")
+                timer.tick()
+                chunks.append(chunk)
+                yield chunk
+            response = self._build_response("".join(chunks), retrieved_docs)
+        except GenerationCancelled:
+            return
+        except Exception as e:
+            response = self._error_response(e)
+        finally:
+            # Closing the stream drops the connection to Ollama, which stops generation
+            stream.close()
+        
+        response["generation_metrics"] = timer.metrics(len(chunks))
+        yield attach_routing(self.router, response, routing, response["generation_metrics"])
+    
+    async def agenerate_response_stream(self, question: str, retrieved_docs: List[Dict],
+                                        cancel: Optional[CancellationToken] = None) -> AsyncIterator[Union[str, Dict[str, Any]]]:
+        """Async variant of generate_response_stream"""
+        formatted_context = self.format_context_with_citations(retrieved_docs)
+        
+        prompt = self.prompt_template.format(
+            context=formatted_context,
+            question=question
+        )
+        
+        llm, routing = select_llm(self.router, self.llm, question, retrieved_docs)
+        timer = GenerationTimer()
+        chunks = []
+        stream = llm.astream(prompt)
+        try:
+            async for chunk in stream:
+                check_cancelled(cancel, "generation")
+                timer.tick()
+                chunks.append(chunk)
+                yield chunk
+            response = self._build_response("".join(chunks), retrieved_docs)
+        except GenerationCancelled:
+            return
+        except Exception as e:
+            response = self._error_response(e)
+        finally:
+            await stream.aclose()
+        
+        response["generation_metrics"] = timer.metrics(len(chunks))
+        yield attach_routing(self.router, response, routing, response["generation_metrics"])
+    
+    def _build_response(self, response: str, retrieved_docs: List[Dict]) -> Dict[str, Any]:
+        """Attach citations and document previews to the generated answer"""
+        # Extract citations from response
+        citations = self._extract_citations(response, retrieved_docs)
+        
+        return {
+            "answer": response,
+            "citations": citations,
+            "retrieved_documents": [
+                {
+                    "content": doc["content"][:200] + "..." if len(doc["content"]) > 200 else doc["content"],
+                    "metadata": doc["metadata"],
+                    "similarity_score": doc.get("similarity_score", 0),
+                    "relevance_score": doc.get("relevance_score", 0),
+                    "citation_id": i + 1
+                }
+                for i, doc in enumerate(retrieved_docs)
+            ]
+        }
+    
+    def _error_response(self, error: Exception) -> Dict[str, Any]:
+        return {
+            "answer": f"Error generating response: {str(error)}",
+            "citations": [],
+            "retrieved_documents": []
+        }
     
     def _extract_citations(self, response: str, retrieved_docs: List[Dict]) -> List[Dict]:
         """Extract citation information from response"""
@@ -84,13 +183,26 @@ class LLMGrounding:
         
         for i in range(1, len(retrieved_docs) + 1):
             if f"[{i}]" in response:
-                doc_metadata = retrieved_docs[i-1]["metadata"]
-                citations.append({
-                    "citation_id": i,
-                    "source_filename": doc_metadata.get("original_filename", "Unknown"),
-                    "page_number": doc_metadata.get("page_number"),
-                    "source_url": doc_metadata.get("source_url", "#"),
-                    "similarity_score": retrieved_docs[i-1].get("similarity_score", 0)
-                })
+                citations.append(build_citation(i, retrieved_docs[i-1]))
         
-        return citations
\ No newline at end of file
+        return citations
+
+
+class GenerationTimer:
+    """Time to first token and total generation time for a streamed LLM call"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token = None
+
+    def tick(self):
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+
+    def metrics(self, chunk_count: int) -> Dict[str, Any]:
+        end = time.perf_counter()
+        return {
+            "time_to_first_token_ms": round((self.first_token - self.start) * 1000, 2) if self.first_token else None,
+            "generation_ms": round((end - self.start) * 1000, 2),
+            "chunks": chunk_count
+        }
@@ -0,0 +1,43 @@
+import numpy as np
+from typing import List
+
+def mmr_select(candidate_vectors: np.ndarray, relevance: np.ndarray, k: int, diversity: float) -> List[int]:
+    """
+    Maximal Marginal Relevance over a candidate matrix
+    
+    Picks, one at a time, argmax (1 - diversity) * relevance(i) - diversity * max_j sim(i, j)
+    where j ranges over the already selected candidates.
+    
+    Args:
+        candidate_vectors: (n, d) candidate embeddings (normalized here)
+        relevance: (n,) query relevance of each candidate, higher is better
+        k: Number of candidates to select
+        diversity: 0 = pure relevance order, 1 = pure novelty
+    
+    Returns:
+        Indices of the selected candidates in selection order
+    """
+    n = len(relevance)
+    if n == 0 or k <= 0:
+        return []
+    
+    norms = np.linalg.norm(candidate_vectors, axis=1, keepdims=True)
+    normalized = candidate_vectors / np.where(norms > 0, norms, 1.0)
+    # All pairwise similarities in one matrix product
+    pairwise = normalized @ normalized.T
+    
+    selected = [int(np.argmax(relevance))]
+    # Similarity of every candidate to its closest selected candidate so far
+    max_sim_to_selected = pairwise[selected[0]].copy()
+    remaining = np.ones(n, dtype=bool)
+    remaining[selected[0]] = False
+    
+    while len(selected) < min(k, n):
+        mmr_scores = (1 - diversity) * relevance - diversity * max_sim_to_selected
+        mmr_scores[~remaining] = -np.inf
+        best = int(np.argmax(mmr_scores))
+        selected.append(best)
+        remaining[best] = False
+        np.maximum(max_sim_to_selected, pairwise[best], out=max_sim_to_selected)
+    
+    return selected
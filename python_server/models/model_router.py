@@ -0,0 +1,131 @@
+import threading
+from collections import deque
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from config import Config
+from .context_packer import ContextPacker
+from .ollama_llm import create_llm
+from .query_analysis import analyze_query_type
+
+class ModelRouter:
+    """Chooses the LLM tier that answers a request
+
+    The small tier takes requests that look easy: confident retrieval, a packed context
+    under max_context_tokens, and either a single source file or an exact-match lookup
+    (codes, versions, numbers). Everything else goes to the default tier. Confidence is
+    ConfidenceScorer's overall_confidence when the pipeline computed it (secure mode),
+    otherwise the best candidate's similarity score.
+
+    record() keeps recent latency and quality samples per tier; stats() summarizes them
+    so the thresholds can be tuned against real traffic.
+    """
+
+    def __init__(self,
+                 tiers: Dict[str, str] = Config.LLM_TIERS,
+                 default_tier: str = Config.LLM_DEFAULT_TIER,
+                 min_confidence: float = Config.ROUTER_SMALL_MIN_CONFIDENCE,
+                 max_context_tokens: int = Config.ROUTER_SMALL_MAX_CONTEXT_TOKENS,
+                 window: int = 1000):
+        self.tiers = tiers
+        self.default_tier = default_tier
+        self.min_confidence = min_confidence
+        self.max_context_tokens = max_context_tokens
+        self.context_packer = ContextPacker()
+        self._llms = {}
+        self._lock = threading.Lock()  # Guards _llms and _samples: requests are answered from many threads
+        self._samples = {tier: deque(maxlen=window) for tier in tiers}
+
+    def route(self, question: str, retrieved_docs: List[Dict],
+              confidence_metrics: Optional[Dict] = None) -> Dict[str, Any]:
+        """{"tier", "model", "signals"} for a request about to be generated"""
+        if confidence_metrics is not None:
+            confidence = confidence_metrics.get("overall_confidence", 0.0)
+        else:
+            confidence = max((doc.get("similarity_score", 0.0) for doc in retrieved_docs), default=0.0)
+
+        # Measure the context the LLM will actually see
+        passages = self.context_packer.pack(retrieved_docs)
+        context_tokens = sum(passage["tokens"] for passage in passages)
+        sources = {
+            retrieved_docs[citation_id - 1]["metadata"].get("file_id")
+            for passage in passages for citation_id in passage["citation_ids"]
+        }
+        query_type = analyze_query_type(question)["query_type"]
+
+        small = (
+            "small" in self.tiers
+            and confidence >= self.min_confidence
+            and context_tokens <= self.max_context_tokens
+            and (len(sources) == 1 or query_type == "exact_match")
+        )
+        tier = "small" if small else self.default_tier
+        return {
+            "tier": tier,
+            "model": self.tiers[tier],
+            "signals": {
+                "confidence": float(confidence),
+                "query_type": query_type,
+                "sources": len(sources),
+                "context_tokens": context_tokens
+            }
+        }
+
+    def llm(self, tier: str):
+        """Shared Ollama client for a tier
+
+        Any other tier falls back to the default tier's model when a call fails before
+        producing output (the small model was never pulled, say), so routing cannot
+        turn an answerable request into an error. A stream that fails midway is not
+        retried.
+        """
+        with self._lock:
+            if tier not in self._llms:
+                llm = create_llm(self.tiers[tier])
+                if tier != self.default_tier:
+                    llm = llm.with_fallbacks([create_llm(self.tiers[self.default_tier])])
+                self._llms[tier] = llm
+            return self._llms[tier]
+
+    def record(self, routing: Dict[str, Any], generation_metrics: Dict[str, Any], response: Dict[str, Any]):
+        """Remember latency and quality signals of one answered request"""
+        sample = {
+            "time_to_first_token_ms": generation_metrics.get("time_to_first_token_ms"),
+            "generation_ms": generation_metrics.get("generation_ms"),
+            "cited": bool(response.get("citations")),
+            "refused": "refusal_reason" in response,
+            "caution": response.get("safety_check") == "caution",
+            "error": response.get("answer", "").startswith("Error generating response")
+        }
+        with self._lock:
+            self._samples[routing["tier"]].append(sample)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = {tier: list(samples) for tier, samples in self._samples.items()}
+        stats = {}
+        for tier, samples in snapshot.items():
+            stats[tier] = {"model": self.tiers[tier], "requests": len(samples)}
+            if not samples:
+                continue
+            for metric in ("time_to_first_token_ms", "generation_ms"):
+                values = [sample[metric] for sample in samples if sample[metric] is not None]
+                stats[tier][f"{metric}_p50"] = round(float(np.percentile(values, 50)), 2) if values else None
+            for signal in ("cited", "refused", "caution", "error"):
+                stats[tier][f"{signal}_rate"] = round(sum(sample[signal] for sample in samples) / len(samples), 3)
+        return stats
+
+def select_llm(router: Optional[ModelRouter], default_llm, question: str, retrieved_docs: List[Dict],
+               confidence_metrics: Optional[Dict] = None) -> Tuple[Any, Optional[Dict[str, Any]]]:
+    """The LLM for a request and its routing decision: the routed tier's, or default_llm without a router"""
+    if router is None:
+        return default_llm, None
+    routing = router.route(question, retrieved_docs, confidence_metrics)
+    return router.llm(routing["tier"]), routing
+
+def attach_routing(router: Optional[ModelRouter], response: Dict[str, Any], routing: Optional[Dict[str, Any]],
+                   generation_metrics: Dict[str, Any]) -> Dict[str, Any]:
+    """Attach the routing decision to a response and feed the router's per-tier latency/quality stats"""
+    if routing is not None:
+        response["model_routing"] = routing
+        router.record(routing, generation_metrics, response)
+    return response
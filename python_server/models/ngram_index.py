@@ -0,0 +1,93 @@
+from typing import List, Dict, Set
+from collections import Counter, defaultdict
+import re
+
+class NgramIndex:
+    """Character n-gram (trigram by default) index for substring and fuzzy identifier lookups"""
+
+    # Codes, part numbers and versions: ABC-123, 1.2.3, v2.1, x86_64, SKU/4411
+    # (terms shorter than n, like "v2", have no n-grams and are left to BM25)
+    IDENTIFIER_PATTERN = re.compile(r'[A-Za-z0-9]+(?:[-_./:][A-Za-z0-9]+)+|[A-Za-z]*\d[A-Za-z0-9]*|[A-Z]{2,}')
+    SEPARATOR_PATTERN = re.compile(r'[-_./:]')
+
+    def __init__(self, n: int = 3, min_similarity: float = 0.6):
+        self.n = n
+        self.min_similarity = min_similarity
+        self.postings: Dict[str, Set[int]] = defaultdict(set)
+        self.contents: List[str] = []
+        self.compact_contents: List[str] = []
+
+    def _ngrams(self, text: str) -> Set[str]:
+        """Set of character n-grams of the (already lowercased) text"""
+        return {text[i:i + self.n] for i in range(len(text) - self.n + 1)}
+
+    def _compact(self, text: str) -> str:
+        """Drop separators so ABC-123, ABC_123 and abc123 share n-grams"""
+        return self.SEPARATOR_PATTERN.sub('', text)
+
+    def build(self, chunks: List[Dict]) -> "NgramIndex":
+        """Index the lowercased content of every chunk, with and without separators"""
+        self.postings = defaultdict(set)
+        self.contents = [chunk.get("content", "").lower() for chunk in chunks]
+        self.compact_contents = [self._compact(content) for content in self.contents]
+
+        for doc_idx, content in enumerate(self.contents):
+            for gram in self._ngrams(content) | self._ngrams(self.compact_contents[doc_idx]):
+                self.postings[gram].add(doc_idx)
+
+        return self
+
+    def extract_identifiers(self, query: str) -> List[str]:
+        """Pull identifier-like terms out of a query; plain words are left to BM25/dense"""
+        identifiers = []
+        for match in self.IDENTIFIER_PATTERN.findall(query):
+            term = match.lower()
+            if len(term) >= self.n and term not in identifiers:
+                identifiers.append(term)
+        return identifiers
+
+    def lookup(self, term: str) -> Dict[int, float]:
+        """
+        Score chunks for a single term
+
+        Exact substring hits score 1.0 and matches that only differ in separators
+        0.9; otherwise the score is the fraction of the term's n-grams found in
+        the chunk, kept only above min_similarity.
+        """
+        term = term.lower()
+        compact_term = self._compact(term)
+        grams = self._ngrams(compact_term)
+        if not grams:
+            return {}
+
+        gram_hits = Counter()
+        for gram in grams:
+            gram_hits.update(self.postings.get(gram, ()))
+
+        results = {}
+        for doc_idx, hits in gram_hits.items():
+            similarity = hits / len(grams)
+            if similarity < self.min_similarity:
+                continue
+            if similarity == 1.0 and term in self.contents[doc_idx]:
+                results[doc_idx] = 1.0
+            elif similarity == 1.0 and compact_term in self.compact_contents[doc_idx]:
+                results[doc_idx] = 0.9
+            else:
+                # All grams present but not contiguous is still only a fuzzy match
+                results[doc_idx] = min(similarity, 0.8)
+
+        return results
+
+    def score_query(self, query: str) -> List[float]:
+        """Per-chunk scores aligned with the indexed chunks (all zeros if no identifiers)"""
+        scores = [0.0] * len(self.contents)
+        identifiers = self.extract_identifiers(query)
+        if not identifiers:
+            return scores
+
+        for term in identifiers:
+            for doc_idx, score in self.lookup(term).items():
+                scores[doc_idx] += score / len(identifiers)
+
+        return scores
@@ -0,0 +1,17 @@
+from langchain_ollama import OllamaLLM
+from config import Config
+
+def create_llm(model_name: str = Config.LLM_MODEL) -> OllamaLLM:
+    """Ollama client shared by every pipeline
+
+    keep_alive keeps the model resident between requests, so its KV cache survives
+    and prompts sharing a prefix with the previous one skip re-evaluating it. Every
+    client must send the same options (num_ctx in particular): Ollama reloads the
+    model, dropping that cache, whenever they change. A context window larger than
+    the packed prompt also keeps Ollama from truncating its start.
+    """
+    return OllamaLLM(
+        model=model_name,
+        keep_alive=Config.LLM_KEEP_ALIVE,
+        num_ctx=Config.LLM_NUM_CTX
+    )
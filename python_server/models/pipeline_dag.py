@@ -0,0 +1,102 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Any, Iterable, Optional, Tuple
+from .cancellation import CancellationToken, check_cancelled
+from config import Config
+
+_shared_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def shared_pool() -> ThreadPoolExecutor:
+    """Process-wide pool the per-request pipelines run their stages on"""
+    global _shared_pool
+    with _pool_lock:
+        if _shared_pool is None:
+            _shared_pool = ThreadPoolExecutor(
+                max_workers=Config.PIPELINE_WORKERS, thread_name_prefix="pipeline"
+            )
+        return _shared_pool
+
+class PipelineDAG:
+    """Per-request graph of pipeline stages
+
+    Each stage starts on the shared pool as soon as all of its dependencies have
+    finished, so independent stages overlap and the request takes roughly as long
+    as its critical path. A stage function receives its dependencies' results as
+    positional arguments, in the order the dependencies were declared.
+    """
+
+    def __init__(self, pool: Optional[ThreadPoolExecutor] = None,
+                 cancel: Optional[CancellationToken] = None):
+        self.pool = pool or shared_pool()
+        self.cancel = cancel
+        self._stages: Dict[str, Tuple[Callable, Tuple[str, ...]]] = {}
+        self.timings: Dict[str, Dict[str, float]] = {}
+        self.total_ms = 0.0
+
+    def add(self, name: str, func: Callable, deps: Iterable[str] = ()) -> "PipelineDAG":
+        deps = tuple(deps)
+        unknown = [dep for dep in deps if dep not in self._stages]
+        if name in self._stages or unknown:
+            # Stages are added in dependency order, which also rules out cycles
+            raise ValueError(f"Invalid stage {name!r} (duplicate name or unknown dependencies {unknown})")
+        self._stages[name] = (func, deps)
+        return self
+
+    def run(self) -> Dict[str, Any]:
+        """Execute every stage and return {stage name: result}; a failing stage re-raises here"""
+        results: Dict[str, Any] = {}
+        remaining = dict(self._stages)
+        running: Dict[Future, str] = {}
+        start = time.perf_counter()
+
+        def submit_ready():
+            for name, (func, deps) in list(remaining.items()):
+                if all(dep in results for dep in deps):
+                    del remaining[name]
+                    args = [results[dep] for dep in deps]
+                    running[self.pool.submit(self._run_stage, name, func, args, start)] = name
+
+        try:
+            submit_ready()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name], self.timings[name] = future.result()
+                submit_ready()
+        except BaseException:
+            # Stages that have not started yet are dropped; running ones finish on their own
+            for future in running:
+                future.cancel()
+            raise
+        finally:
+            self.total_ms = (time.perf_counter() - start) * 1000
+
+        return results
+
+    def _run_stage(self, name: str, func: Callable, args: list, start: float) -> Tuple[Any, Dict[str, float]]:
+        check_cancelled(self.cancel, name)
+        stage_start = time.perf_counter()
+        result = func(*args)
+        stage_end = time.perf_counter()
+        return result, {
+            "start_ms": (stage_start - start) * 1000,
+            "duration_ms": (stage_end - stage_start) * 1000
+        }
+
+    def critical_path_ms(self) -> float:
+        """Longest chain of stage durations through the dependency graph"""
+        finish: Dict[str, float] = {}
+        for name, (_, deps) in self._stages.items():  # Insertion order is a topological order
+            if name in self.timings:
+                finish[name] = self.timings[name]["duration_ms"] + max((finish.get(dep, 0.0) for dep in deps), default=0.0)
+        return max(finish.values(), default=0.0)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "stages": self.timings,
+            "total_ms": self.total_ms,
+            "critical_path_ms": self.critical_path_ms()
+        }
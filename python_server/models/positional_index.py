@@ -0,0 +1,100 @@
+from typing import List, Dict, Tuple, Callable
+from bisect import bisect_right
+from collections import defaultdict
+import re
+
+class PositionalIndex:
+    """Inverted index with term positions for exact phrase and proximity queries"""
+
+    # "exact phrase" or "proximity phrase"~N (at most N extra tokens in between)
+    PHRASE_PATTERN = re.compile(r'"([^"]+)"(?:~(\d+))?')
+
+    def __init__(self, tokenizer: Callable[[str], List[str]]):
+        self.tokenizer = tokenizer
+        self.postings: Dict[str, Dict[int, List[int]]] = defaultdict(dict)
+        self.corpus_size = 0
+
+    def build(self, chunks: List[Dict]) -> "PositionalIndex":
+        """Index term positions of every chunk (positions are in increasing order)"""
+        self.postings = defaultdict(dict)
+        self.corpus_size = len(chunks)
+
+        for doc_idx, chunk in enumerate(chunks):
+            for position, term in enumerate(self.tokenizer(chunk.get("content", ""))):
+                self.postings[term].setdefault(doc_idx, []).append(position)
+
+        return self
+
+    def document_frequency(self, term: str) -> int:
+        """Postings size for a term"""
+        postings = self.postings.get(term)
+        return len(postings) if postings else 0
+
+    def parse_phrases(self, query: str) -> List[Tuple[List[str], int]]:
+        """Quoted phrases in the query as (tokens, slop) pairs"""
+        phrases = []
+        for text, slop in self.PHRASE_PATTERN.findall(query):
+            tokens = self.tokenizer(text)
+            if len(tokens) > 1:
+                phrases.append((tokens, int(slop) if slop else 0))
+        return phrases
+
+    def _candidate_docs(self, tokens: List[str]) -> List[int]:
+        """Documents containing every token, intersecting from the rarest postings up"""
+        postings_lists = sorted((self.postings.get(token, {}) for token in set(tokens)), key=len)
+        if not postings_lists or not postings_lists[0]:
+            return []
+
+        candidates = set(postings_lists[0])
+        for postings in postings_lists[1:]:
+            candidates &= postings.keys()
+            if not candidates:
+                break
+        return sorted(candidates)
+
+    def match_phrase(self, tokens: List[str], slop: int = 0) -> Dict[int, int]:
+        """
+        Find documents containing the tokens in order within len(tokens) - 1 + slop positions
+
+        Returns:
+            Dict of document index -> number of matching occurrences
+        """
+        max_span = len(tokens) - 1 + slop
+        matches = {}
+
+        for doc_idx in self._candidate_docs(tokens):
+            positions = [self.postings[token][doc_idx] for token in tokens]
+            occurrences = 0
+
+            for start in positions[0]:
+                current = start
+                for term_positions in positions[1:]:
+                    # Earliest later occurrence keeps the span as tight as possible
+                    next_idx = bisect_right(term_positions, current)
+                    if next_idx == len(term_positions):
+                        current = None
+                        break
+                    current = term_positions[next_idx]
+                    if current - start > max_span:
+                        break
+
+                if current is not None and current - start <= max_span:
+                    occurrences += 1
+
+            if occurrences:
+                matches[doc_idx] = occurrences
+
+        return matches
+
+    def score_query(self, query: str) -> List[float]:
+        """Per-document fraction of the query's quoted phrases matched (all zeros if none)"""
+        scores = [0.0] * self.corpus_size
+        phrases = self.parse_phrases(query)
+        if not phrases:
+            return scores
+
+        for tokens, slop in phrases:
+            for doc_idx in self.match_phrase(tokens, slop):
+                scores[doc_idx] += 1 / len(phrases)
+
+        return scores
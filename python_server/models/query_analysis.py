@@ -0,0 +1,66 @@
+# Query classification shared by hybrid search planning and LLM model routing, and the
+# normalization the caches and request coalescing key questions by.
+# Kept free of index dependencies so the chat pipeline can use it on its own.
+import re
+from typing import List, Dict, Any
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a query, for use in cache keys"""
+    return re.sub(r'\s+', ' ', query.strip().lower())
+
+def tokenize_text(text: str) -> List[str]:
+    """Tokenize text for BM25 (simple whitespace + lowercase)"""
+    return re.findall(r'\b\w+\b', text.lower())
+
+def analyze_query_type(query: str) -> Dict[str, Any]:
+    """
+    Analyze query to determine optimal hybrid search parameters
+    Returns suggested fusion method and weights, and the "query_type"
+    (exact_match / semantic / balanced) the model router also uses
+    """
+    tokens = tokenize_text(query)
+    # Case and punctuation matter for codes/versions, so match them on the raw query
+    raw_tokens = query.split()
+    
+    # Check for exact match patterns
+    has_codes = any(re.search(r'[A-Z]{2,}-\d+|[A-Z]{3,}', token) for token in raw_tokens)
+    has_versions = any(re.search(r'\d+\.\d+\.\d+|\bv\d+', token) for token in raw_tokens)
+    has_acronyms = any(2 <= len(token) <= 4 and token.isupper() for token in raw_tokens)
+    has_numbers = any(token.isdigit() for token in tokens)
+    
+    exact_match_indicators = has_codes or has_versions or has_acronyms or has_numbers
+    
+    # Semantic query indicators
+    is_semantic = len(tokens) > 3 and not exact_match_indicators
+    has_question_words = any(word in query.lower() for word in ['how', 'what', 'why', 'when', 'where'])
+    
+    if exact_match_indicators:
+        # Prefer BM25 for exact matches
+        return {
+            "fusion_method": "weighted",
+            "alpha": 0.6,  # Higher weight for sparse
+            "query_type": "exact_match"
+        }
+    elif is_semantic or has_question_words:
+        # Prefer dense for semantic queries
+        return {
+            "fusion_method": "weighted", 
+            "alpha": 0.3,  # Higher weight for dense
+            "query_type": "semantic"
+        }
+    else:
+        # Balanced approach
+        return {
+            "fusion_method": "rrf",
+            "alpha": 0.4,
+            "query_type": "balanced"
+        }
+
+# Questions whose answer is usually a single fact (a name, date, place, number)
+FACTOID_PATTERN = re.compile(
+    r"^\s*(who|whom|when|where|which|what (is|are|was|were)|how (many|much|long|old|often))\b", re.IGNORECASE
+)
+
+def is_factoid_question(query: str, max_tokens: int = 15) -> bool:
+    """Short who/when/where/which/what-is/how-many question (not why/how-to explanations)"""
+    return bool(FACTOID_PATTERN.match(query)) and len(tokenize_text(query)) <= max_tokens
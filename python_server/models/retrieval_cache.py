@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Dict, Optional, Tuple
+from .corpus_generation import CorpusGeneration
+from .query_analysis import normalize_query
+
+CacheKey = Tuple[str, int, bool, int]
+
+class RetrievalCache:
+    """In-process LRU of first-stage retrieval results (query -> top-k chunks with scores)
+
+    Keys are (normalized query text, k, include_vectors, corpus generation). The
+    ingestion worker bumps the generation on every upsert, so entries computed
+    against an older corpus are simply never looked up again and age out of the LRU.
+    """
+
+    def __init__(self, generation: CorpusGeneration, max_entries: int = 2000):
+        self.generation = generation
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[CacheKey, List[Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, query: str, k: int, include_vectors: bool, generation: int) -> CacheKey:
+        return (normalize_query(query), k, include_vectors, generation)
+
+    def get(self, query: str, k: int, include_vectors: bool = False) -> Optional[List[Dict]]:
+        """Copies of the cached results, or None; entries with vectors also serve requests without"""
+        generation = self.generation.current()
+        candidates = [self._key(query, k, include_vectors, generation)]
+        if not include_vectors:
+            candidates.append(self._key(query, k, True, generation))
+
+        with self._lock:
+            for key in candidates:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return [self._copy(result, include_vectors) for result in self._entries[key]]
+            self.misses += 1
+            return None
+
+    def get_or_compute(self, query: str, k: int, include_vectors: bool,
+                       compute: Callable[[], List[Dict]]) -> List[Dict]:
+        """Cached results for the query, or compute() stored under the generation it ran against"""
+        cached = self.get(query, k, include_vectors)
+        if cached is not None:
+            return cached
+
+        # Read before searching: an upsert landing mid-search leaves the entry on the old generation
+        generation = self.generation.current()
+        results = compute()
+        self.put(query, k, include_vectors, results, generation)
+        return results
+
+    def put(self, query: str, k: int, include_vectors: bool, results: List[Dict], generation: int):
+        """Store results computed against the given generation (read before the search ran)"""
+        key = self._key(query, k, include_vectors, generation)
+        with self._lock:
+            self._entries[key] = [self._copy(result, include_vectors) for result in results]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _copy(result: Dict, include_vectors: bool) -> Dict:
+        # Callers annotate results (relevance_score) and pop "vector", so never hand out the stored dicts
+        copied = {**result, "metadata": dict(result.get("metadata", {}))}
+        if not include_vectors:
+            copied.pop("vector", None)
+        return copied
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
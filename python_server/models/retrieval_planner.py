@@ -0,0 +1,68 @@
+from typing import List, Dict, Any, Optional
+from config import Config
+
+class RetrievalPlanner:
+    """Chooses which retrievers to run for a query before any of them is executed"""
+
+    PLANS = ("hybrid", "sparse_only", "dense_only")
+
+    def __init__(self,
+                 max_exact_tokens: int = Config.PLANNER_MAX_EXACT_TOKENS,
+                 max_postings_ratio: float = Config.PLANNER_MAX_POSTINGS_RATIO,
+                 min_semantic_tokens: int = Config.PLANNER_MIN_SEMANTIC_TOKENS):
+        self.max_exact_tokens = max_exact_tokens
+        self.max_postings_ratio = max_postings_ratio
+        self.min_semantic_tokens = min_semantic_tokens
+
+    def plan(self,
+             query_analysis: Dict[str, Any],
+             query_tokens: List[str],
+             postings_sizes: Dict[str, int],
+             corpus_size: int,
+             phrase_postings: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Pick a retrieval plan from the query classification and estimated postings sizes
+
+        Args:
+            query_analysis: Output of HybridEmbeddingService.analyze_query_type
+            query_tokens: Tokenized query (same tokenizer as the sparse index)
+            postings_sizes: Document frequency for each query token
+            corpus_size: Number of chunks in the sparse index
+            phrase_postings: Chunks matching the quoted phrases, for queries made only of
+                quoted phrases (None otherwise)
+
+        Returns:
+            Dict with the chosen "plan", a short "reason" and the estimates used
+        """
+        query_type = query_analysis.get("query_type", "balanced")
+        matched_terms = [token for token in query_tokens if postings_sizes.get(token, 0) > 0]
+
+        # Cheapest estimate of the candidate set: the rarest matched term bounds the conjunction
+        estimated_postings = min((postings_sizes[token] for token in matched_terms), default=0)
+        postings_ratio = estimated_postings / corpus_size if corpus_size else 1.0
+
+        plan, reason = "hybrid", "mixed or ambiguous query"
+
+        if corpus_size == 0:
+            plan, reason = "dense_only", "sparse index is empty"
+        elif phrase_postings and phrase_postings / corpus_size <= self.max_postings_ratio:
+            # The user asked for this exact wording and the positional index found it
+            plan, reason = "sparse_only", "selective quoted phrase"
+            estimated_postings, postings_ratio = phrase_postings, phrase_postings / corpus_size
+        elif query_type == "exact_match" and len(query_tokens) <= self.max_exact_tokens:
+            if not matched_terms:
+                # BM25 cannot score terms it has never seen
+                plan, reason = "dense_only", "no query term in sparse index"
+            elif len(matched_terms) == len(query_tokens) and postings_ratio <= self.max_postings_ratio:
+                plan, reason = "sparse_only", "selective exact-match terms"
+        elif query_type == "semantic" and len(query_tokens) >= self.min_semantic_tokens:
+            plan, reason = "dense_only", "long natural-language question"
+
+        return {
+            "plan": plan,
+            "reason": reason,
+            "query_type": query_type,
+            "matched_terms": len(matched_terms),
+            "estimated_postings": estimated_postings,
+            "postings_ratio": float(postings_ratio)
+        }
@@ -1,31 +1,86 @@
-from typing import List, Dict
+import numpy as np
+from typing import List, Dict, Optional
 from .embedding_service import EmbeddingService
+from .cross_encoder_reranker import CrossEncoderReranker
+from .mmr import mmr_select
+from .cancellation import CancellationToken, check_cancelled
+from .retrieval_cache import RetrievalCache
+from config import Config
 
 class Retriever:
-    def __init__(self, vector_db, embedding_service: EmbeddingService, top_k: int = 5, rerank_top_k: int = 3):
+    def __init__(self, vector_db, embedding_service: EmbeddingService, top_k: int = 5, rerank_top_k: int = 3,
+                 reranker: Optional[CrossEncoderReranker] = None,
+                 retrieval_cache: Optional[RetrievalCache] = None):
         self.vector_db = vector_db
         self.embedding_service = embedding_service
         self.top_k = top_k
         self.rerank_top_k = rerank_top_k
+        self.reranker = reranker
+        self.retrieval_cache = retrieval_cache
     
-    def retrieve(self, query: str) -> List[Dict]:
-        """Retrieve relevant documents for query"""
-        # Generate query embedding
-        query_embedding = self.embedding_service.embedding_model.embed_query(query)
-        normalized_query_embedding = self.embedding_service.normalize_embeddings([query_embedding])[0]
-        
-        # First-stage retrieval: kNN search
-        initial_results = self.vector_db.similarity_search(
-            normalized_query_embedding,
-            k=self.top_k * 2  # Get more for re-ranking
-        )
+    def retrieve(self, query: str, diversity: Optional[float] = None,
+                 cancel: Optional[CancellationToken] = None) -> List[Dict]:
+        """Retrieve relevant documents for query
+        
+        diversity is the MMR weight (0 disables it); defaults to Config.MMR_DIVERSITY.
+        cancel aborts between stages (GenerationCancelled) once the client has gone away.
+        """
+        diversity = Config.MMR_DIVERSITY if diversity is None else diversity
+        use_mmr = diversity > 0
+        
+        # First-stage retrieval: kNN search (or the cached result for this query and corpus)
+        initial_results = self._first_stage(query, use_mmr, cancel)
+        check_cancelled(cancel, "vector_search")
         
-        # Re-ranking (simplified - in production, use cross-encoder)
-        reranked_results = self._rerank_results(query, initial_results)
+        # Re-ranking: cross-encoder over all candidates, term overlap if unavailable
+        reranked_results = self._rerank_results(query, initial_results, cancel)
         
+        if use_mmr:
+            return self._diversify(reranked_results, diversity)
         return reranked_results[:self.rerank_top_k]
     
-    def _rerank_results(self, query: str, results: List[Dict]) -> List[Dict]:
+    def _first_stage(self, query: str, include_vectors: bool,
+                     cancel: Optional[CancellationToken] = None) -> List[Dict]:
+        k = self.top_k * 2  # Get more for re-ranking
+        
+        def search() -> List[Dict]:
+            # Generate query embedding
+            normalized_query_embedding = self.embedding_service.embed_query(query)
+            check_cancelled(cancel, "embedding")
+            return self.vector_db.similarity_search(
+                normalized_query_embedding,
+                k=k,
+                include_vectors=include_vectors
+            )
+        
+        if self.retrieval_cache is None:
+            return search()
+        return self.retrieval_cache.get_or_compute(query, k, include_vectors, search)
+    
+    def _diversify(self, results: List[Dict], diversity: float) -> List[Dict]:
+        """MMR over the stored candidate vectors so near-duplicate (overlapping) chunks
+        don't fill the final set"""
+        vectors = [result.pop("vector", None) for result in results]
+        if not results or any(vector is None for vector in vectors):
+            return results[:self.rerank_top_k]
+        
+        selected = mmr_select(
+            np.array(vectors, dtype=float),
+            np.array([result["relevance_score"] for result in results]),
+            k=self.rerank_top_k,
+            diversity=diversity
+        )
+        return [results[i] for i in selected]
+    
+    def _rerank_results(self, query: str, results: List[Dict],
+                        cancel: Optional[CancellationToken] = None) -> List[Dict]:
+        """Re-rank with the cross-encoder, or fall back to query-term overlap"""
+        if self.reranker is not None and self.reranker.available and results:
+            return self.reranker.rerank(query, results, cancel=cancel)
+        
+        return self._heuristic_rerank(query, results)
+    
+    def _heuristic_rerank(self, query: str, results: List[Dict]) -> List[Dict]:
         """Simple re-ranking based on query-term overlap"""
         for result in results:
             # Simple relevance scoring based on term overlap
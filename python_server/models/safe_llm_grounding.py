@@ -1,22 +1,36 @@
-from langchain_ollama import OllamaLLM
 from langchain.prompts import PromptTemplate
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, AsyncIterator, Union, Optional
 from .hallucination_detector import HallucinationDetector
+from .llm_grounding import GenerationTimer
+from .cancellation import CancellationToken, GenerationCancelled, check_cancelled
+from .context_packer import ContextPacker
+from .citation_tracker import build_citation
+from .model_router import ModelRouter, attach_routing, select_llm
+from .ollama_llm import create_llm
 import re
 
 class SafeLLMGrounding:
-    def __init__(self, model_name: str = "gemma3:4b"):
-        self.llm = OllamaLLM(model=model_name)
+    def __init__(self, model_name: str = "gemma3:4b", router: Optional[ModelRouter] = None):
+        self.llm = create_llm(model_name)
+        self.router = router  # Picks a model tier per request when set
         self.hallucination_detector = HallucinationDetector()
         self.prompt_template = self.hallucination_detector.create_safety_prompt()
+        self.context_packer = ContextPacker()
     
     def generate_safe_response(self, question: str, retrieved_docs: List[Dict], 
-                             confidence_metrics: Dict) -> Dict[str, Any]:
-        """Generate response with multiple safety checks"""
+                             confidence_metrics: Dict,
+                             extraction: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Generate response with multiple safety checks
+
+        extraction (EnhancedRetriever.extract_answer) answers with the extracted source
+        sentences instead of calling the LLM.
+        """
         
         # Check if we should proceed based on confidence
         if not confidence_metrics.get("should_proceed", False):
             return self._create_low_confidence_response(confidence_metrics)
+        if extraction is not None:
+            return self._create_extractive_response(extraction, retrieved_docs, confidence_metrics)
         
         formatted_context = self._format_context_with_citations(retrieved_docs)
         
@@ -27,49 +41,183 @@ class SafeLLMGrounding:
                 question=question
             )
             
-            response = self.llm.invoke(prompt)
+            llm, routing = select_llm(self.router, self.llm, question, retrieved_docs, confidence_metrics)
+            timer = GenerationTimer()
+            response = llm.invoke(prompt)
+            return attach_routing(self.router,
+                                  self._build_safe_response(response, retrieved_docs, confidence_metrics),
+                                  routing, timer.metrics(0))
             
-            # Check for refusal patterns
-            if self._is_refusal_response(response):
-                return {
-                    "answer": response,
-                    "citations": [],
-                    "retrieved_documents": [],
-                    "confidence_level": "low",
-                    "safety_check": "passed",
-                    "refusal_reason": "LLM determined context is insufficient"
-                }
-            
-            # Extract citations and validate
-            citations = self._extract_citations(response, retrieved_docs)
+        except Exception as e:
+            return self._error_response(e)
+    
+    async def agenerate_safe_response(self, question: str, retrieved_docs: List[Dict],
+                                      confidence_metrics: Dict,
+                                      extraction: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Async variant of generate_safe_response; the LLM call is awaited"""
+        if not confidence_metrics.get("should_proceed", False):
+            return self._create_low_confidence_response(confidence_metrics)
+        if extraction is not None:
+            return self._create_extractive_response(extraction, retrieved_docs, confidence_metrics)
+        
+        formatted_context = self._format_context_with_citations(retrieved_docs)
+        
+        try:
+            prompt = self.prompt_template.format(
+                context=formatted_context,
+                question=question
+            )
             
-            # Simple hallucination check (can be enhanced with validation LLM call)
-            hallucination_risk = self._assess_hallucination_risk(response, citations, retrieved_docs)
+            llm, routing = select_llm(self.router, self.llm, question, retrieved_docs, confidence_metrics)
+            timer = GenerationTimer()
+            response = await llm.ainvoke(prompt)
+            return attach_routing(self.router,
+                                  self._build_safe_response(response, retrieved_docs, confidence_metrics),
+                                  routing, timer.metrics(0))
             
-            # Determine confidence level
-            confidence_level = self._determine_confidence_level(
-                confidence_metrics, hallucination_risk, citations
-            )
+        except Exception as e:
+            return self._error_response(e)
+    
+    def generate_safe_response_stream(self, question: str, retrieved_docs: List[Dict],
+                                      confidence_metrics: Dict,
+                                      cancel: Optional[CancellationToken] = None,
+                                      extraction: Optional[Dict[str, Any]] = None) -> Iterator[Union[str, Dict[str, Any]]]:
+        """Stream the answer as it is generated; the safety checks run on the full text
+
+        Yields text chunks, then one final dict: the same response as generate_safe_response
+        plus "generation_metrics" (time to first token, total time).
+        Stops without a final dict once cancel is set. An extractive answer is one chunk.
+        """
+        if not confidence_metrics.get("should_proceed", False):
+            response = self._create_low_confidence_response(confidence_metrics)
+            yield response["answer"]
+            yield response
+            return
+        if extraction is not None:
+            response = self._create_extractive_response(extraction, retrieved_docs, confidence_metrics)
+            yield response["answer"]
+            yield response
+            return
+        
+        formatted_context = self._format_context_with_citations(retrieved_docs)
+        
+        prompt = self.prompt_template.format(
+            context=formatted_context,
+            question=question
+        )
+        
+        llm, routing = select_llm(self.router, self.llm, question, retrieved_docs, confidence_metrics)
+        timer = GenerationTimer()
+        chunks = []
+        stream = llm.stream(prompt)
+        try:
+            for chunk in stream:
+                check_cancelled(cancel, "generation")
+                timer.tick()
+                chunks.append(chunk)
+                yield chunk
+            response = self._build_safe_response("".join(chunks), retrieved_docs, confidence_metrics)
             
-            return {
-                "answer": response,
-                "citations": citations,
-                "retrieved_documents": self._format_retrieved_docs(retrieved_docs),
-                "confidence_level": confidence_level,
-                "safety_check": "passed" if hallucination_risk == "low" else "caution",
-                "hallucination_risk": hallucination_risk,
-                "retrieval_confidence": confidence_metrics["overall_confidence"]
-            }
+        except GenerationCancelled:
+            return
+        except Exception as e:
+            response = self._error_response(e)
+        finally:
+            # Closing the stream drops the connection to Ollama, which stops generation
+            stream.close()
+        
+        response["generation_metrics"] = timer.metrics(len(chunks))
+        yield attach_routing(self.router, response, routing, response["generation_metrics"])
+    
+    async def agenerate_safe_response_stream(self, question: str, retrieved_docs: List[Dict],
+                                             confidence_metrics: Dict,
+                                             cancel: Optional[CancellationToken] = None,
+                                             extraction: Optional[Dict[str, Any]] = None) -> AsyncIterator[Union[str, Dict[str, Any]]]:
+        """Async variant of generate_safe_response_stream"""
+        if not confidence_metrics.get("should_proceed", False):
+            response = self._create_low_confidence_response(confidence_metrics)
+            yield response["answer"]
+            yield response
+            return
+        if extraction is not None:
+            response = self._create_extractive_response(extraction, retrieved_docs, confidence_metrics)
+            yield response["answer"]
+            yield response
+            return
+        
+        formatted_context = self._format_context_with_citations(retrieved_docs)
+        
+        prompt = self.prompt_template.format(
+            context=formatted_context,
+            question=question
+        )
+        
+        llm, routing = select_llm(self.router, self.llm, question, retrieved_docs, confidence_metrics)
+        timer = GenerationTimer()
+        chunks = []
+        stream = llm.astream(prompt)
+        try:
+            async for chunk in stream:
+                check_cancelled(cancel, "generation")
+                timer.tick()
+                chunks.append(chunk)
+                yield chunk
+            response = self._build_safe_response("".join(chunks), retrieved_docs, confidence_metrics)
             
+        except GenerationCancelled:
+            return
         except Exception as e:
+            response = self._error_response(e)
+        finally:
+            await stream.aclose()
+        
+        response["generation_metrics"] = timer.metrics(len(chunks))
+        yield attach_routing(self.router, response, routing, response["generation_metrics"])
+    
+    def _build_safe_response(self, response: str, retrieved_docs: List[Dict],
+                             confidence_metrics: Dict) -> Dict[str, Any]:
+        """Run the refusal, citation and hallucination checks on a generated answer"""
+        # Check for refusal patterns
+        if self._is_refusal_response(response):
             return {
-                "answer": f"Error generating response: {str(e)}",
+                "answer": response,
                 "citations": [],
                 "retrieved_documents": [],
-                "confidence_level": "very_low",
-                "safety_check": "failed",
-                "error": str(e)
+                "confidence_level": "low",
+                "safety_check": "passed",
+                "refusal_reason": "LLM determined context is insufficient"
             }
+        
+        # Extract citations and validate
+        citations = self._extract_citations(response, retrieved_docs)
+        
+        # Simple hallucination check (can be enhanced with validation LLM call)
+        hallucination_risk = self._assess_hallucination_risk(response, citations, retrieved_docs)
+        
+        # Determine confidence level
+        confidence_level = self._determine_confidence_level(
+            confidence_metrics, hallucination_risk, citations
+        )
+        
+        return {
+            "answer": response,
+            "citations": citations,
+            "retrieved_documents": self._format_retrieved_docs(retrieved_docs),
+            "confidence_level": confidence_level,
+            "safety_check": "passed" if hallucination_risk == "low" else "caution",
+            "hallucination_risk": hallucination_risk,
+            "retrieval_confidence": confidence_metrics["overall_confidence"]
+        }
+    
+    def _error_response(self, error: Exception) -> Dict[str, Any]:
+        return {
+            "answer": f"Error generating response: {str(error)}",
+            "citations": [],
+            "retrieved_documents": [],
+            "confidence_level": "very_low",
+            "safety_check": "failed",
+            "error": str(error)
+        }
     
     def _create_low_confidence_response(self, confidence_metrics: Dict) -> Dict[str, Any]:
         """Create response when confidence is too low"""
@@ -94,6 +242,23 @@ Please try:
             "retrieval_confidence": confidence_metrics.get("overall_confidence", 0)
         }
     
+    def _create_extractive_response(self, extraction: Dict[str, Any], retrieved_docs: List[Dict],
+                                    confidence_metrics: Dict) -> Dict[str, Any]:
+        """Answer with the extracted source sentences, each followed by its citation marker"""
+        answer = " ".join(f"{span['text']} [{span['citation_id']}]" for span in extraction["spans"])
+        citations = self._extract_citations(answer, retrieved_docs)
+        return {
+            "answer": answer,
+            "citations": citations,
+            "retrieved_documents": self._format_retrieved_docs(retrieved_docs),
+            # Verbatim source text: nothing was generated that could be unsupported
+            "confidence_level": self._determine_confidence_level(confidence_metrics, "low", citations),
+            "safety_check": "passed",
+            "retrieval_confidence": confidence_metrics["overall_confidence"],
+            "answer_mode": "extractive",
+            "extraction": extraction
+        }
+    
     def _is_refusal_response(self, response: str) -> bool:
         """Check if the response is a refusal due to insufficient context"""
         refusal_indicators = [
@@ -146,18 +311,8 @@ Please try:
             return "high"
     
     def _format_context_with_citations(self, retrieved_docs: List[Dict]) -> str:
-        """Format context with citation markers"""
-        context_parts = []
-        
-        for i, doc in enumerate(retrieved_docs, 1):
-            metadata = doc["metadata"]
-            source_info = f"Source [{i}]: {metadata.get('original_filename', 'Document')}"
-            if 'page_number' in metadata:
-                source_info += f" (Page {metadata['page_number']})"
-            
-            context_parts.append(f"{source_info}\n{doc['content']}\n")
-        
-        return "\n".join(context_parts)
+        """Format context with citation markers, packed into the token budget (see ContextPacker)"""
+        return self.context_packer.format(retrieved_docs)
     
     def _extract_citations(self, response: str, retrieved_docs: List[Dict]) -> List[Dict]:
         """Extract citation information from response"""
@@ -165,14 +320,7 @@ Please try:
         
         for i in range(1, len(retrieved_docs) + 1):
             if f"[{i}]" in response:
-                doc_metadata = retrieved_docs[i-1]["metadata"]
-                citations.append({
-                    "citation_id": i,
-                    "source_filename": doc_metadata.get("original_filename", "Unknown"),
-                    "page_number": doc_metadata.get("page_number"),
-                    "source_url": doc_metadata.get("source_url", "#"),
-                    "similarity_score": retrieved_docs[i-1].get("similarity_score", 0)
-                })
+                citations.append(build_citation(i, retrieved_docs[i-1]))
         
         return citations
     
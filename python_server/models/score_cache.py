@@ -0,0 +1,128 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Tuple, Optional, Iterable
+from .query_analysis import normalize_query
+
+CacheKey = Tuple[str, str, str]
+
+class ScoreCache:
+    """Two-tier (in-memory LRU + SQLite) cache of cross-encoder scores keyed by
+    (normalized query hash, chunk content hash, model ID)
+
+    Keying on the content hash means an edited chunk never hits a stale score;
+    invalidate_file() additionally drops the rows of a re-ingested file from disk.
+    The disk tier keeps the max_disk_entries most recently written scores.
+    """
+
+    def __init__(self, max_entries: int = 10000, db_path: Optional[str] = None,
+                 max_disk_entries: int = 200000):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.db_path = db_path
+        self._memory: "OrderedDict[CacheKey, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.misses = 0
+
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._connect()
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS scores (
+                    query_hash TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    model_id TEXT NOT NULL,
+                    file_id TEXT,
+                    score REAL NOT NULL,
+                    PRIMARY KEY (query_hash, content_hash, model_id)
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_scores_file_id ON scores (file_id)")
+            self._conn.commit()
+
+    def _connect(self):
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+
+    def after_fork(self):
+        """SQLite connections must not cross fork(): give the worker its own"""
+        self._lock = threading.Lock()
+        if self.db_path:
+            self._connect()
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def make_keys(self, query: str, contents: List[str], model_id: str) -> List[CacheKey]:
+        query_hash = self._hash(normalize_query(query))
+        return [(query_hash, self._hash(content), model_id) for content in contents]
+
+    def get_many(self, keys: List[CacheKey]) -> Dict[CacheKey, float]:
+        """Cached scores for the keys that have one; disk hits are promoted to memory"""
+        found = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                else:
+                    missing.append(key)
+
+            if missing and self._conn is not None:
+                for key in missing:
+                    row = self._conn.execute(
+                        "SELECT score FROM scores WHERE query_hash = ? AND content_hash = ? AND model_id = ?",
+                        key
+                    ).fetchone()
+                    if row is not None:
+                        found[key] = row[0]
+                        self._remember(key, row[0])
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, entries: Iterable[Tuple[CacheKey, float, Optional[str]]]):
+        """Store (key, score, file_id) entries in both tiers"""
+        entries = list(entries)
+        if not entries:
+            return
+
+        with self._lock:
+            for key, score, _ in entries:
+                self._remember(key, score)
+
+            if self._conn is not None:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO scores (query_hash, content_hash, model_id, file_id, score) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(*key, file_id, score) for key, score, file_id in entries]
+                )
+                # INSERT OR REPLACE gives rewritten rows a new rowid, so the lowest are the oldest
+                self._conn.execute(
+                    "DELETE FROM scores WHERE rowid <= (SELECT MAX(rowid) FROM scores) - ?",
+                    (self.max_disk_entries,)
+                )
+                self._conn.commit()
+
+    def _remember(self, key: CacheKey, score: float):
+        self._memory[key] = score
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def invalidate_file(self, file_id: str):
+        """Drop persisted scores for a file whose chunks were re-ingested"""
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM scores WHERE file_id = ?", (file_id,))
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "memory_entries": len(self._memory)}
@@ -27,23 +27,31 @@ class VectorDB:
         if vectors_to_upsert:
             self.index.upsert(vectors=vectors_to_upsert)
 
-    def similarity_search(self, query_embedding: List[float], k: int = 5, threshold: float = 0.7) -> List[Dict]:
-        """Search for similar documents in the Upstash Vector DB."""
+    def similarity_search(self, query_embedding: List[float], k: int = 5, threshold: float = 0.7,
+                          include_vectors: bool = False) -> List[Dict]:
+        """Search for similar documents in the Upstash Vector DB.
+
+        With include_vectors=True each result also carries its stored "vector",
+        so callers needing candidate embeddings get them in the same round trip.
+        """
         query_result = self.index.query(
             vector=query_embedding,
             top_k=k,
             include_metadata=True,
-            include_vectors=False
+            include_vectors=include_vectors
         )
         
         results = []
         for item in query_result:
             if item.score >= threshold:
-                results.append({
+                result = {
                     "content": item.metadata["content"],
                     "metadata": item.metadata,
                     "similarity_score": item.score
-                })
+                }
+                if include_vectors:
+                    result["vector"] = item.vector
+                results.append(result)
         
         return results
     
@@ -0,0 +1,68 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+class ComponentRegistry:
+    """Named, lazily built singletons shared by every blueprint in the process
+
+    A component is built by its factory on first get() (or during warm_up()) and
+    reused afterwards. Factories receive the registry, so they resolve their own
+    dependencies with get(). Build times are recorded per component, excluding the
+    time spent building its dependencies.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[["ComponentRegistry"], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.RLock()  # Re-entrant: factories call get() for their dependencies
+        self.build_ms: Dict[str, float] = {}
+
+    def register(self, name: str, factory: Callable[["ComponentRegistry"], Any]):
+        self._factories[name] = factory
+
+    def get(self, name: str) -> Any:
+        if name in self._instances:
+            return self._instances[name]
+
+        with self._lock:
+            # Another thread may have built it while we waited for the lock
+            if name in self._instances:
+                return self._instances[name]
+            if name not in self._factories:
+                raise KeyError(f"Unknown component: {name}")
+
+            built_before = sum(self.build_ms.values())
+            start = time.perf_counter()
+            instance = self._factories[name](self)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            self.build_ms[name] = elapsed_ms - (sum(self.build_ms.values()) - built_before)
+            self._instances[name] = instance
+            logger.info(f"Built component {name} in {self.build_ms[name]:.0f} ms")
+            return instance
+
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """Build the given components (all registered ones by default) ahead of the first request"""
+        for name in (names if names is not None else list(self._factories)):
+            self.get(name)
+        return dict(self.build_ms)
+
+    def after_fork(self):
+        """Let built components re-create state that does not survive fork() (see gunicorn.conf.py)"""
+        for instance in self._instances.values():
+            hook = getattr(instance, "after_fork", None)
+            if callable(hook):
+                hook()
+
+    def is_built(self, name: str) -> bool:
+        return name in self._instances
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "built": list(self._instances),
+            "pending": [name for name in self._factories if name not in self._instances],
+            "build_ms": {name: round(ms, 2) for name, ms in self.build_ms.items()}
+        }
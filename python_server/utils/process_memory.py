@@ -0,0 +1,40 @@
+import os
+import resource
+import sys
+from typing import Dict, Any
+
+def _read_kb_fields(path: str) -> Dict[str, int]:
+    fields = {}
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[-1] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return fields
+
+def process_memory() -> Dict[str, Any]:
+    """Memory of the current process in MB
+
+    On Linux, pss/shared/private show how much of the RSS is shared copy-on-write
+    with other gunicorn workers; elsewhere only the peak RSS is available.
+    """
+    try:
+        status = _read_kb_fields("/proc/self/status")
+        rollup = _read_kb_fields("/proc/self/smaps_rollup")
+    except OSError:
+        # ru_maxrss is in KB on Linux, bytes on macOS
+        peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            peak_kb //= 1024
+        return {"pid": os.getpid(), "max_rss_mb": round(peak_kb / 1024, 1)}
+
+    def mb(kb: int) -> float:
+        return round(kb / 1024, 1)
+
+    return {
+        "pid": os.getpid(),
+        "rss_mb": mb(status.get("VmRSS", 0)),
+        "pss_mb": mb(rollup.get("Pss", 0)),
+        "shared_mb": mb(rollup.get("Shared_Clean", 0) + rollup.get("Shared_Dirty", 0)),
+        "private_mb": mb(rollup.get("Private_Clean", 0) + rollup.get("Private_Dirty", 0))
+    }